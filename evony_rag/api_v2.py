@@ -8,15 +8,19 @@ import json
 import time
 import uuid
 from typing import Dict, Any
-from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse
 
+from .config import HTTP_WORKERS
 from .rag_v2 import get_rag_v2
 from .policy import get_policy
+from .http_server import PooledRequestHandler, make_server
 
 
-class EvonyAPIv2Handler(BaseHTTPRequestHandler):
-    """HTTP handler for v2 API."""
+class EvonyAPIv2Handler(PooledRequestHandler):
+    """HTTP handler for v2 API.
+    
+    Runs on several worker threads at once; rag and policy are shared.
+    """
     
     rag = None
     policy = None
@@ -25,17 +29,20 @@ class EvonyAPIv2Handler(BaseHTTPRequestHandler):
         pass
     
     def send_json(self, data: Dict, status: int = 200):
+        body = json.dumps(data).encode()
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
     
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def do_GET(self):
@@ -99,6 +106,10 @@ class EvonyAPIv2Handler(BaseHTTPRequestHandler):
             self.send_json({"error": "No user message"}, 400)
             return
         
+        if data.get("stream"):
+            self._stream_chat(data, user_msg)
+            return
+        
         response = self.rag.query(
             query=user_msg,
             mode=data.get("mode"),
@@ -107,12 +118,7 @@ class EvonyAPIv2Handler(BaseHTTPRequestHandler):
             use_llm=True,
         )
         
-        # Format citations
-        citations = "\n\n---\n**Sources:**\n" if response.citations else ""
-        for c in response.citations:
-            citations += f"- `{c.file_path}:{c.start_line}-{c.end_line}` ({c.combined_score:.0%})\n"
-        
-        full_answer = response.answer + citations
+        full_answer = response.answer + self._format_sources(response.citations)
         
         self.send_json({
             "id": f"chatcmpl-{uuid.uuid4().hex[:8]}",
@@ -126,6 +132,69 @@ class EvonyAPIv2Handler(BaseHTTPRequestHandler):
             }],
         })
     
+    @staticmethod
+    def _format_sources(citations) -> str:
+        """Sources footer appended to chat answers."""
+        sources = "\n\n---\n**Sources:**\n" if citations else ""
+        for c in citations:
+            sources += f"- `{c.file_path}:{c.start_line}-{c.end_line}` ({c.combined_score:.0%})\n"
+        return sources
+    
+    def _stream_chat(self, data: Dict, user_msg: str):
+        """chat.completion.chunk events: retrieval metadata, tokens, [DONE].
+        
+        The first event carries the role plus an "evony" object with the mode,
+        citations and symbols, so clients can show sources before generation
+        starts. Tokens are relayed from LM Studio as they arrive; the sources
+        footer and finish_reason follow.
+        """
+        response, tokens = self.rag.query_stream(
+            query=user_msg,
+            mode=data.get("mode"),
+            include=data.get("include"),
+            exclude=data.get("exclude"),
+        )
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:8]}"
+        created = int(time.time())
+        
+        def chunk(delta: Dict, finish_reason: str = None, **extra) -> str:
+            return json.dumps({
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": "evony-rag-v2",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            })
+        
+        self.start_event_stream({'Access-Control-Allow-Origin': '*'})
+        try:
+            self.send_event(chunk({"role": "assistant", "content": ""}, evony={
+                "mode": response.policy.mode,
+                "citations": [
+                    {
+                        "file": c.file_path,
+                        "lines": f"{c.start_line}-{c.end_line}",
+                        "category": c.category,
+                        "score": round(c.combined_score, 3),
+                    }
+                    for c in response.citations
+                ],
+                "symbols": response.symbols_found,
+            }))
+            for token in tokens:
+                self.send_event(chunk({"content": token}))
+            sources = self._format_sources(response.citations)
+            if sources:
+                self.send_event(chunk({"content": sources}))
+            self.send_event(chunk({}, "stop", evony={"model": response.model_used}))
+            self.send_event("[DONE]")
+            self.end_event_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away: stop relaying and release the LM Studio stream
+            self.close_connection = True
+            tokens.close()
+    
     def _handle_search(self, data: Dict):
         """Retrieval-only endpoint."""
         results = self.rag.search_only(
@@ -179,7 +248,7 @@ class EvonyAPIv2Handler(BaseHTTPRequestHandler):
     
     def _handle_symbol(self, data: Dict):
         """Symbol lookup."""
-        results = self.rag.find_symbol(data.get("name", ""))
+        results = self.rag.find_symbol(data.get("name", ""), fuzzy=bool(data.get("fuzzy")))
         self.send_json({"symbol": data.get("name"), "occurrences": results[:20]})
     
     def _handle_trace(self, data: Dict):
@@ -212,7 +281,7 @@ class EvonyAPIv2Handler(BaseHTTPRequestHandler):
         })
 
 
-def run_api(host: str = "localhost", port: int = 8766):
+def run_api(host: str = "localhost", port: int = 8766, workers: int = HTTP_WORKERS):
     """Run API server."""
     print("Initializing Evony Knowledge API v2...")
     
@@ -222,13 +291,14 @@ def run_api(host: str = "localhost", port: int = 8766):
     EvonyAPIv2Handler.rag = rag
     EvonyAPIv2Handler.policy = policy
     
-    server = HTTPServer((host, port), EvonyAPIv2Handler)
+    server = make_server(host, port, EvonyAPIv2Handler, workers=workers)
     stats = rag.get_stats()
     
     print(f"\n{'='*60}")
     print("EVONY KNOWLEDGE API v2")
     print(f"{'='*60}")
     print(f"URL: http://{host}:{port}")
+    print(f"Workers: {workers or 'serial'}")
     print(f"Chunks: {stats.get('chunks', 0)}")
     print(f"Symbols: {stats.get('symbols', 0)}")
     print(f"Mode: {stats.get('mode', 'research')}")
@@ -0,0 +1,1168 @@
+"""
+Evony RAG - Retrieval Benchmarks
+=================================
+Synthetic micro-benchmarks for the search hot paths.
+
+Usage:
+    python -m evony_rag.benchmark semantic --chunks 100000
+"""
+
+import gc
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from pathlib import Path
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .config import EMBEDDING_DIM, STARTUP_BUDGET_MS, SYMBOL_FUZZY_DISTANCE
+from .hybrid_search import HybridSearch, BM25Index, SymbolIndex
+from .chunk_store import ChunkStore
+from .vectors import normalize_rows, top_k_indices, load_embeddings, save_embeddings
+from .vector_index import FlatIndex, IVFIndex, QuantizedEmbeddings, evaluate_recall
+from .symbol_lookup import edit_distance
+
+
+class SyntheticEncoder:
+    """Stand-in for SentenceTransformer: deterministic vectors per text."""
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        rows = []
+        for text in texts:
+            rng = np.random.default_rng(zlib.crc32(text.encode('utf-8')))
+            rows.append(rng.standard_normal(self.dim).astype(np.float32))
+        return np.array(rows)
+
+
+class ForwardPassEncoder(SyntheticEncoder):
+    """SyntheticEncoder plus transformer-sized matmul work per text.
+
+    Roughly one MiniLM-L6 layer stack per 128-token chunk, so embedding
+    throughput is compute-bound like the real model.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, layers: int = 6, tokens: int = 128):
+        super().__init__(dim)
+        rng = np.random.default_rng(0)
+        self.weights = [rng.standard_normal((dim, 4 * dim)).astype(np.float32) / dim
+                        for _ in range(layers)]
+        self.tokens = tokens
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        hidden = np.ones((len(texts) * self.tokens, self.dim), dtype=np.float32)
+        for w in self.weights:
+            hidden = np.tanh(hidden @ w) @ w.T
+        return super().encode(texts)
+
+
+# Token pool shaped like decompiled AS3: a few very common keywords plus a
+# long tail of identifiers.
+_COMMON_TOKENS = ['public', 'function', 'var', 'this', 'return', 'if', 'new',
+                  'private', 'static', 'const', 'int', 'string', 'void', 'null']
+_CATEGORIES = ['source_code', 'documentation', 'protocol', 'keys',
+               'scripts', 'exploits', 'game_data', 'tools']
+
+
+def synthetic_chunks(n: int, seed: int = 0) -> List[Dict]:
+    """Generate n chunk dicts with AS3-like token statistics."""
+    rng = np.random.default_rng(seed)
+    vocab = _COMMON_TOKENS + [f"ident{i}" for i in range(20_000)]
+    # Zipf-like weights: common keywords dominate, identifiers form the tail
+    weights = 1.0 / np.arange(1, len(vocab) + 1) ** 1.1
+    weights /= weights.sum()
+    lengths = rng.integers(40, 120, size=n)
+    draws = rng.choice(len(vocab), size=int(lengths.sum()), p=weights).tolist()
+    bounds = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+    chunks = []
+    for i in range(n):
+        tokens = [vocab[t] for t in draws[bounds[i]:bounds[i + 1]]]
+        file_path = f"{_CATEGORIES[i % len(_CATEGORIES)]}/File{i // 10}.as"
+        start = (i % 10) * 30 + 1
+        chunks.append({
+            'id': f"{file_path}:{start}-{start + 29}",
+            'file_path': file_path,
+            'category': _CATEGORIES[i % len(_CATEGORIES)],
+            'start_line': start,
+            'end_line': start + 29,
+            'content': ' '.join(tokens),
+        })
+    return chunks
+
+
+def _queries(n: int) -> List[str]:
+    return [f"synthetic query {i}" for i in range(n)]
+
+
+def _time_per_query(fn: Callable[[str], object], queries: List[str]) -> Dict[str, float]:
+    """Run fn over queries and return latency stats in milliseconds."""
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {
+        'mean_ms': float(timings.mean()),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p99_ms': float(np.percentile(timings, 99)),
+    }
+
+
+def _print_row(label: str, stats: Dict[str, float]):
+    print(f"  {label:<28} mean {stats['mean_ms']:8.2f} ms   "
+          f"p50 {stats['p50_ms']:8.2f} ms   p99 {stats['p99_ms']:8.2f} ms")
+
+
+def bench_semantic(chunks: int, queries: int, top_k: int = 20):
+    """Per-query semantic search latency: per-query norms vs pre-normalized matrix."""
+    print(f"\nSemantic search: {chunks} chunks x {EMBEDDING_DIM} dims, {queries} queries")
+
+    rng = np.random.default_rng(0)
+    raw = rng.standard_normal((chunks, EMBEDDING_DIM)).astype(np.float32)
+    encoder = SyntheticEncoder()
+
+    def legacy(query: str):
+        # Pre-change behaviour: recompute every row norm on each query
+        q = encoder.encode([query])[0]
+        sims = np.dot(raw, q) / (np.linalg.norm(raw, axis=1) * np.linalg.norm(q) + 1e-8)
+        top = np.argsort(sims)[-top_k:][::-1]
+        return [(int(i), float(sims[i])) for i in top]
+
+    hs = HybridSearch()
+    hs.embeddings = normalize_rows(raw)
+    hs.embedding_model = encoder
+
+    def current(query: str):
+        return hs._semantic_search(query, top_k=top_k)
+
+    qs = _queries(queries)
+    mismatches = sum(
+        [i for i, _ in legacy(q)] != [int(i) for i, _ in current(q)] for q in qs[:10]
+    )
+
+    _print_row("legacy (norms per query)", _time_per_query(legacy, qs))
+    _print_row("pre-normalized float32", _time_per_query(current, qs))
+    print(f"  result mismatches (first 10 queries): {mismatches}")
+
+
+def bench_topk(chunks: int, queries: int, top_k: int = 20):
+    """Top-k selection cost: full argsort vs argpartition."""
+    print(f"\nTop-{top_k} selection over {chunks} scores, {queries} rounds")
+
+    rng = np.random.default_rng(0)
+    score_sets = {q: rng.standard_normal(chunks).astype(np.float32) for q in _queries(queries)}
+
+    def full_sort(query: str):
+        return np.argsort(score_sets[query])[-top_k:][::-1]
+
+    def partition(query: str):
+        return top_k_indices(score_sets[query], top_k)
+
+    qs = list(score_sets)
+    mismatches = sum(list(full_sort(q)) != list(partition(q)) for q in qs)
+
+    _print_row("np.argsort", _time_per_query(full_sort, qs))
+    _print_row("argpartition + small sort", _time_per_query(partition, qs))
+    print(f"  result mismatches: {mismatches}")
+
+
+def bench_load(chunks: int, rounds: int = 5):
+    """Embedding matrix load time: full np.load vs read-only memory map."""
+    print(f"\nEmbedding load: {chunks} chunks x {EMBEDDING_DIM} dims, {rounds} rounds")
+
+    rng = np.random.default_rng(0)
+    matrix = normalize_rows(rng.standard_normal((chunks, EMBEDDING_DIM)))
+    probe = normalize_rows(rng.standard_normal((1, EMBEDDING_DIM)))[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'embeddings.npy'
+        save_embeddings(path, matrix)
+        print(f"  file size: {path.stat().st_size / 2**20:.1f} MiB")
+
+        def full_load(_):
+            return normalize_rows(np.load(path))
+
+        def mapped(_):
+            return load_embeddings(path, normalized=True, mmap=True)
+
+        def mapped_first_query(_):
+            return top_k_indices(load_embeddings(path, normalized=True) @ probe, 20)
+
+        rounds_ = [str(i) for i in range(rounds)]
+        _print_row("np.load + normalize", _time_per_query(full_load, rounds_))
+        _print_row("mmap (startup only)", _time_per_query(mapped, rounds_))
+        _print_row("mmap + first query", _time_per_query(mapped_first_query, rounds_))
+
+
+def _measure_load(fn: Callable[[], object]) -> Dict[str, float]:
+    """Wall time of a loader, plus the Python heap its result retains.
+
+    Timing and heap tracing are separate runs: tracemalloc slows
+    allocation-heavy loaders down considerably.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {'ms': elapsed, 'heap_mib': current / 2**20}
+
+
+def bench_chunks(chunks: int):
+    """Chunk table load: chunks.json vs the columnar ChunkStore."""
+    print(f"\nChunk table load: {chunks} chunks")
+    data = synthetic_chunks(chunks)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = Path(tmp)
+        with open(index_path / 'chunks.json', 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        ChunkStore.from_dicts(data).save(index_path)
+        del data
+
+        def legacy():
+            with open(index_path / 'chunks.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        def store():
+            return ChunkStore.load(index_path)
+
+        for label, fn in (("chunks.json (json.load)", legacy),
+                          ("ChunkStore (mmap)", store)):
+            stats = _measure_load(fn)
+            print(f"  {label:<28} {stats['ms']:9.1f} ms   heap {stats['heap_mib']:8.1f} MiB")
+
+        loaded = ChunkStore.load(index_path)
+        _print_row("decode 8 results", _time_per_query(
+            lambda q: [loaded[i] for i in range(int(q) * 8, int(q) * 8 + 8)],
+            [str(i) for i in range(50)]))
+
+
+class LegacyBM25:
+    """The pre-CSR BM25 implementation, kept only as a benchmark baseline."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.num_docs = 0
+        self.doc_freqs: Dict[str, int] = {}
+        self.doc_lengths: List[int] = []
+        self.avg_doc_length = 0.0
+        self.inverted_index: Dict[str, List[Tuple[int, int]]] = {}
+
+    def build(self, documents: List[Dict]):
+        inverted = defaultdict(list)
+        for doc_idx, doc in enumerate(documents):
+            tokens = BM25Index()._tokenize(doc['content'])
+            self.doc_lengths.append(len(tokens))
+            term_freqs = defaultdict(int)
+            for token in tokens:
+                term_freqs[token] += 1
+            for term, freq in term_freqs.items():
+                inverted[term].append((doc_idx, freq))
+        self.inverted_index = dict(inverted)
+        self.doc_freqs = {t: len(p) for t, p in inverted.items()}
+        self.num_docs = len(documents)
+        self.avg_doc_length = sum(self.doc_lengths) / max(self.num_docs, 1)
+
+    def _score_bm25(self, doc_idx: int, term_freq: int, term: str) -> float:
+        df = self.doc_freqs[term]
+        idf = math.log((self.num_docs - df + 0.5) / (df + 0.5) + 1)
+        doc_len = self.doc_lengths[doc_idx]
+        return idf * (term_freq * (self.k1 + 1)) / (
+            term_freq + self.k1 * (1 - self.b + self.b * doc_len / self.avg_doc_length))
+
+    def search(self, query: str, top_k: int = 20) -> List[Tuple[int, float]]:
+        scores = defaultdict(float)
+        for token in BM25Index()._tokenize(query):
+            for doc_idx, term_freq in self.inverted_index.get(token, []):
+                scores[doc_idx] += self._score_bm25(doc_idx, term_freq, token)
+        return sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:top_k]
+
+    def save(self, path: Path):
+        with open(path / 'bm25_index.json', 'w') as f:
+            json.dump({'doc_lengths': self.doc_lengths, 'doc_freqs': self.doc_freqs,
+                       'inverted_index': self.inverted_index}, f)
+
+    def load(self, path: Path):
+        with open(path / 'bm25_index.json', 'r') as f:
+            data = json.load(f)
+        self.doc_lengths = data['doc_lengths']
+        self.doc_freqs = data['doc_freqs']
+        self.inverted_index = {k: [tuple(x) for x in v] for k, v in data['inverted_index'].items()}
+        self.num_docs = len(self.doc_lengths)
+        self.avg_doc_length = sum(self.doc_lengths) / max(self.num_docs, 1)
+
+
+class PerQueryBM25(BM25Index):
+    """CSR BM25 that recomputes IDF and length norms per query (baseline)."""
+
+    def _term_scores(self, term_id: int):
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        docs = self.posting_docs[start:end]
+        tf = self.posting_tfs[start:end].astype(np.float64)
+        df = end - start
+        idf = math.log((self.num_docs - df + 0.5) / (df + 0.5) + 1)
+        doc_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+        return docs, idf * (tf * (self.k1 + 1)) / (tf + doc_norm)
+
+
+# Queries dominated by tokens with huge posting lists
+BM25_COMMON_QUERIES = ["function", "var", "public function var this"]
+
+BM25_QUERIES = [
+    "public function getCastle",
+    "var this return",
+    "function",
+    "ident17 ident230 ident4021",
+    "public static const ident88",
+    "new ident5 this ident900",
+]
+
+
+def _same_ranking(a: List[Tuple[int, float]], b: List[Tuple[int, float]]) -> bool:
+    """Same doc ids in the same order and matching scores."""
+    return ([d for d, _ in a] == [d for d, _ in b]
+            and np.allclose([s for _, s in a], [s for _, s in b]))
+
+
+def bench_bm25(chunks: int, rounds: int = 5):
+    """BM25 load time and query latency: legacy dict/JSON vs CSR arrays."""
+    print(f"\nBM25: {chunks} chunks, {len(BM25_QUERIES)} queries x {rounds} rounds")
+    data = synthetic_chunks(chunks)
+
+    legacy, current = LegacyBM25(), BM25Index()
+    legacy.build(data)
+    current.build(data)
+    del data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = Path(tmp)
+        legacy.save(index_path)
+        current.save(index_path)
+
+        def load(index):
+            index.load(index_path)
+            return index
+
+        for label, fn in (("legacy JSON load", lambda: load(LegacyBM25())),
+                          ("CSR arrays load (mmap)", lambda: load(BM25Index()))):
+            stats = _measure_load(fn)
+            print(f"  {label:<28} {stats['ms']:9.1f} ms   heap {stats['heap_mib']:8.1f} MiB")
+
+        loaded = BM25Index()
+        loaded.load(index_path)
+        qs = BM25_QUERIES * rounds
+        mismatches = sum(not _same_ranking(legacy.search(q), loaded.search(q))
+                         for q in BM25_QUERIES)
+        _print_row("legacy per-posting loop", _time_per_query(legacy.search, qs))
+        _print_row("CSR vectorized", _time_per_query(loaded.search, qs))
+        print(f"  ranking mismatches: {mismatches}/{len(BM25_QUERIES)}")
+
+        per_query = PerQueryBM25()
+        per_query.load(index_path)
+        qs = BM25_COMMON_QUERIES * rounds
+        print(f"  common-term queries {BM25_COMMON_QUERIES}:")
+        _print_row("per-query IDF/length norm", _time_per_query(per_query.search, qs))
+        _print_row("precomputed tables", _time_per_query(loaded.search, qs))
+
+
+def bench_pruning(chunks: int, rounds: int = 5, top_k: int = 20):
+    """BM25 MaxScore pruning: postings touched and latency vs exhaustive."""
+    print(f"\nBM25 MaxScore pruning: {chunks} chunks, top-{top_k}")
+    index = BM25Index()
+    index.build(synthetic_chunks(chunks))
+
+    queries = BM25_QUERIES + [
+        "public function ident42",
+        "this var ident7 ident19",
+        "public static function ident3 ident1500",
+    ]
+    mismatches = 0
+    touched = {True: 0, False: 0}
+    for q in queries:
+        exhaustive, n_full = index._search(q, top_k, None, prune=False)
+        pruned, n_pruned = index._search(q, top_k, None, prune=True)
+        mismatches += not _same_ranking(exhaustive, pruned)
+        touched[False] += n_full
+        touched[True] += n_pruned
+        print(f"  {q[:40]:<40} postings {n_full:>9} -> {n_pruned:>9}")
+
+    qs = queries * rounds
+    _print_row("exhaustive", _time_per_query(
+        lambda q: index._search(q, top_k, None, prune=False), qs))
+    _print_row("MaxScore", _time_per_query(
+        lambda q: index._search(q, top_k, None, prune=True), qs))
+    print(f"  postings touched: {touched[False]} -> {touched[True]} "
+          f"({touched[True] / max(touched[False], 1):.1%})")
+    print(f"  ranking mismatches: {mismatches}/{len(queries)}")
+
+
+def clustered_embeddings(n: int, clusters: int = 500, noise: float = 1.0,
+                         seed: int = 0) -> np.ndarray:
+    """Unit vectors grouped around random topics, closer to real embeddings
+    than i.i.d. Gaussian noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, EMBEDDING_DIM)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    points = centers[labels] + noise * rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    return normalize_rows(points)
+
+
+def bench_ann(chunks: int, queries: int = 200, top_k: int = 20,
+              index_path: Path = None, nlist: int = None):
+    """IVF recall@k and latency across nprobe settings vs exact search."""
+    if index_path:
+        embeddings = load_embeddings(index_path / 'embeddings.npy')
+        source = str(index_path)
+    else:
+        embeddings = clustered_embeddings(chunks)
+        source = "synthetic clustered"
+    print(f"\nANN (IVF): {len(embeddings)} x {embeddings.shape[1]} ({source}), "
+          f"{queries} queries, recall@{top_k}")
+
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(embeddings), size=queries, replace=False)
+    qs = normalize_rows(np.asarray(embeddings[picks])
+                        + 0.05 * rng.standard_normal((queries, embeddings.shape[1])))
+
+    start = time.perf_counter()
+    ivf = IVFIndex(embeddings, nlist=nlist)
+    ivf.train()
+    print(f"  trained nlist={ivf.nlist} in {time.perf_counter() - start:.1f} s")
+
+    exact = FlatIndex(embeddings)
+    for nprobe in (1, 4, 8, 16, 32, 64):
+        if nprobe > ivf.nlist:
+            break
+        ivf.nprobe = nprobe
+        stats = evaluate_recall(ivf, exact, qs, k=top_k)
+        print(f"  nprobe={nprobe:<4} recall {stats['recall']:.3f}   "
+              f"ivf {stats['approx_ms']:7.2f} ms   exact {stats['exact_ms']:7.2f} ms")
+
+
+def bench_quantized(chunks: int, queries: int = 100, top_k: int = 20):
+    """Memory, scan latency and recall@k of int8 / float16 candidate search."""
+    embeddings = clustered_embeddings(chunks)
+    print(f"\nQuantized embeddings: {chunks} x {embeddings.shape[1]}, "
+          f"{queries} queries, recall@{top_k}")
+
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(embeddings), size=queries, replace=False)
+    qs = normalize_rows(embeddings[picks] + 0.05 * rng.standard_normal((queries, embeddings.shape[1])))
+
+    exact = FlatIndex(embeddings)
+    print(f"  {'float32':<8} {embeddings.nbytes / 2**20:7.1f} MiB")
+    for kind in ('int8', 'float16'):
+        compact = QuantizedEmbeddings.quantize(embeddings, kind)
+        stats = evaluate_recall(FlatIndex(embeddings, compact=compact), exact, qs, k=top_k)
+        error = max(float(np.abs(compact.scores(q) - embeddings @ q).max()) for q in qs[:10])
+        print(f"  {kind:<8} {compact.nbytes / 2**20:7.1f} MiB   recall {stats['recall']:.3f}   "
+              f"max score error {error:.4f}   "
+              f"{stats['approx_ms']:6.2f} ms vs exact {stats['exact_ms']:6.2f} ms")
+
+
+def bench_batch(chunks: int, queries: int = 64):
+    """HybridSearch.search_many vs search() in a loop over the same queries."""
+    print(f"\nBatched search: {chunks} chunks, {queries} queries")
+    store = ChunkStore.from_dicts(synthetic_chunks(chunks))
+    hs = HybridSearch()
+    hs.chunks = store
+    hs.bm25.build(store)
+    rng = np.random.default_rng(0)
+    hs.embeddings = normalize_rows(rng.standard_normal((chunks, EMBEDDING_DIM)))
+    hs.embedding_model = SyntheticEncoder()
+    hs.category_masks = store.category_masks()
+
+    # Scanner-style queries: shared keywords plus a couple of identifiers
+    qs = [' '.join(list(rng.choice(_COMMON_TOKENS, 2)) +
+                   [f"ident{i}" for i in rng.integers(0, 2000, 2)])
+          for _ in range(queries)]
+
+    hs.query_cache.clear()
+    start = time.perf_counter()
+    looped = [hs.search(q, min_score=0) for q in qs]
+    loop_ms = (time.perf_counter() - start) * 1000
+
+    hs.query_cache.clear()
+    start = time.perf_counter()
+    batched = hs.search_many(qs, min_score=0)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    print(f"  {'search() loop':<28} {loop_ms:8.1f} ms")
+    print(f"  {'search_many()':<28} {batch_ms:8.1f} ms")
+    print(f"  identical results: {looped == batched}")
+
+
+def bench_embed(chunks: int, workers: List[int]):
+    """Index-build embedding throughput: in-process loop vs process pool."""
+    from .embed_pipeline import EmbeddingPipeline
+
+    print(f"\nEmbedding pipeline: {chunks} chunks, {os.cpu_count()} cores")
+    texts = [c['content'] for c in synthetic_chunks(chunks)]
+    encoder = ForwardPassEncoder()
+
+    start = time.perf_counter()
+    for i in range(0, len(texts), 64):
+        normalize_rows(encoder.encode(texts[i:i + 64]))
+    seconds = time.perf_counter() - start
+    print(f"  {'in-process loop':<28} {chunks / seconds:8.0f} chunks/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'out.npy'
+        for count in workers:
+            EmbeddingPipeline.allocate(path, chunks, EMBEDDING_DIM).flush()
+            pipeline = EmbeddingPipeline('synthetic', count, model_factory=ForwardPassEncoder)
+            stats = pipeline.run(path, np.arange(chunks), texts)
+            label = f"{stats['workers']} workers x {stats['threads_per_worker']} threads"
+            print(f"  {label:<28} {stats['chunks_per_s']:8.0f} chunks/s   "
+                  f"({stats['per_worker_chunks_per_s']:.0f}/s per busy worker)")
+
+
+def bench_backends(chunks: int, queries: int = 50):
+    """torch vs ONNX (fp32 / int8) encoders: startup, query latency, build rate, cosine."""
+    from .encoders import OnnxEncoder, load_embedding_model, compare_encoders, COSINE_TOLERANCE
+
+    print(f"\nEmbedding backends: {queries} queries, {chunks} chunks")
+    texts = [c['content'] for c in synthetic_chunks(chunks)]
+    qs = [' '.join(t.split()[:8]) for t in texts[:queries]]
+
+    loaders = [
+        ('torch', lambda: load_embedding_model('torch')),
+        ('onnx fp32', lambda: OnnxEncoder(quantized=False)),
+        ('onnx int8', lambda: OnnxEncoder(quantized=True)),
+    ]
+    reference = None
+    for label, load in loaders:
+        start = time.perf_counter()
+        try:
+            encoder = load()
+        except (ImportError, FileNotFoundError) as e:
+            print(f"  {label:<10} skipped: {e}")
+            continue
+        startup = time.perf_counter() - start
+
+        query_stats = _time_per_query(lambda q: encoder.encode([q]), qs)
+        start = time.perf_counter()
+        encoder.encode(texts, batch_size=64)
+        rate = len(texts) / (time.perf_counter() - start)
+
+        line = (f"  {label:<10} startup {startup:6.2f} s   query p50 {query_stats['p50_ms']:6.1f} ms"
+                f"   build {rate:7.0f} chunks/s")
+        if label == 'torch':
+            reference = encoder
+        elif reference is not None:
+            cos = compare_encoders(reference, encoder, texts[:200] + qs)
+            tolerance = COSINE_TOLERANCE['int8' if 'int8' in label else 'fp32']
+            line += f"   min cosine {cos['min_cosine']:.5f} (>= {tolerance})"
+        print(line)
+
+
+# Runs in a fresh interpreter: time from first import to each response
+_STARTUP_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+from pathlib import Path
+from evony_rag.hybrid_search import HybridSearch
+hs = HybridSearch()
+hs.load_index(Path(sys.argv[1]))
+timings = {'index_ms': (time.perf_counter() - start) * 1000}
+hs.find_symbol('ident1')
+timings['symbol_ms'] = (time.perf_counter() - start) * 1000
+hs.search('ident1 function', k_vector=0)
+timings['lexical_ms'] = (time.perf_counter() - start) * 1000
+timings['model_loaded'] = hs.model_loaded
+try:
+    hs.search('ident1 function')
+    timings['semantic_ms'] = (time.perf_counter() - start) * 1000
+except Exception as e:  # model not installed / not downloadable
+    timings['semantic_error'] = str(e)
+print(json.dumps(timings))
+"""
+
+
+def bench_startup(chunks: int, rounds: int = 3):
+    """Time to first response in a new process: symbol, lexical and semantic requests."""
+    print(f"\nTime to first response: {chunks} chunks, {rounds} fresh processes")
+    store = ChunkStore.from_dicts(synthetic_chunks(chunks))
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = Path(tmp)
+        store.save(index_path)
+        save_embeddings(index_path / 'embeddings.npy',
+                        normalize_rows(rng.standard_normal((chunks, EMBEDDING_DIM))))
+        # First load writes bm25_* and symbol_*
+        HybridSearch().load_index(index_path)
+
+        env = dict(os.environ, PYTHONPATH=str(Path(__file__).resolve().parent.parent))
+        runs = defaultdict(list)
+        for _ in range(rounds):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', _STARTUP_PROBE, str(index_path)],
+                                 env=env, capture_output=True, text=True, check=True)
+            runs['process_ms'].append((time.perf_counter() - start) * 1000)
+            timings = json.loads(out.stdout.strip().splitlines()[-1])
+            for key, value in timings.items():
+                runs[key].append(value)
+
+    def row(label, key):
+        if key in runs:
+            print(f"  {label:<36} median {np.median(runs[key]):8.1f} ms")
+
+    row("index loaded", 'index_ms')
+    row("first evony_symbol answer", 'symbol_ms')
+    row("first lexical-only search", 'lexical_ms')
+    print(f"  model loaded before first semantic: {any(runs['model_loaded'])}")
+    row("first semantic search (loads model)", 'semantic_ms')
+    if 'semantic_error' in runs:
+        print(f"  first semantic search: skipped ({runs['semantic_error'][0]})")
+    row("whole process incl. interpreter", 'process_ms')
+
+
+def bench_initialize(rounds: int = 5, budget_ms: float = STARTUP_BUDGET_MS) -> bool:
+    """Process start to MCP initialize response for the stdio server, vs a budget."""
+    print(f"\nTime to initialize response: {rounds} server starts, budget {budget_ms:.0f} ms")
+    request = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'initialize',
+                          'params': {'protocolVersion': '2024-11-05'}}) + '\n'
+    package_root = Path(__file__).resolve().parent.parent
+    env = dict(os.environ, PYTHONPATH=str(package_root))
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        server = subprocess.Popen([sys.executable, '-m', 'evony_rag.mcp_server_v2_stdio'],
+                                  cwd=package_root, env=env, text=True,
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            server.stdin.write(request)
+            server.stdin.flush()
+            response = json.loads(server.stdout.readline())
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.get('id') != 1 or 'result' not in response:
+                raise RuntimeError(f"unexpected initialize response: {response}")
+        finally:
+            server.stdin.close()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    median = float(np.median(timings))
+    ok = median <= budget_ms
+    print(f"  median {median:8.1f} ms   max {max(timings):8.1f} ms   "
+          f"{'OK' if ok else 'OVER BUDGET'}")
+    return ok
+
+
+def _synthetic_rag(chunks: int, generation_s: float):
+    """EvonyRAGv2 over synthetic data; LM Studio replaced by a fixed delay."""
+    from .rag_v2 import EvonyRAGv2
+    from .policy import PolicyEngine
+
+    store = ChunkStore.from_dicts(synthetic_chunks(chunks))
+    hs = HybridSearch()
+    hs.chunks = store
+    hs.bm25.build(store)
+    rng = np.random.default_rng(0)
+    hs.embeddings = normalize_rows(rng.standard_normal((chunks, EMBEDDING_DIM)))
+    hs.embedding_model = SyntheticEncoder()
+    hs.category_masks = store.category_masks()
+
+    rag = EvonyRAGv2.__new__(EvonyRAGv2)
+    rag.search = hs
+    rag.policy = PolicyEngine()
+    rag.lmstudio_url = None
+
+    def generate(prompt, system):
+        time.sleep(generation_s)
+        return "synthetic answer"
+    rag._call_lmstudio = generate
+    return rag
+
+
+def _load_client(port: int, path: str, bodies: List[Dict], deadline: float,
+                 latencies: List[float], errors: List[int]):
+    """One keep-alive connection sending requests until the deadline."""
+    import http.client
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    i = 0
+    while time.perf_counter() < deadline:
+        body = json.dumps(bodies[i % len(bodies)])
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+                continue
+        except (OSError, http.client.HTTPException):
+            errors.append(0)
+            conn.close()
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+
+
+def bench_http(chunks: int, concurrency: List[int], seconds: float = 3.0,
+               chats: int = 2, generation_s: float = 2.0):
+    """api_v2 /v1/rag/search under load, next to chats blocked on generation."""
+    import threading
+    from .api_v2 import EvonyAPIv2Handler
+    from .http_server import make_server
+
+    print(f"\nHTTP load: {chunks} chunks, {chats} concurrent chats "
+          f"({generation_s:.1f} s generation), {seconds:.0f} s per level")
+    rag = _synthetic_rag(chunks, generation_s)
+    EvonyAPIv2Handler.rag = rag
+    EvonyAPIv2Handler.policy = rag.policy
+    searches = [{'query': ' '.join([_COMMON_TOKENS[i % 5], f"ident{i}"]), 'k': 10}
+                for i in range(200)]
+    chat = [{'messages': [{'role': 'user', 'content': 'function ident7'}]}]
+
+    for label, workers in (('serial HTTPServer', 0), ('pooled (8 workers)', 8)):
+        print(f"  {label}")
+        for clients in concurrency:
+            server = make_server('127.0.0.1', 0, EvonyAPIv2Handler, workers=workers)
+            port = server.server_address[1]
+            serve = threading.Thread(target=server.serve_forever, daemon=True)
+            serve.start()
+
+            latencies, errors, chat_latencies = [], [], []
+            deadline = time.perf_counter() + seconds
+            threads = [threading.Thread(target=_load_client,
+                                        args=(port, '/v1/chat/completions', chat, deadline,
+                                              chat_latencies, []))
+                       for _ in range(chats)]
+            threads += [threading.Thread(target=_load_client,
+                                         args=(port, '/v1/rag/search', searches, deadline,
+                                               latencies, errors))
+                        for _ in range(clients)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - start
+            server.shutdown()
+            server.server_close()
+
+            if latencies:
+                lat = np.array(latencies)
+                print(f"    {clients:3d} clients  p50 {np.percentile(lat, 50):8.1f} ms   "
+                      f"p99 {np.percentile(lat, 99):8.1f} ms   "
+                      f"{len(lat) / wall:7.1f} searches/s   {len(errors)} errors")
+            else:
+                print(f"    {clients:3d} clients  no search completed   {len(errors)} errors")
+
+
+def _fake_lmstudio_handler(first_token_s: float, token_s: float, tokens: int):
+    """Handler class for a local OpenAI-compatible chat server with fixed timing."""
+    from .http_server import PooledRequestHandler
+
+    class FakeLMStudioHandler(PooledRequestHandler):
+        connections = 0
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            type(self).connections += 1
+
+        def do_POST(self):
+            data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            words = [f"tok{i} " for i in range(tokens)]
+            time.sleep(first_token_s)
+            if data.get('stream'):
+                self.start_event_stream()
+                for word in words:
+                    self.send_event(json.dumps({'choices': [{'index': 0, 'delta': {'content': word}}]}))
+                    time.sleep(token_s)
+                self.send_event('[DONE]')
+                self.end_event_stream()
+                return
+            time.sleep(token_s * tokens)
+            body = json.dumps({'choices': [{'index': 0, 'message': {
+                'role': 'assistant', 'content': ''.join(words)}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return FakeLMStudioHandler
+
+
+def bench_llm(answers: int = 20, first_token_s: float = 0.05, token_s: float = 0.002,
+              tokens: int = 200):
+    """LM Studio client: per-call connections vs pooled session vs streaming."""
+    import threading
+    import requests
+    from .http_server import make_server
+    from .lmstudio_client import LMStudioClient
+
+    print(f"\nLM Studio client vs fake server: {answers} answers, {tokens} tokens, "
+          f"first token after {first_token_s * 1000:.0f} ms, {token_s * 1000:.0f} ms/token")
+    handler = _fake_lmstudio_handler(first_token_s, token_s, tokens)
+    server = make_server('127.0.0.1', 0, handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    messages = [{'role': 'user', 'content': 'How does hero.move work?'}]
+
+    def report(label, first, total):
+        print(f"  {label:<28} first token p50 {np.median(first):7.1f} ms   "
+              f"answer p50 {np.median(total):7.1f} ms   "
+              f"{handler.connections} new connections")
+
+    def per_call():
+        response = requests.post(f"{url}/chat/completions",
+                                 json={'messages': messages, 'max_tokens': 1024}, timeout=60)
+        return response.json()['choices'][0]['message']['content']
+
+    client = LMStudioClient(url)
+    runs = [('requests.post per answer', per_call, False),
+            ('pooled session', lambda: client.chat(messages), False),
+            ('pooled session, streaming', lambda: client.stream_chat(messages), True)]
+    try:
+        for label, call, streaming in runs:
+            handler.connections = 0
+            first, total = [], []
+            for _ in range(answers):
+                start = time.perf_counter()
+                if streaming:
+                    text = ''
+                    for token in call():
+                        if not text:
+                            first.append((time.perf_counter() - start) * 1000)
+                        text += token
+                else:
+                    text = call()
+                    first.append((time.perf_counter() - start) * 1000)
+                total.append((time.perf_counter() - start) * 1000)
+                assert text.split() == [f"tok{i}" for i in range(tokens)]
+            report(label, first, total)
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+_NAME_PARTS = ['castle', 'bean', 'hero', 'army', 'move', 'troop', 'city', 'alliance',
+               'resource', 'building', 'quest', 'item', 'mail', 'report', 'field', 'npc']
+
+
+def synthetic_symbol_chunks(n: int, seed: int = 0) -> List[Dict]:
+    """Generate n chunk dicts of AS3-like declarations, constants and commands."""
+    rng = np.random.default_rng(seed)
+
+    def name(capital: bool) -> str:
+        parts = rng.choice(_NAME_PARTS, size=rng.integers(1, 4))
+        text = parts[0] + ''.join(p.capitalize() for p in parts[1:])
+        text = text.capitalize() if capital else text
+        return text + (f"_{rng.integers(100)}" if rng.random() < 0.5 else '')
+
+    chunks = []
+    for i in range(n):
+        lines = []
+        for _ in range(int(rng.integers(10, 40))):
+            roll = rng.random()
+            if roll < 0.1:
+                lines.append(f"public class {name(True)} extends {name(True)} {{")
+            elif roll < 0.35:
+                lines.append(f"    public function {name(False)}(arg:int):void {{")
+            elif roll < 0.55:
+                lines.append(f"        var {name(False)}:int = {rng.integers(1000)};")
+            elif roll < 0.65:
+                lines.append(f"    public static const {name(True).upper()}:int = 1;")
+            elif roll < 0.8:
+                lines.append(f'        send("{rng.choice(_NAME_PARTS)}.{name(False)}", obj);')
+            else:
+                lines.append(f"        var _{rng.integers(1 << 16):x} = this.{name(False)}();")
+        file_path = f"source_code/{name(True)}{i}.as"
+        chunks.append({
+            'file_path': file_path,
+            'category': 'source_code',
+            'start_line': 1,
+            'content': '\n'.join(lines),
+        })
+    return chunks
+
+
+def _typo(name: str, rng) -> str:
+    """name with one or two random edits (delete / insert / swap)."""
+    chars = list(name)
+    for _ in range(int(rng.integers(1, 3))):
+        i = int(rng.integers(len(chars)))
+        roll = rng.random()
+        if roll < 0.33 and len(chars) > 2:
+            del chars[i]
+        elif roll < 0.66:
+            chars.insert(i, 'qxz_'[int(rng.integers(4))])
+        elif i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return ''.join(chars)
+
+
+class LegacySymbolIndex(SymbolIndex):
+    """The original extractor (eight finditer passes, line numbers counted from
+    the chunk start per match, copied contexts), kept only as a benchmark
+    baseline."""
+
+    LEGACY_PATTERNS = {
+        'as_class': r'class\s+(\w+)',
+        'as_function': r'function\s+(\w+)',
+        'as_var': r'(?:var|const)\s+(\w+)',
+        'py_class': r'class\s+(\w+)',
+        'py_function': r'def\s+(\w+)',
+        'py_var': r'^(\w+)\s*=',
+        'command': r'["\'](\w+\.\w+)["\']',
+        'constant': r'([A-Z_]{3,})\s*[=:]',
+    }
+
+    def extract_symbols(self, content: str, file_path: str,
+                        category: str, start_line: int, chunk: int = None) -> List[str]:
+        found = []
+        for pattern in self.LEGACY_PATTERNS.values():
+            for match in re.finditer(pattern, content, re.MULTILINE):
+                symbol = match.group(1)
+                if len(symbol) >= 2:
+                    found.append(symbol)
+                    line_offset = content[:match.start()].count('\n')
+                    self.symbols[symbol.lower()].append({
+                        'symbol': symbol,
+                        'file': file_path,
+                        'category': category,
+                        'line': start_line + line_offset,
+                        'context': content[max(0, match.start()-50):match.end()+100],
+                    })
+        return found
+
+    def save(self, path: Path):
+        with open(path / 'symbol_index.json', 'w') as f:
+            json.dump(dict(self.symbols), f)
+
+    def load(self, path: Path) -> bool:
+        with open(path / 'symbol_index.json', 'r') as f:
+            self.symbols = defaultdict(list, json.load(f))
+        return True
+
+
+def bench_symbol_build(chunks: int):
+    """Symbol extraction, saved size and load time: legacy JSON vs context references + arrays."""
+    print(f"\nSymbol index build / load: {chunks} chunks")
+    data = synthetic_symbol_chunks(chunks)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, index_class in (("legacy (8 passes, JSON)", LegacySymbolIndex),
+                                   ("references, arrays", SymbolIndex)):
+            index = None
+            gc.collect()
+            index = index_class()
+            start = time.perf_counter()
+            for row, chunk in enumerate(data):
+                index.extract_symbols(chunk['content'], chunk['file_path'],
+                                      chunk['category'], chunk['start_line'], chunk=row)
+            build_ms = (time.perf_counter() - start) * 1000
+            path = Path(tmp) / label.split()[0]
+            path.mkdir()
+            index.save(path)
+            size = sum(f.stat().st_size for f in path.iterdir()) / 2**20
+            occurrences = sum(map(len, index.symbols.values()))
+            probe = next(iter(index.symbols))
+            index = None
+
+            def load():
+                loaded = index_class()
+                loaded.load(path)
+                loaded.find_symbol(probe)
+                return loaded
+
+            stats = _measure_load(load)
+            print(f"  {label:<26} build {build_ms:7.0f} ms  {occurrences:7d} occurrences  "
+                  f"saved {size:6.1f} MiB  load+lookup {stats['ms']:7.1f} ms  "
+                  f"heap {stats['heap_mib']:6.1f} MiB")
+
+
+def bench_symbols(chunks: int, queries: int = 200):
+    """Partial / fuzzy find_symbol: trigram and deletion indexes vs key scans."""
+    print(f"\nSymbol lookup: {chunks} chunks, {queries} queries")
+    symbols = SymbolIndex()
+    for chunk in synthetic_symbol_chunks(chunks):
+        symbols.extract_symbols(chunk['content'], chunk['file_path'],
+                                chunk['category'], chunk['start_line'])
+    keys = list(symbols.symbols)
+    rng = np.random.default_rng(1)
+    # Fragments of real names (name in key), names with extra text (key in
+    # name), and misses; none of them exact keys
+    picks = [keys[i] for i in rng.integers(len(keys), size=queries)]
+    qs = ([k[1:-1] for k in picks[:queries // 2]]
+          + [f"get{k}Handler" for k in picks[queries // 2:queries * 3 // 4]]
+          + [f"zz{k}zz" for k in picks[queries * 3 // 4:]])
+    qs = [q for q in qs if q not in symbols.symbols]
+    print(f"  {len(keys)} distinct symbols")
+
+    def scan(q: str):
+        return [sym for sym in symbols.symbols if q in sym or sym in q]
+
+    start = time.perf_counter()
+    names = symbols._name_index()
+    print(f"  trigram index build {(time.perf_counter() - start) * 1000:8.1f} ms")
+    for q in qs:
+        assert [names.keys[i] for i in names.partial(q)] == scan(q), q
+    _print_row("linear scan", _time_per_query(scan, qs))
+    _print_row("trigram index", _time_per_query(names.partial, qs))
+    _print_row("find_symbol (ranked)", _time_per_query(symbols.find_symbol, qs))
+
+    typos = [_typo(k, rng) for k in picks]
+    typos = [q for q in typos if q not in symbols.symbols]
+
+    def fuzzy_scan(q: str):
+        matches = []
+        for i, sym in enumerate(keys):
+            distance = edit_distance(q, sym, SYMBOL_FUZZY_DISTANCE)
+            if distance <= SYMBOL_FUZZY_DISTANCE:
+                matches.append((i, distance))
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    start = time.perf_counter()
+    fuzzy = symbols._fuzzy_index()
+    print(f"  deletion index build {(time.perf_counter() - start) * 1000:7.1f} ms "
+          f"(distance {SYMBOL_FUZZY_DISTANCE})")
+    for q in typos[:20]:
+        assert fuzzy.lookup(q) == fuzzy_scan(q), q
+    _print_row("fuzzy: edit-distance scan", _time_per_query(fuzzy_scan, typos[:20]))
+    _print_row("fuzzy: deletion index", _time_per_query(fuzzy.lookup, typos))
+    hits = sum(bool(symbols.find_symbol(q, fuzzy=True)) for q in typos)
+    print(f"  typo queries answered: fuzzy {hits}/{len(typos)}, "
+          f"partial {sum(bool(symbols.find_symbol(q)) for q in typos)}/{len(typos)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evony RAG retrieval benchmarks")
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('semantic', help='Semantic (vector) search latency')
+    p.add_argument('--chunks', type=int, default=100_000)
+    p.add_argument('--queries', type=int, default=50)
+
+    p = sub.add_parser('topk', help='Top-k selection cost')
+    p.add_argument('--chunks', type=int, default=500_000)
+    p.add_argument('--queries', type=int, default=50)
+
+    p = sub.add_parser('load', help='Embedding matrix load time')
+    p.add_argument('--chunks', type=int, default=100_000)
+
+    p = sub.add_parser('chunks', help='Chunk table load time and heap')
+    p.add_argument('--chunks', type=int, default=100_000)
+
+    p = sub.add_parser('bm25', help='BM25 load time and query latency')
+    p.add_argument('--chunks', type=int, default=100_000)
+
+    p = sub.add_parser('pruning', help='BM25 MaxScore pruning vs exhaustive')
+    p.add_argument('--chunks', type=int, default=100_000)
+
+    p = sub.add_parser('ann', help='IVF recall@k / latency vs exact search')
+    p.add_argument('--chunks', type=int, default=200_000)
+    p.add_argument('--index', type=Path, default=None,
+                   help='Evaluate on a real index directory instead of synthetic data')
+    p.add_argument('--nlist', type=int, default=None)
+
+    p = sub.add_parser('quantized', help='int8 / float16 candidate search vs float32')
+    p.add_argument('--chunks', type=int, default=100_000)
+
+    p = sub.add_parser('batch', help='search_many vs looped search')
+    p.add_argument('--chunks', type=int, default=100_000)
+    p.add_argument('--queries', type=int, default=64)
+
+    p = sub.add_parser('embed', help='Index-build embedding throughput by worker count')
+    p.add_argument('--chunks', type=int, default=4000)
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+
+    p = sub.add_parser('backends', help='torch vs ONNX embedding backends')
+    p.add_argument('--chunks', type=int, default=1000)
+
+    p = sub.add_parser('startup', help='Time to first symbol / lexical / semantic response')
+    p.add_argument('--chunks', type=int, default=100_000)
+
+    p = sub.add_parser('initialize', help='stdio server time to initialize response (exit 1 if over budget)')
+    p.add_argument('--rounds', type=int, default=5)
+    p.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+
+    p = sub.add_parser('http', help='api_v2 search latency/throughput under concurrent load')
+    p.add_argument('--chunks', type=int, default=20_000)
+    p.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    p.add_argument('--seconds', type=float, default=3.0)
+
+    p = sub.add_parser('llm', help='LM Studio client: pooled / streaming vs per-call connections')
+    p.add_argument('--answers', type=int, default=20)
+
+    p = sub.add_parser('symbols', help='Partial / fuzzy symbol lookup vs linear scans')
+    p.add_argument('--chunks', type=int, default=20_000)
+    p.add_argument('--queries', type=int, default=200)
+
+    p = sub.add_parser('symbol-build', help='Symbol extraction time, index size and load time')
+    p.add_argument('--chunks', type=int, default=20_000)
+
+    args = parser.parse_args()
+
+    if args.bench == 'semantic':
+        bench_semantic(args.chunks, args.queries)
+    elif args.bench == 'topk':
+        bench_topk(args.chunks, args.queries)
+    elif args.bench == 'load':
+        bench_load(args.chunks)
+    elif args.bench == 'chunks':
+        bench_chunks(args.chunks)
+    elif args.bench == 'bm25':
+        bench_bm25(args.chunks)
+    elif args.bench == 'pruning':
+        bench_pruning(args.chunks)
+    elif args.bench == 'ann':
+        bench_ann(args.chunks, index_path=args.index, nlist=args.nlist)
+    elif args.bench == 'quantized':
+        bench_quantized(args.chunks)
+    elif args.bench == 'batch':
+        bench_batch(args.chunks, args.queries)
+    elif args.bench == 'embed':
+        bench_embed(args.chunks, args.workers)
+    elif args.bench == 'backends':
+        bench_backends(args.chunks)
+    elif args.bench == 'startup':
+        bench_startup(args.chunks)
+    elif args.bench == 'initialize':
+        sys.exit(0 if bench_initialize(args.rounds, args.budget_ms) else 1)
+    elif args.bench == 'http':
+        bench_http(args.chunks, args.concurrency, args.seconds)
+    elif args.bench == 'llm':
+        bench_llm(args.answers)
+    elif args.bench == 'symbols':
+        bench_symbols(args.chunks, args.queries)
+    elif args.bench == 'symbol-build':
+        bench_symbol_build(args.chunks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Evony RAG - Columnar Chunk Store
+=================================
+Compact on-disk chunk table replacing chunks.json.
+
+Layout (all in the index directory):
+    chunk_meta.npy     - one fixed-width row per chunk (file id, category
+                         code, line range, content offset/length)
+    chunk_strings.json - string tables for file paths and categories
+    chunk_content.bin  - all chunk contents as one UTF-8 blob
+
+Metadata rows and the content blob are memory-mapped; a chunk's content is
+only decoded when that chunk is actually read.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .vectors import replace_file, save_array
+
+META_FILE = 'chunk_meta.npy'
+STRINGS_FILE = 'chunk_strings.json'
+CONTENT_FILE = 'chunk_content.bin'
+LEGACY_FILE = 'chunks.json'
+
+META_DTYPE = np.dtype([
+    ('file_id', '<i4'),
+    ('category', '<u2'),
+    ('start_line', '<i4'),
+    ('end_line', '<i4'),
+    ('offset', '<i8'),
+    ('length', '<i4'),
+])
+
+
+class ChunkStore:
+    """Read-only chunk table with lazily decoded content.
+
+    Indexing returns the same dict shape chunks.json used to hold
+    (id, file_path, category, start_line, end_line, content).
+    """
+
+    def __init__(self, meta: np.ndarray, files: List[str],
+                 categories: List[str], content: np.ndarray):
+        self.meta = meta
+        self.files = files
+        self.categories = categories
+        self._content = content
+
+    @classmethod
+    def from_dicts(cls, chunks: Iterable[Dict]) -> 'ChunkStore':
+        """Build a store from chunk dicts (build time / legacy conversion)."""
+        chunks = list(chunks)
+        file_ids: Dict[str, int] = {}
+        category_ids: Dict[str, int] = {}
+        meta = np.zeros(len(chunks), dtype=META_DTYPE)
+        blob = bytearray()
+
+        for i, chunk in enumerate(chunks):
+            data = chunk['content'].encode('utf-8')
+            meta[i] = (
+                file_ids.setdefault(chunk['file_path'], len(file_ids)),
+                category_ids.setdefault(chunk['category'], len(category_ids)),
+                chunk['start_line'],
+                chunk['end_line'],
+                len(blob),
+                len(data),
+            )
+            blob += data
+
+        return cls(meta, list(file_ids), list(category_ids),
+                   np.frombuffer(bytes(blob), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, index_path: Path) -> Optional['ChunkStore']:
+        """Load a saved store, memory-mapped. Returns None if absent."""
+        if not (index_path / META_FILE).exists():
+            return None
+        with open(index_path / STRINGS_FILE, 'r', encoding='utf-8') as f:
+            strings = json.load(f)
+        meta = np.load(index_path / META_FILE, mmap_mode='r')
+        content_path = index_path / CONTENT_FILE
+        if content_path.stat().st_size:
+            content = np.memmap(content_path, dtype=np.uint8, mode='r')
+        else:
+            content = np.zeros(0, dtype=np.uint8)
+        return cls(meta, strings['files'], strings['categories'], content)
+
+    @classmethod
+    def load_or_convert(cls, index_path: Path) -> 'ChunkStore':
+        """Load the store, converting a legacy chunks.json once if needed."""
+        store = cls.load(index_path)
+        if store is None:
+            with open(index_path / LEGACY_FILE, 'r', encoding='utf-8') as f:
+                store = cls.from_dicts(json.load(f))
+            store.save(index_path)
+        return store
+
+    def save(self, index_path: Path):
+        """Write the store to disk.
+
+        Every file is replaced atomically: running servers keep their
+        memory-mapped view of the previous store until they reload.
+        """
+        index_path.mkdir(parents=True, exist_ok=True)
+        replace_file(index_path / STRINGS_FILE, json.dumps(
+            {'files': self.files, 'categories': self.categories}).encode('utf-8'))
+        save_array(index_path / META_FILE, self.meta)
+        replace_file(index_path / CONTENT_FILE, self._content.tobytes())
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+    def __getitem__(self, idx: int) -> Dict:
+        row = self.meta[idx]
+        file_path = self.files[row['file_id']]
+        start_line, end_line = int(row['start_line']), int(row['end_line'])
+        return {
+            'id': f"{file_path}:{start_line}-{end_line}",
+            'file_path': file_path,
+            'category': self.categories[row['category']],
+            'start_line': start_line,
+            'end_line': end_line,
+            'content': self.content(idx),
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def content(self, idx: int) -> str:
+        """Decode one chunk's content from the blob."""
+        row = self.meta[idx]
+        start = int(row['offset'])
+        return self._content[start:start + int(row['length'])].tobytes().decode('utf-8')
+
+    def file_path(self, idx: int) -> str:
+        return self.files[self.meta[idx]['file_id']]
+
+    def category(self, idx: int) -> str:
+        return self.categories[self.meta[idx]['category']]
+
+    def category_masks(self) -> Dict[str, np.ndarray]:
+        """Boolean row mask per category, straight from the code column."""
+        codes = np.asarray(self.meta['category'])
+        return {name: codes == i for i, name in enumerate(self.categories)}
+
+    def category_counts(self) -> Dict[str, int]:
+        codes = np.asarray(self.meta['category'])
+        counts = np.bincount(codes, minlength=len(self.categories))
+        return {name: int(counts[i]) for i, name in enumerate(self.categories)}
@@ -16,18 +16,82 @@ INDEX_PATH = RAG_PATH / "index"
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDING_DIM = 384
 
+# Embedding backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime,
+# exported with `python -m evony_rag.encoders export`; see encoders.py)
+EMBEDDING_BACKEND = "torch"
+ONNX_MODEL_PATH = RAG_PATH / "models" / "all-MiniLM-L6-v2-onnx"
+ONNX_QUANTIZED = True
+
 # Chunk settings
 CHUNK_SIZE = 512
 CHUNK_OVERLAP = 50
 MAX_CHUNKS_PER_FILE = 100
 
+# Index build embedding: EMBED_WORKERS > 1 runs a pool of processes, each
+# with its own model and EMBED_THREADS_PER_WORKER torch/BLAS threads
+# (None = cores / workers); see embed_pipeline.py
+EMBED_WORKERS = 1
+EMBED_THREADS_PER_WORKER = None
+EMBED_BATCH_SIZE = 64
+
 # Retrieval settings
 TOP_K = 5
 SIMILARITY_THRESHOLD = 0.3
 
+# Memory-map embeddings.npy read-only so server processes share page cache
+EMBEDDINGS_MMAP = True
+
+# Vector index backend: "flat" (exact) or "ivf" (approximate, see vector_index.py).
+# IVF lists are trained when the index is built; servers only load them.
+VECTOR_INDEX = "flat"
+IVF_NLIST = None  # None = ~4*sqrt(num_chunks)
+IVF_NPROBE = 16
+
+# Compact copy of the embeddings used to find candidates: None, "int8" or
+# "float16". The best RESCORE_FACTOR * k candidates are rescored exactly.
+EMBEDDING_QUANTIZATION = None
+RESCORE_FACTOR = 4
+
+# LRU of query embeddings (repeated queries skip the model); 0 disables
+QUERY_CACHE_SIZE = 1024
+
+# Fuzzy symbol lookup (find_symbol(name, fuzzy=True)): max edit distance, and
+# how many leading / trailing characters of each name the deletion index covers
+SYMBOL_FUZZY_DISTANCE = 2
+SYMBOL_FUZZY_PREFIX = 7
+
+# The embedding model loads on first semantic query; True also starts loading
+# it in a background thread as soon as the index is up. Off by default: the
+# load imports torch in every process, including symbol/stats-only sessions
+# that never run a semantic query
+EMBEDDING_WARMUP = False
+
+# Startup profile (per-phase wall time and peak RSS) written to logs/ by the
+# stdio MCP server; EVONY_STARTUP_PROFILE=1 also enables it
+STARTUP_PROFILE = False
+# `benchmark initialize` fails if the median time from process start to the
+# MCP initialize response exceeds this
+STARTUP_BUDGET_MS = 1000
+
+# Tool calls the stdio MCP server runs at once (slow LLM answers no longer
+# block searches and pings queued behind them)
+MCP_MAX_CONCURRENCY = 4
+
+# HTTP APIs (api_v2, lmstudio_api): worker threads (0 = serial HTTPServer),
+# connections allowed to wait for a worker before new ones get 503, and
+# idle keep-alive timeout in seconds
+HTTP_WORKERS = 8
+HTTP_QUEUE_DEPTH = 32
+HTTP_KEEPALIVE_TIMEOUT = 15
+
 # LM Studio settings
 LMSTUDIO_URL = "http://localhost:1234/v1"
 LMSTUDIO_MODEL = "local-model"
+# Shared keep-alive client: pooled connections, connect timeout and the
+# longest wait for the next response bytes (per token when streaming)
+LMSTUDIO_POOL_SIZE = 8
+LMSTUDIO_CONNECT_TIMEOUT = 5
+LMSTUDIO_READ_TIMEOUT = 60
 
 # MCP Server settings
 MCP_HOST = "localhost"
@@ -0,0 +1,132 @@
+"""
+Evony RAG - Parallel Embedding Pipeline
+========================================
+Multi-process embedding for index builds.
+
+Stages:
+    reader  - EmbeddingIndex.build_index scans, reads and chunks files and
+              streams (rows, texts) batches to the pool
+    workers - one process per worker, each with its own model (configured
+              backend) and a pinned thread count, encoding one batch at a time
+    output  - a preallocated .npy memory map; each worker writes its
+              unit-length rows straight to their final row positions
+
+Only row ids, texts and timings cross process boundaries; embeddings never
+get pickled back to the parent.
+"""
+
+import os
+import time
+import multiprocessing
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .vectors import normalize_rows
+
+# Read by torch / numpy's BLAS when a worker process starts
+_THREAD_ENV = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+# Per-process worker state, set by _init_worker
+_model = None
+_output = None
+
+
+def _init_worker(model_name: str, model_factory: Optional[Callable],
+                 output_path: str, threads: int):
+    """Load this worker's model and open the shared output matrix."""
+    global _model, _output
+    if model_factory is not None:
+        _model = model_factory()
+    else:
+        from .encoders import load_embedding_model
+        _model = load_embedding_model(model_name=model_name, threads=threads)
+    _output = np.load(output_path, mmap_mode='r+')
+
+
+def _embed_batch(batch: Tuple[np.ndarray, List[str]]) -> Tuple[int, float]:
+    """Encode one batch into its output rows; returns (chunks, seconds)."""
+    rows, texts = batch
+    start = time.perf_counter()
+    _output[rows] = normalize_rows(_model.encode(texts, show_progress_bar=False))
+    return len(rows), time.perf_counter() - start
+
+
+class EmbeddingPipeline:
+    """Pool of embedding processes writing into a shared .npy matrix.
+
+    model_factory: picklable zero-argument callable returning an object with
+    SentenceTransformer's encode(); default loads `model_name` with the
+    configured backend.
+    """
+
+    def __init__(self, model_name: str, workers: int,
+                 threads: Optional[int] = None, batch_size: int = 64,
+                 model_factory: Optional[Callable] = None):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.batch_size = batch_size
+        self.model_factory = model_factory
+
+    @staticmethod
+    def allocate(path: Path, num_rows: int, dim: int) -> np.ndarray:
+        """Preallocate the float32 output matrix as a writable memory map."""
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                         shape=(num_rows, dim))
+
+    def _batches(self, rows: Sequence[int],
+                 texts: Sequence[str]) -> Iterator[Tuple[np.ndarray, List[str]]]:
+        rows = np.asarray(rows, dtype=np.int64)
+        for i in range(0, len(rows), self.batch_size):
+            yield rows[i:i + self.batch_size], list(texts[i:i + self.batch_size])
+
+    def run(self, output_path: Path, rows: Sequence[int],
+            texts: Sequence[str]) -> Dict[str, float]:
+        """Embed texts[i] into row rows[i] of the matrix at output_path.
+
+        Returns chunk counts and throughput for the worker stage.
+        """
+        start = time.perf_counter()
+        busy = 0.0
+        done = 0
+        # No point starting more processes (and models) than there are batches
+        workers = min(self.workers, max(1, -(-len(rows) // self.batch_size)))
+
+        # Spawned processes read the thread limits from their environment
+        saved = {name: os.environ.get(name) for name in _THREAD_ENV}
+        os.environ.update({name: str(self.threads) for name in _THREAD_ENV})
+        try:
+            pool = multiprocessing.get_context('spawn').Pool(
+                workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.model_factory, str(output_path), self.threads),
+            )
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        try:
+            for count, seconds in pool.imap_unordered(_embed_batch, self._batches(rows, texts)):
+                done += count
+                busy += seconds
+                if done % 1000 < count:
+                    print(f"  Embedded {done}/{len(rows)}")
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+
+        wall = time.perf_counter() - start
+        return {
+            'chunks': done,
+            'workers': workers,
+            'threads_per_worker': self.threads,
+            'seconds': wall,
+            'chunks_per_s': done / wall if wall else 0.0,
+            'per_worker_chunks_per_s': done / busy if busy else 0.0,
+        }
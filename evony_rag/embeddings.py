@@ -7,17 +7,31 @@ Creates and manages the vector index over the curated dataset.
 import json
 import pickle
 import re
+import time
+import uuid
+import threading
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass, asdict
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 from .config import (
     DATASET_PATH, INDEX_PATH, EMBEDDING_MODEL, EMBEDDING_DIM,
-    CHUNK_SIZE, CHUNK_OVERLAP, MAX_CHUNKS_PER_FILE, CATEGORIES
+    CHUNK_SIZE, CHUNK_OVERLAP, MAX_CHUNKS_PER_FILE, CATEGORIES, EMBEDDINGS_MMAP,
+    EMBEDDING_QUANTIZATION, RESCORE_FACTOR, QUERY_CACHE_SIZE,
+    VECTOR_INDEX, IVF_NLIST,
+    EMBED_WORKERS, EMBED_THREADS_PER_WORKER, EMBED_BATCH_SIZE,
 )
+from .vectors import (
+    normalize_rows, QueryEmbeddingCache,
+    combine_category_masks, load_embeddings, save_embeddings,
+)
+from .chunk_store import ChunkStore
+from .vector_index import FlatIndex, IVFIndex, QuantizedEmbeddings
+from .manifest import Manifest, BuildDelta, MANIFEST_FILE
+from .embed_pipeline import EmbeddingPipeline
+from .encoders import load_embedding_model, backend_id
 
 
 @dataclass
@@ -48,15 +62,24 @@ class EmbeddingIndex:
     def __init__(self, model_name: str = EMBEDDING_MODEL):
         self.model_name = model_name
         self.model = None
-        self.chunks: List[Chunk] = []
-        self.embeddings: np.ndarray = None
+        self._model_lock = threading.Lock()
+        self.chunks: ChunkStore = ChunkStore.from_dicts([])
+        self.embeddings: np.ndarray = None  # float32, unit-length rows
+        self.vector_index: FlatIndex = None
+        self.query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE)
         self.metadata: Dict = {}
+        self.category_masks: Dict[str, np.ndarray] = {}
+        self.manifest: Manifest = None  # set by build_index
+        self.model_factory = None  # picklable stand-in for the model (pipeline workers)
+        self.delta: BuildDelta = None
         
     def load_model(self):
-        """Load the embedding model."""
+        """Load the embedding model (once, if several threads ask at once)."""
         if self.model is None:
-            print(f"Loading embedding model: {self.model_name}")
-            self.model = SentenceTransformer(self.model_name)
+            with self._model_lock:
+                if self.model is None:
+                    print(f"Loading embedding model: {self.model_name}")
+                    self.model = load_embedding_model(model_name=self.model_name)
         return self.model
     
     def _read_file(self, path: Path) -> Tuple[str, List[str]]:
@@ -115,14 +138,108 @@ class EmbeddingIndex:
         
         return chunks
     
-    def build_index(self, dataset_path: Path = DATASET_PATH) -> int:
-        """Build the embedding index from the dataset."""
+    def _settings(self) -> Dict:
+        """Build settings that invalidate every cached chunk when changed."""
+        return {
+            "model": self.model_name,
+            "embedding_backend": backend_id(),
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "max_chunks_per_file": MAX_CHUNKS_PER_FILE,
+        }
+    
+    def _load_previous(self, index_path: Path) -> Optional[Tuple[Manifest, ChunkStore, np.ndarray, Optional[str]]]:
+        """Manifest, chunks, embeddings and build id of the last build, if reusable."""
+        manifest = Manifest.load(index_path)
+        if manifest is None or manifest.settings != self._settings():
+            return None
+        try:
+            store = ChunkStore.load(index_path)
+            embeddings = load_embeddings(index_path / "embeddings.npy", mmap=EMBEDDINGS_MMAP)
+        except (OSError, ValueError):
+            return None
+        if store is None or not len(store) == len(embeddings) == manifest.num_rows:
+            return None
+        try:
+            with open(index_path / "metadata.json", 'r', encoding='utf-8') as f:
+                build_id = json.load(f).get("build_id")
+        except (OSError, ValueError):
+            build_id = None  # rows are reusable; lexical indexes get rebuilt
+        return manifest, store, embeddings, build_id
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in batches in this process; unit-length float32 rows."""
+        if not texts:
+            # Nothing changed: don't load the model (and torch) at all
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self.load_model()
+        batch_size = EMBED_BATCH_SIZE
+        all_embeddings = []
+        
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
+            batch_embeddings = self.model.encode(batch, show_progress_bar=False)
+            all_embeddings.extend(batch_embeddings)
+            
+            if (i + batch_size) % 500 == 0:
+                print(f"  Embedded {min(i + batch_size, len(texts))}/{len(texts)}")
+        
+        return normalize_rows(all_embeddings)
+    
+    def _embed_parallel(self, index_path: Path, num_rows: int, texts: List[str],
+                        added_rows: np.ndarray, kept_rows: np.ndarray,
+                        kept_embeddings: np.ndarray, workers: int) -> np.ndarray:
+        """Embed with a process pool writing straight into a preallocated matrix.
+        
+        kept_rows / kept_embeddings are carried over from the previous build.
+        """
+        index_path.mkdir(parents=True, exist_ok=True)
+        build_path = index_path / "embeddings.build.npy"
+        
+        output = EmbeddingPipeline.allocate(build_path, num_rows, EMBEDDING_DIM)
+        if len(kept_rows):
+            output[kept_rows] = kept_embeddings
+        output.flush()
+        del output
+        
+        pipeline = EmbeddingPipeline(self.model_name, workers,
+                                     threads=EMBED_THREADS_PER_WORKER,
+                                     batch_size=EMBED_BATCH_SIZE,
+                                     model_factory=self.model_factory)
+        stats = pipeline.run(build_path, added_rows, texts)
+        print(f"  Embed stage: {stats['chunks']} chunks in {stats['seconds']:.1f}s "
+              f"({stats['chunks_per_s']:.0f} chunks/s, {stats['workers']} workers x "
+              f"{stats['threads_per_worker']} threads, "
+              f"{stats['per_worker_chunks_per_s']:.0f} chunks/s per busy worker)")
+        
+        embeddings = np.load(build_path)
+        build_path.unlink()
+        return embeddings
+    
+    def build_index(self, dataset_path: Path = DATASET_PATH,
+                    index_path: Path = INDEX_PATH,
+                    incremental: bool = True,
+                    workers: int = EMBED_WORKERS) -> int:
+        """Build the embedding index from the dataset.
+        
+        With `incremental`, files whose content hash matches the previous
+        build's manifest keep their chunks and embeddings; only new or
+        changed files are chunked and embedded. self.delta describes how
+        rows moved, for patching the BM25 and symbol indexes.
+        
+        workers > 1 embeds in a process pool (see embed_pipeline.py).
+        """
         print("\n" + "="*60)
         print("BUILDING EVONY KNOWLEDGE INDEX")
         print("="*60)
         
-        self.load_model()
-        self.chunks = []
+        read_start = time.perf_counter()
+        previous = self._load_previous(index_path) if incremental else None
+        old_manifest, old_store, old_embeddings, old_build = previous or (Manifest({}), None, None, None)
+        
+        manifest = Manifest(self._settings())
+        rows: List = []  # old row id (reused) or new Chunk, in final order
+        removed_files = set(old_manifest.files)
         
         # Process each category
         for category_dir in dataset_path.iterdir():
@@ -135,91 +252,169 @@ class EmbeddingIndex:
             
             print(f"\nIndexing {category}...")
             files = list(category_dir.glob('*'))
+            category_start = len(rows)
+            reused = 0
             
             for file_path in files:
                 if not file_path.is_file():
                     continue
                 
-                content, lines = self._read_file(file_path)
-                if not content:
-                    continue
-                
                 # Get relative path for citation
                 rel_path = str(file_path.relative_to(dataset_path))
+                sha1 = old_manifest.sha1(rel_path, file_path)
+                start = len(rows)
+                
+                old = old_manifest.files.get(rel_path)
+                if old and old['sha1'] == sha1 and old['category'] == category:
+                    # Unchanged: keep the previous build's rows
+                    rows.extend(range(*old['rows']))
+                    reused += old['rows'][1] - old['rows'][0]
+                    removed_files.discard(rel_path)
+                else:
+                    content, lines = self._read_file(file_path)
+                    if content:
+                        # Create chunks
+                        rows.extend(self._chunk_content(content, lines, rel_path, category))
                 
-                # Create chunks
-                file_chunks = self._chunk_content(content, lines, rel_path, category)
-                self.chunks.extend(file_chunks)
+                manifest.add(rel_path, file_path, sha1, category, start, len(rows))
             
-            print(f"  {len([c for c in self.chunks if c.category == category])} chunks")
+            print(f"  {len(rows) - category_start} chunks ({reused} unchanged)")
         
-        print(f"\nTotal chunks: {len(self.chunks)}")
+        read_seconds = time.perf_counter() - read_start
+        print(f"\nTotal chunks: {len(rows)}")
+        print(f"  Reader stage: {len(rows)} chunks in {read_seconds:.1f}s "
+              f"({len(rows) / max(read_seconds, 1e-9):.0f} chunks/s)")
         
-        # Generate embeddings
-        print("\nGenerating embeddings...")
-        texts = [c.content for c in self.chunks]
+        added_rows = np.array([i for i, row in enumerate(rows) if isinstance(row, Chunk)],
+                              dtype=np.int64)
+        old_rows = np.array([-1 if isinstance(row, Chunk) else row for row in rows],
+                            dtype=np.int64)
+        kept = np.flatnonzero(old_rows >= 0)
         
-        # Batch embedding for efficiency
-        batch_size = 64
-        all_embeddings = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeddings = self.model.encode(batch, show_progress_bar=False)
-            all_embeddings.extend(batch_embeddings)
+        # Generate embeddings for new and changed chunks only
+        print(f"\nGenerating embeddings for {len(added_rows)} chunks...")
+        texts = [rows[i].content for i in added_rows]
+        kept_embeddings = old_embeddings[old_rows[kept]] if len(kept) else None
+        if workers > 1 and len(added_rows):
+            embeddings = self._embed_parallel(index_path, len(rows), texts, added_rows,
+                                              kept, kept_embeddings, workers)
+        else:
+            embed_start = time.perf_counter()
+            new_embeddings = self._embed(texts)
+            embed_seconds = time.perf_counter() - embed_start
+            print(f"  Embed stage: {len(texts)} chunks in {embed_seconds:.1f}s "
+                  f"({len(texts) / max(embed_seconds, 1e-9):.0f} chunks/s, 1 process)")
             
-            if (i + batch_size) % 500 == 0:
-                print(f"  Embedded {min(i + batch_size, len(texts))}/{len(texts)}")
+            embeddings = np.empty((len(rows), new_embeddings.shape[1] if len(added_rows)
+                                   else EMBEDDING_DIM), dtype=np.float32)
+            if len(kept):
+                embeddings[kept] = kept_embeddings
+            embeddings[added_rows] = new_embeddings
         
-        self.embeddings = np.array(all_embeddings)
+        row_map = np.full(len(old_store) if old_store is not None else 0, -1, dtype=np.int64)
+        row_map[old_rows[kept]] = kept
+        
+        self.embeddings = embeddings
+        self.vector_index = FlatIndex(self.embeddings)
+        self.chunks = ChunkStore.from_dicts(
+            old_store[row] if not isinstance(row, Chunk) else row.to_dict() for row in rows
+        )
+        self.category_masks = self.chunks.category_masks()
+        self.manifest = manifest
+        self.delta = BuildDelta(row_map, added_rows, removed_files, old_build)
         
         # Store metadata
+        category_counts = self.chunks.category_counts()
         self.metadata = {
             "model": self.model_name,
             "num_chunks": len(self.chunks),
             "embedding_dim": EMBEDDING_DIM,
-            "categories": {cat: len([c for c in self.chunks if c.category == cat]) 
-                         for cat in CATEGORIES},
+            "embedding_dtype": "float32",
+            "embeddings_normalized": True,
+            "categories": {cat: category_counts.get(cat, 0) for cat in CATEGORIES},
         }
         
-        print(f"\nIndex built: {len(self.chunks)} chunks, {self.embeddings.shape}")
+        print(f"\nIndex built: {len(self.chunks)} chunks, {self.embeddings.shape} "
+              f"({len(kept)} reused, {len(added_rows)} embedded)")
         return len(self.chunks)
     
-    def save(self, index_path: Path = INDEX_PATH):
-        """Save index to disk."""
+    def save(self, index_path: Path = INDEX_PATH,
+             quantization: str = EMBEDDING_QUANTIZATION,
+             vector_index: str = VECTOR_INDEX):
+        """Save index to disk.
+        
+        quantization: also write an "int8" or "float16" copy of the
+        embeddings for candidate search (float32 is kept for rescoring).
+        vector_index: "ivf" also trains and saves IVF lists for the new
+        embeddings (servers only load them).
+        """
         index_path.mkdir(parents=True, exist_ok=True)
         
-        # Save embeddings
-        np.save(index_path / "embeddings.npy", self.embeddings)
+        # A half-written index must not look reusable to the next build
+        if self.manifest is not None:
+            (index_path / MANIFEST_FILE).unlink(missing_ok=True)
         
-        # Save chunks metadata (without embeddings)
-        chunks_data = [c.to_dict() for c in self.chunks]
-        with open(index_path / "chunks.json", 'w', encoding='utf-8') as f:
-            json.dump(chunks_data, f, indent=2)
+        # New matrix, new build id: files derived from the old one (IVF lists,
+        # quantized copies) are dropped first and never match it again, even
+        # if saving stops here
+        self.metadata["build_id"] = uuid.uuid4().hex
+        IVFIndex.remove(index_path)
+        QuantizedEmbeddings.remove(index_path)
+        
+        # Save embeddings (normalized float32, mmap-ready)
+        save_embeddings(index_path / "embeddings.npy", self.embeddings)
+        
+        # Save compact copy and record its representation
+        if quantization:
+            QuantizedEmbeddings.quantize(self.embeddings, quantization).save(
+                index_path, self.metadata["build_id"])
+        self.metadata["embedding_quantization"] = quantization
+        
+        # Train approximate-search lists now, not on the servers' first load
+        if vector_index == "ivf":
+            ivf = IVFIndex(self.embeddings, nlist=IVF_NLIST)
+            ivf.train()
+            ivf.save(index_path, self.metadata["build_id"])
+        
+        # Save chunk table (columnar metadata + content blob)
+        self.chunks.save(index_path)
         
         # Save index metadata
         with open(index_path / "metadata.json", 'w', encoding='utf-8') as f:
             json.dump(self.metadata, f, indent=2)
         
+        # Save file hashes for the next incremental build (written last)
+        if self.manifest is not None:
+            self.manifest.save(index_path)
+        
         print(f"Index saved to: {index_path}")
     
     def load(self, index_path: Path = INDEX_PATH) -> bool:
-        """Load index from disk."""
+        """Load index from disk (the embedding model loads on first search)."""
         try:
-            self.load_model()
+            # Load metadata
+            with open(index_path / "metadata.json", 'r', encoding='utf-8') as f:
+                self.metadata = json.load(f)
             
             # Load embeddings
-            self.embeddings = np.load(index_path / "embeddings.npy")
+            self.embeddings = load_embeddings(
+                index_path / "embeddings.npy",
+                normalized=self.metadata.get("embeddings_normalized"),
+                mmap=EMBEDDINGS_MMAP,
+            )
             
-            # Load chunks
-            with open(index_path / "chunks.json", 'r', encoding='utf-8') as f:
-                chunks_data = json.load(f)
+            # Load chunk table (content is decoded lazily per result)
+            self.chunks = ChunkStore.load_or_convert(index_path)
+            self.category_masks = self.chunks.category_masks()
             
-            self.chunks = [Chunk(**c) for c in chunks_data]
-            
-            # Load metadata
-            with open(index_path / "metadata.json", 'r', encoding='utf-8') as f:
-                self.metadata = json.load(f)
+            # Candidate search over the compact copy, if one was saved
+            compact = None
+            quantization = self.metadata.get("embedding_quantization")
+            if quantization:
+                compact = QuantizedEmbeddings.load(index_path, quantization, len(self.embeddings),
+                                                   self.metadata.get("build_id"))
+            self.vector_index = FlatIndex(self.embeddings, compact=compact,
+                                          rescore_factor=RESCORE_FACTOR)
             
             print(f"Index loaded: {len(self.chunks)} chunks")
             return True
@@ -236,36 +431,39 @@ class EmbeddingIndex:
             return []
         
         # Embed query
-        query_embedding = self.model.encode([query])[0]
+        query_embedding = self.query_cache.encode(self.load_model(), query)
         
-        # Calculate cosine similarities
-        similarities = np.dot(self.embeddings, query_embedding) / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_embedding)
-        )
-        
-        # Filter by category if specified
-        if categories:
-            mask = np.array([c.category in categories for c in self.chunks])
-            similarities = np.where(mask, similarities, -1)
+        # Filter by category if specified (precomputed row masks)
+        mask = combine_category_masks(self.category_masks, categories, len(self.chunks))
         
-        # Get top-k
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        # Cosine similarity (rows are already unit-length), top-k
+        if self.vector_index is None:
+            self.vector_index = FlatIndex(self.embeddings)
         
         results = []
-        for idx in top_indices:
-            if similarities[idx] >= threshold:
-                results.append((self.chunks[idx], float(similarities[idx])))
+        for idx, score in self.vector_index.search(query_embedding, top_k, mask):
+            if score >= threshold:
+                results.append((Chunk(**self.chunks[idx]), score))
         
         return results
 
 
-def build_index():
-    """Build and save the embedding index."""
+def build_index(incremental: bool = True, workers: int = EMBED_WORKERS):
+    """Build and save the embedding index, then patch BM25 and symbols."""
+    from .hybrid_search import update_lexical_indexes
+    
     index = EmbeddingIndex()
-    index.build_index()
+    index.build_index(incremental=incremental, workers=workers)
     index.save()
+    update_lexical_indexes(INDEX_PATH, index.delta)
     return index
 
 
 if __name__ == "__main__":
-    build_index()
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the Evony RAG index")
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and rebuild everything')
+    parser.add_argument('--workers', type=int, default=EMBED_WORKERS,
+                        help='Embedding processes (>1 = parallel pipeline)')
+    args = parser.parse_args()
+    build_index(incremental=not args.full, workers=args.workers)
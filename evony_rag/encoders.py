@@ -0,0 +1,224 @@
+"""
+Evony RAG - Embedding Backends
+===============================
+Selectable query/document encoders behind one encode() interface.
+
+Backends (config.EMBEDDING_BACKEND):
+    torch - sentence_transformers.SentenceTransformer (reference)
+    onnx  - exported all-MiniLM-L6-v2 run by ONNX Runtime on CPU, with
+            its own fast tokenizer; optionally int8 dynamic-quantized.
+            No torch import at query time.
+
+The ONNX encoder reproduces the sentence-transformers pipeline for this
+model: WordPiece tokenization (max 256 tokens), transformer forward pass,
+attention-masked mean pooling, L2 normalization.
+
+Tolerance against the torch reference (per-text cosine similarity, checked
+by `python -m evony_rag.encoders check`):
+    onnx fp32 - min cosine >= 0.9999
+    onnx int8 - min cosine >= 0.98 (typically ~0.99+)
+
+One-time export (needs torch + transformers + onnxruntime):
+    python -m evony_rag.encoders export
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, ONNX_MODEL_PATH, ONNX_QUANTIZED,
+)
+from .vectors import normalize_rows
+from .startup_profile import profile
+
+ONNX_MODEL_FILE = 'model.onnx'
+ONNX_QUANTIZED_FILE = 'model_int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+
+# all-MiniLM-L6-v2's max_seq_length in sentence-transformers
+MAX_LENGTH = 256
+
+# Minimum per-text cosine vs the torch reference
+COSINE_TOLERANCE = {'fp32': 0.9999, 'int8': 0.98}
+
+
+class OnnxEncoder:
+    """all-MiniLM-L6-v2 on ONNX Runtime; drop-in for SentenceTransformer.encode."""
+
+    def __init__(self, model_dir: Path = ONNX_MODEL_PATH, quantized: bool = ONNX_QUANTIZED,
+                 threads: Optional[int] = None, max_length: int = MAX_LENGTH):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_file = model_dir / (ONNX_QUANTIZED_FILE if quantized else ONNX_MODEL_FILE)
+        if not model_file.exists():
+            raise FileNotFoundError(
+                f"{model_file} not found; run: python -m evony_rag.encoders export")
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.no_padding()
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(model_file), options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = int(self.session.get_outputs()[0].shape[-1])
+        self.quantized = quantized
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(texts), length), dtype=np.int64)
+        attention = np.zeros((len(texts), length), dtype=np.int64)
+        for i, e in enumerate(encodings):
+            input_ids[i, :len(e.ids)] = e.ids
+            attention[i, :len(e.ids)] = 1
+
+        feeds = {'input_ids': input_ids, 'attention_mask': attention}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean over real tokens only
+        mask = attention[:, :, None].astype(np.float32)
+        summed = (hidden * mask).sum(axis=1)
+        return summed / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               **kwargs) -> np.ndarray:
+        """Unit-length float32 embeddings, one row per text."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        # Batch similar lengths together to minimise padding
+        order = np.argsort([-len(t) for t in texts], kind='stable')
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            out[rows] = self._forward([texts[i] for i in rows])
+
+        out = normalize_rows(out)
+        return out[0] if single else out
+
+
+def load_embedding_model(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL,
+                         threads: Optional[int] = None):
+    """Construct the configured encoder (anything with .encode(texts))."""
+    if backend == 'onnx':
+        return OnnxEncoder(threads=threads)
+    if backend != 'torch':
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    with profile.phase("import sentence_transformers"):
+        from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def backend_id(backend: str = EMBEDDING_BACKEND) -> str:
+    """Identifies the embedding space an index was built with."""
+    if backend == 'onnx':
+        return 'onnx-int8' if ONNX_QUANTIZED else 'onnx'
+    return backend
+
+
+def export_onnx(model_name: str = EMBEDDING_MODEL, out_dir: Path = ONNX_MODEL_PATH,
+                quantize: bool = True):
+    """Export the transformer to ONNX (plus an int8 copy) with its tokenizer."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(str(out_dir))  # writes tokenizer.json
+
+    sample = tokenizer(["export sample"], return_tensors='pt')
+    names = ['input_ids', 'attention_mask', 'token_type_ids']
+    dynamic = {name: {0: 'batch', 1: 'sequence'} for name in names}
+    dynamic['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in names), str(out_dir / ONNX_MODEL_FILE),
+            input_names=names, output_names=['last_hidden_state'],
+            dynamic_axes=dynamic, opset_version=14,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(out_dir / ONNX_MODEL_FILE), str(out_dir / ONNX_QUANTIZED_FILE),
+                         weight_type=QuantType.QInt8)
+    print(f"Exported {model_name} to {out_dir}")
+
+
+def compare_encoders(reference, candidate, texts: List[str]) -> Dict[str, float]:
+    """Per-text cosine similarity between two encoders' embeddings."""
+    a = normalize_rows(reference.encode(texts))
+    b = normalize_rows(candidate.encode(texts))
+    cosines = (a * b).sum(axis=1)
+    return {
+        'min_cosine': float(cosines.min()),
+        'mean_cosine': float(cosines.mean()),
+    }
+
+
+def check_tolerance(texts: List[str]) -> bool:
+    """Compare the ONNX encoders with torch against COSINE_TOLERANCE."""
+    reference = load_embedding_model('torch')
+    ok = True
+    for quantized, label in ((False, 'fp32'), (True, 'int8')):
+        try:
+            candidate = OnnxEncoder(quantized=quantized)
+        except FileNotFoundError as e:
+            print(f"  onnx {label}: skipped ({e})")
+            continue
+        stats = compare_encoders(reference, candidate, texts)
+        passed = stats['min_cosine'] >= COSINE_TOLERANCE[label]
+        ok &= passed
+        print(f"  onnx {label}: min cosine {stats['min_cosine']:.5f}  "
+              f"mean {stats['mean_cosine']:.5f}  "
+              f"(tolerance {COSINE_TOLERANCE[label]}) {'OK' if passed else 'FAIL'}")
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Embedding backend tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('export', help='Export the model to ONNX (+ int8)')
+    p.add_argument('--no-quantize', action='store_true')
+    p = sub.add_parser('check', help='Check ONNX embeddings against torch')
+    p.add_argument('--texts', type=Path, default=None,
+                   help='File with one sample text per line (default: built-in samples)')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_onnx(quantize=not args.no_quantize)
+    else:
+        if args.texts:
+            samples = [line for line in args.texts.read_text(encoding='utf-8').splitlines() if line]
+        else:
+            samples = [
+                "How does the castle upgrade protocol work?",
+                "public function sendMessage(cmd:String, params:Object):void",
+                "ResponseDispatcher addEventListener",
+                "encryption key for AMF packets",
+                "var heroList:Array = new Array();",
+                "hero.move",
+                "x" * 4000,
+            ]
+        sys.exit(0 if check_tolerance(samples) else 1)
@@ -0,0 +1,297 @@
+"""
+Evony RAG - Pooled HTTP Server
+===============================
+Concurrent serving for api_v2 and lmstudio_api.
+
+Requests are handled by a fixed pool of worker threads, so a
+/v1/rag/search is answered while a /v1/chat/completions waits on
+generation. Handlers speak HTTP/1.1 with keep-alive. Between requests an
+idle keep-alive connection gives its worker back and is watched by one
+selector thread; when the client sends again it is queued for a worker
+like a new connection, and after HTTP_KEEPALIVE_TIMEOUT idle seconds it
+is closed.
+
+Admission is bounded: at most HTTP_WORKERS requests run and
+HTTP_QUEUE_DEPTH more wait for a worker. Beyond that the server answers
+503 with Retry-After and closes the connection.
+"""
+
+import json
+import time
+import socket
+import selectors
+import threading
+from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from .config import HTTP_WORKERS, HTTP_QUEUE_DEPTH, HTTP_KEEPALIVE_TIMEOUT
+
+
+class PooledRequestHandler(BaseHTTPRequestHandler):
+    """BaseHTTPRequestHandler that releases its worker between keep-alive requests.
+
+    Subclasses must send Content-Length (or close) on every response, or
+    use the event-stream helpers.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = HTTP_KEEPALIVE_TIMEOUT
+    # Headers and body are separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.idle = False
+        if not isinstance(self.server, PooledHTTPServer):
+            super().handle()
+            return
+        self.handle_one_request()
+        while not self.close_connection:
+            if not self._pipelined():
+                # The server parks the connection once this worker is done
+                self.idle = True
+                return
+            self.handle_one_request()
+
+    def _pipelined(self) -> bool:
+        """True if the client already sent (part of) its next request."""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def finish(self):
+        if not getattr(self, 'idle', False):
+            super().finish()
+
+    def start_event_stream(self, headers: Optional[Dict[str, str]] = None):
+        """Begin a text/event-stream response.
+
+        Chunked on HTTP/1.1 so the connection survives the stream; otherwise
+        the end of the stream is marked by closing the connection.
+        """
+        self._chunked = (self.protocol_version >= "HTTP/1.1"
+                         and self.request_version >= "HTTP/1.1")
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self._chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+    def send_event(self, data: str):
+        """Send one `data:` event and flush it to the client."""
+        payload = f"data: {data}\n\n".encode()
+        if self._chunked:
+            payload = f"{len(payload):x}\r\n".encode() + payload + b"\r\n"
+        self.wfile.write(payload)
+        self.wfile.flush()
+
+    def end_event_stream(self):
+        if self._chunked:
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that serves requests from a bounded thread pool."""
+
+    # The accept loop only admits or rejects, so let bursts queue in the kernel
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class,
+                 workers: int = HTTP_WORKERS, queue_depth: int = HTTP_QUEUE_DEPTH,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT):
+        super().__init__(server_address, handler_class)
+        self.workers = max(1, workers)
+        self.max_pending = self.workers + max(0, queue_depth)
+        self.keepalive_timeout = keepalive_timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                        thread_name_prefix="http-worker")
+        self._pending = 0  # requests being served or waiting for a worker
+        self._pending_lock = threading.Lock()
+        self.rejected = 0
+
+        # Idle keep-alive connections; only the watcher thread touches the selector
+        self._selector = selectors.DefaultSelector()
+        self._to_park = []
+        self._park_lock = threading.Lock()
+        self._closing = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._watcher = threading.Thread(target=self._watch_idle,
+                                         name="http-keepalive", daemon=True)
+        self._watcher.start()
+
+    # -- admission ---------------------------------------------------------
+
+    def _admit(self) -> bool:
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._pending += 1
+            return True
+
+    def _release(self):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def process_request(self, request, client_address):
+        if not self._admit():
+            self._reject(request)
+            return
+        self._pool.submit(self._serve, request, client_address)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _serve(self, request, client_address):
+        handler = None
+        try:
+            handler = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self._release()
+            if handler is None:
+                self.shutdown_request(request)
+            else:
+                self._done(handler, finish=False)
+
+    def _resume(self, handler):
+        """Serve the next request(s) on a keep-alive connection."""
+        try:
+            handler.handle()
+        except Exception:
+            handler.idle = False
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            self._release()
+            self._done(handler, finish=True)
+
+    def _done(self, handler, finish: bool):
+        """Park an idle keep-alive connection, otherwise close it."""
+        if handler.idle and self.park(handler):
+            return
+        if handler.idle or finish:
+            self._finish(handler)
+        self.shutdown_request(handler.request)
+
+    @staticmethod
+    def _finish(handler):
+        handler.idle = False
+        try:
+            handler.finish()
+        except OSError:
+            pass
+
+    def _reject(self, request):
+        """503 without taking a worker."""
+        body = json.dumps({"error": "Server busy, retry shortly"}).encode()
+        try:
+            # Drain the request head first so closing doesn't reset the reply
+            request.settimeout(0.05)
+            try:
+                request.recv(65536)
+            except OSError:
+                pass
+            request.sendall(
+                b"HTTP/1.1 503 Service Unavailable\r\n"
+                b"Content-Type: application/json\r\n"
+                b"Retry-After: 1\r\n"
+                b"Connection: close\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    # -- idle keep-alive connections -----------------------------------------
+
+    def park(self, handler) -> bool:
+        """Hand an idle keep-alive connection to the watcher (False if closing)."""
+        with self._park_lock:
+            if self._closing:
+                return False
+            self._to_park.append(handler)
+        self._wake_w.send(b'\0')
+        return True
+
+    def _close_parked(self, handler):
+        self._selector.unregister(handler.connection)
+        self._finish(handler)
+        self.shutdown_request(handler.request)
+
+    def _watch_idle(self):
+        while True:
+            events = self._selector.select(timeout=1.0)
+            with self._park_lock:
+                parked, self._to_park = self._to_park, []
+                closing = self._closing
+            now = time.monotonic()
+            for handler in parked:
+                self._selector.register(handler.connection, selectors.EVENT_READ,
+                                        (handler, now))
+            for key, _ in events:
+                if key.fileobj is self._wake_r:
+                    try:
+                        self._wake_r.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                if closing:
+                    continue
+                handler = key.data[0]
+                self._selector.unregister(key.fileobj)
+                if self._admit():
+                    self._pool.submit(self._resume, handler)
+                else:
+                    self._finish(handler)
+                    self._reject(handler.request)
+            for key in list(self._selector.get_map().values()):
+                if key.fileobj is self._wake_r:
+                    continue
+                if closing or now - key.data[1] > self.keepalive_timeout:
+                    self._close_parked(key.data[0])
+            if closing:
+                self._selector.close()
+                return
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'rejected': self.rejected,
+            }
+
+    def server_close(self):
+        super().server_close()
+        with self._park_lock:
+            self._closing = True
+        self._wake_w.send(b'\0')
+        self._watcher.join(timeout=5)
+        self._pool.shutdown(wait=False)
+        self._wake_r.close()
+        self._wake_w.close()
+
+
+def make_server(host: str, port: int, handler_class,
+                workers: int = HTTP_WORKERS, queue_depth: int = HTTP_QUEUE_DEPTH) -> HTTPServer:
+    """Pooled server, or the plain serial HTTPServer when workers == 0."""
+    if workers <= 0:
+        # One connection at a time: keep-alive would lock out everyone else
+        serial = type(handler_class.__name__, (handler_class,), {'protocol_version': 'HTTP/1.0'})
+        return HTTPServer((host, port), serial)
+    return PooledHTTPServer((host, port), handler_class, workers, queue_depth)
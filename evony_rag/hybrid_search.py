@@ -8,17 +8,36 @@ This is the #1 upgrade for "smart" code RAG.
 import re
 import os
 import sys
-import math
 import json
 import logging
+import threading
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional, Set
+from array import array
+from typing import List, Dict, Tuple, Optional, Set, Iterable, Mapping
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import defaultdict, Counter
+from operator import itemgetter
 
 import numpy as np
 
-from .config import INDEX_PATH, DATASET_PATH
+from .config import (
+    INDEX_PATH, DATASET_PATH, EMBEDDINGS_MMAP,
+    VECTOR_INDEX, IVF_NPROBE, EMBEDDING_QUANTIZATION, RESCORE_FACTOR,
+    QUERY_CACHE_SIZE, EMBEDDING_WARMUP,
+)
+from .vectors import (
+    top_k_indices, QueryEmbeddingCache,
+    combine_category_masks, load_embeddings, replace_file, save_array,
+)
+from .vector_index import FlatIndex, QuantizedEmbeddings, load_vector_index
+from .chunk_store import ChunkStore
+from .symbol_lookup import TrigramIndex, DeletionIndex
+from .symbol_store import SymbolTable, LEGACY_FILE as SYMBOLS_LEGACY_FILE
+from .startup_profile import profile
+
+# Build id (metadata.json) of the chunks the saved BM25 and symbol indexes
+# cover; written after both, so a partial update never looks current
+LEXICAL_BUILD_FILE = 'lexical_build.json'
 
 
 def _suppress_library_output():
@@ -56,16 +75,42 @@ class SearchResult:
 
 
 class BM25Index:
-    """BM25 lexical search index for exact matching."""
+    """BM25 lexical search index for exact matching.
+    
+    Postings are stored CSR-style: for term id t, the slice
+    term_offsets[t]:term_offsets[t+1] of posting_docs / posting_tfs holds
+    that term's document ids (ascending) and term frequencies.
+    
+    Queries are evaluated term-at-a-time with MaxScore pruning: once the
+    terms still to be scored cannot lift an unseen document into the top-k,
+    only the surviving candidates are looked up in the remaining posting
+    lists. Results are identical to exhaustive scoring.
+    """
+    
+    FILES = {
+        'term_offsets': 'bm25_offsets.npy',
+        'posting_docs': 'bm25_docs.npy',
+        'posting_tfs': 'bm25_tfs.npy',
+        'doc_lengths': 'bm25_doc_lengths.npy',
+        'term_upper_bounds': 'bm25_upper_bounds.npy',
+    }
+    META_FILE = 'bm25_meta.json'
     
     def __init__(self, k1: float = 1.5, b: float = 0.75):
         self.k1 = k1
         self.b = b
-        self.documents: List[Dict] = []
-        self.doc_freqs: Dict[str, int] = defaultdict(int)
-        self.doc_lengths: List[int] = []
+        self.num_docs: int = 0
         self.avg_doc_length: float = 0.0
-        self.inverted_index: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.vocab: Dict[str, int] = {}
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.posting_docs = np.zeros(0, dtype=np.int32)
+        self.posting_tfs = np.zeros(0, dtype=np.int32)
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        # Derived at build/load time (see _precompute)
+        self.idf = np.zeros(0, dtype=np.float64)
+        self.doc_norms = np.zeros(0, dtype=np.float64)
+        # Highest score any single posting of a term contributes (persisted)
+        self.term_upper_bounds = np.zeros(0, dtype=np.float64)
         
     def _tokenize(self, text: str) -> List[str]:
         """Tokenize text for BM25."""
@@ -75,166 +120,503 @@ class BM25Index:
         tokens = re.findall(r'\b[\w.]+\b', text)
         return tokens
     
-    def build(self, documents: List[Dict]):
+    def build(self, documents: Iterable[Dict]):
         """Build BM25 index from documents."""
-        self.documents = documents
-        self.doc_lengths = []
-        self.doc_freqs = defaultdict(int)
-        self.inverted_index = defaultdict(list)
+        vocab: Dict[str, int] = {}
+        term_ids = array('i')
+        doc_ids = array('i')
+        tfs = array('i')
+        doc_lengths = array('i')
         
-        # First pass: collect document frequencies
         for doc_idx, doc in enumerate(documents):
             tokens = self._tokenize(doc.get('content', ''))
-            self.doc_lengths.append(len(tokens))
+            doc_lengths.append(len(tokens))
             
             # Count term frequencies in this document
-            term_freqs = defaultdict(int)
-            for token in tokens:
-                term_freqs[token] += 1
-            
-            # Update inverted index and document frequencies
-            for term, freq in term_freqs.items():
-                self.inverted_index[term].append((doc_idx, freq))
-                self.doc_freqs[term] += 1
+            for term, freq in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_idx)
+                tfs.append(freq)
         
-        self.avg_doc_length = sum(self.doc_lengths) / max(len(self.doc_lengths), 1)
+        self._set_postings(
+            vocab,
+            np.frombuffer(term_ids, dtype=np.int32),
+            np.frombuffer(doc_ids, dtype=np.int32),
+            np.frombuffer(tfs, dtype=np.int32),
+            np.frombuffer(doc_lengths, dtype=np.int32).copy(),
+        )
     
-    def _score_bm25(self, doc_idx: int, term_freq: int, term: str) -> float:
-        """Calculate BM25 score for a term in a document."""
-        N = len(self.documents)
-        df = self.doc_freqs.get(term, 0)
+    def patch(self, row_map: np.ndarray, added: Iterable[Tuple[int, Dict]], num_docs: int):
+        """Update the index after some documents changed, without a rebuild.
         
-        if df == 0:
-            return 0.0
+        row_map[old_row] is each indexed document's new row (-1 = removed);
+        `added` yields (new_row, document) for new or changed documents.
+        """
+        vocab = dict(self.vocab)
+        term_ids = array('i')
+        doc_ids = array('i')
+        tfs = array('i')
+        
+        doc_lengths = np.zeros(num_docs, dtype=np.int32)
+        kept = row_map >= 0
+        doc_lengths[row_map[kept]] = self.doc_lengths[kept]
         
-        idf = math.log((N - df + 0.5) / (df + 0.5) + 1)
+        for row, doc in added:
+            tokens = self._tokenize(doc.get('content', ''))
+            doc_lengths[row] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(row)
+                tfs.append(freq)
+        
+        # Existing postings, renumbered; removed documents drop out
+        old_terms = np.repeat(np.arange(len(self.vocab), dtype=np.int32), self.doc_freqs)
+        old_docs = row_map[self.posting_docs]
+        keep = old_docs >= 0
         
-        doc_len = self.doc_lengths[doc_idx]
-        tf_component = (term_freq * (self.k1 + 1)) / (
-            term_freq + self.k1 * (1 - self.b + self.b * doc_len / self.avg_doc_length)
+        self._set_postings(
+            vocab,
+            np.concatenate([old_terms[keep], np.frombuffer(term_ids, dtype=np.int32)]),
+            np.concatenate([old_docs[keep], np.frombuffer(doc_ids, dtype=np.int32)]).astype(np.int32),
+            np.concatenate([np.asarray(self.posting_tfs)[keep], np.frombuffer(tfs, dtype=np.int32)]),
+            doc_lengths,
         )
+    
+    def _set_postings(self, vocab: Dict[str, int], term_ids: np.ndarray,
+                      doc_ids: np.ndarray, tfs: np.ndarray, doc_lengths: np.ndarray):
+        """Install (term, doc, tf) triples as CSR postings plus derived tables."""
+        # Drop terms left without postings, keeping vocabulary order
+        counts = np.bincount(term_ids, minlength=len(vocab))
+        used = counts > 0
+        if not used.all():
+            remap = np.cumsum(used) - 1
+            term_ids = remap[term_ids].astype(np.int32)
+            vocab = {term: int(remap[i]) for term, i in vocab.items() if used[i]}
+            counts = counts[used]
         
-        return idf * tf_component
+        # Group postings by term, doc ids ascending within each term
+        order = np.lexsort((doc_ids, term_ids))
+        
+        self.vocab = vocab
+        self.term_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.posting_docs = doc_ids[order]
+        self.posting_tfs = tfs[order]
+        self.doc_lengths = doc_lengths
+        self.num_docs = len(self.doc_lengths)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.num_docs else 0.0
+        self._precompute()
+        
+        # Per-term score upper bounds for MaxScore pruning
+        if len(self.posting_docs):
+            _, contributions = self._score_postings(
+                np.repeat(np.arange(len(vocab)), counts), slice(None))
+            self.term_upper_bounds = np.maximum.reduceat(contributions, self.term_offsets[:-1])
+        else:
+            self.term_upper_bounds = np.zeros(0, dtype=np.float64)
+    
+    def _precompute(self):
+        """Precompute IDF per term and k1*(1-b+b*len/avg) per document."""
+        df = self.doc_freqs.astype(np.float64)
+        self.idf = np.log((self.num_docs - df + 0.5) / (df + 0.5) + 1)
+        avg = self.avg_doc_length or 1.0
+        self.doc_norms = self.k1 * (1 - self.b + self.b * self.doc_lengths / avg)
+    
+    @property
+    def doc_freqs(self) -> np.ndarray:
+        """Document frequency per term id."""
+        return np.diff(self.term_offsets)
+    
+    def _score_postings(self, term_id, positions) -> Tuple[np.ndarray, np.ndarray]:
+        """Doc ids and BM25 contributions for the given posting positions."""
+        docs = self.posting_docs[positions]
+        tf = self.posting_tfs[positions].astype(np.float64)
+        return docs, self.idf[term_id] * (self.k1 + 1) * tf / (tf + self.doc_norms[docs])
+    
+    def _term_scores(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 contribution of one term for every document in its postings."""
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        return self._score_postings(term_id, slice(start, end))
     
-    def search(self, query: str, top_k: int = 20) -> List[Tuple[int, float]]:
-        """Search for documents matching query."""
-        query_tokens = self._tokenize(query)
+    def _kth_score(self, scores: np.ndarray, doc_ids: np.ndarray, k: int) -> float:
+        """k-th best score among doc_ids (0 if there are fewer than k)."""
+        if len(doc_ids) < k:
+            return 0.0
+        return float(np.partition(scores[doc_ids], len(doc_ids) - k)[len(doc_ids) - k])
+    
+    def _search(self, query: str, top_k: int, mask: Optional[np.ndarray],
+                prune: bool = True,
+                shared: Optional[Dict[int, Tuple[np.ndarray, np.ndarray]]] = None
+                ) -> Tuple[List[Tuple[int, float]], int]:
+        """Ranked results plus the number of postings touched.
         
-        if not query_tokens:
-            return []
+        `shared` maps term ids to already-scored posting lists (search_many).
+        """
+        weights = Counter(self.vocab[t] for t in self._tokenize(query) if t in self.vocab)
+        
+        if not weights or top_k <= 0:
+            return [], 0
+        
+        # Highest-impact terms first; repeated query terms count repeatedly
+        terms = sorted(weights, key=lambda t: (-weights[t] * self.term_upper_bounds[t], t))
+        bounds = [weights[t] * float(self.term_upper_bounds[t]) for t in terms]
+        remaining = np.cumsum(bounds[::-1])[::-1].tolist()[1:] + [0.0]
+        
+        scores = np.zeros(self.num_docs, dtype=np.float64)
+        candidates = None
+        touched = 0
         
-        # Score each document
-        scores = defaultdict(float)
+        for i, term_id in enumerate(terms):
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            
+            scored = shared.get(term_id) if shared else None
+            if candidates is None:
+                # Exhaustive phase: score the whole posting list
+                if scored is None:
+                    docs, contributions = self._score_postings(term_id, slice(start, end))
+                else:
+                    docs, contributions = scored
+                touched += end - start
+            else:
+                # Pruned phase: look up surviving candidates only
+                postings = self.posting_docs[start:end]
+                pos = np.searchsorted(postings, candidates)
+                found = pos < len(postings)
+                found[found] = postings[pos[found]] == candidates[found]
+                if scored is None:
+                    docs, contributions = self._score_postings(term_id, start + pos[found])
+                else:
+                    docs, contributions = postings[pos[found]], scored[1][pos[found]]
+                touched += len(candidates)
+            scores[docs] += weights[term_id] * contributions
+            
+            if not prune or i == len(terms) - 1:
+                continue
+            
+            if candidates is None:
+                seen = np.flatnonzero(scores)
+                if mask is not None:
+                    seen = seen[mask[seen]]
+                # Small slack so float rounding never prunes a true top-k doc
+                threshold = self._kth_score(scores, seen, top_k) * (1 - 1e-9)
+                # Unseen documents can at most reach `remaining[i]`
+                if threshold > 0 and remaining[i] < threshold:
+                    candidates = seen[scores[seen] + remaining[i] >= threshold]
+            else:
+                threshold = self._kth_score(scores, candidates, top_k) * (1 - 1e-9)
+                candidates = candidates[scores[candidates] + remaining[i] >= threshold]
         
-        for token in query_tokens:
-            if token in self.inverted_index:
-                for doc_idx, term_freq in self.inverted_index[token]:
-                    scores[doc_idx] += self._score_bm25(doc_idx, term_freq, token)
+        doc_ids = np.flatnonzero(scores) if candidates is None else candidates
+        if mask is not None and candidates is None:
+            doc_ids = doc_ids[mask[doc_ids]]
+        doc_scores = scores[doc_ids]
+        top = top_k_indices(doc_scores, top_k)
+        return [(int(doc_ids[i]), float(doc_scores[i])) for i in top], int(touched)
+    
+    def search(self, query: str, top_k: int = 20,
+               mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Search for documents matching query.
         
-        # Sort by score
-        sorted_results = sorted(scores.items(), key=lambda x: -x[1])
-        return sorted_results[:top_k]
+        If `mask` is given, only documents whose row is True are ranked.
+        """
+        results, _ = self._search(query, top_k, mask)
+        return results
+    
+    def search_many(self, queries: List[str], top_k: int = 20,
+                    mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """search() for every query in one pass.
+        
+        Posting lists used by more than one query are scored once and shared.
+        """
+        term_queries = Counter()
+        for query in queries:
+            term_queries.update({self.vocab[t] for t in self._tokenize(query) if t in self.vocab})
+        shared = {t: self._term_scores(t) for t, n in term_queries.items() if n > 1}
+        return [self._search(query, top_k, mask, shared=shared)[0] for query in queries]
     
     def save(self, path: Path):
-        """Save BM25 index."""
+        """Save BM25 index (numpy arrays + JSON vocabulary).
+        
+        Files are replaced atomically; other processes keep their mapped
+        arrays until they reload.
+        """
+        for attr, filename in self.FILES.items():
+            save_array(path / filename, getattr(self, attr))
         data = {
             'k1': self.k1,
             'b': self.b,
-            'doc_lengths': self.doc_lengths,
+            'num_docs': self.num_docs,
             'avg_doc_length': self.avg_doc_length,
-            'doc_freqs': dict(self.doc_freqs),
-            'inverted_index': {k: v for k, v in self.inverted_index.items()},
+            'terms': list(self.vocab),
         }
-        with open(path / 'bm25_index.json', 'w') as f:
-            json.dump(data, f)
+        replace_file(path / self.META_FILE, json.dumps(data).encode('utf-8'))
     
     def load(self, path: Path) -> bool:
-        """Load BM25 index."""
+        """Load BM25 index; posting arrays are memory-mapped."""
         try:
-            with open(path / 'bm25_index.json', 'r') as f:
+            with open(path / self.META_FILE, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             self.k1 = data['k1']
             self.b = data['b']
-            self.doc_lengths = data['doc_lengths']
+            self.num_docs = data['num_docs']
             self.avg_doc_length = data['avg_doc_length']
-            self.doc_freqs = defaultdict(int, data['doc_freqs'])
-            self.inverted_index = defaultdict(list)
-            for k, v in data['inverted_index'].items():
-                self.inverted_index[k] = [tuple(x) for x in v]
+            self.vocab = {term: i for i, term in enumerate(data['terms'])}
+            for attr, filename in self.FILES.items():
+                setattr(self, attr, np.load(path / filename, mmap_mode='r'))
+            self._precompute()
             return True
         except:
             return False
 
 
 class SymbolIndex:
-    """Index for code symbols (classes, functions, variables)."""
+    """Index for code symbols (classes, functions, variables).
+    
+    Occurrences point into their chunk's content ('chunk' row, 'offset',
+    'length') instead of copying the context; HybridSearch.find_symbol
+    slices it back out.
     
-    # Patterns for extracting symbols
+    A loaded index is a read-only SymbolTable over memory-mapped arrays
+    (see symbol_store.py); it becomes a dict again on the first change.
+    """
+    
+    # Patterns for extracting symbols; one name per kind of symbol
     PATTERNS = {
-        'as_class': r'class\s+(\w+)',
-        'as_function': r'function\s+(\w+)',
-        'as_var': r'(?:var|const)\s+(\w+)',
-        'py_class': r'class\s+(\w+)',
-        'py_function': r'def\s+(\w+)',
-        'py_var': r'^(\w+)\s*=',
-        'command': r'["\'](\w+\.\w+)["\']',
-        'constant': r'([A-Z_]{3,})\s*[=:]',
+        'class_name': r'class\s+(?P<class_name>\w+)',
+        'as_function': r'function\s+(?P<as_function>\w+)',
+        'as_var': r'(?:var|const)\s+(?P<as_var>\w+)',
+        'py_function': r'def\s+(?P<py_function>\w+)',
+        'py_var': r'^(?P<py_var>\w+)\s*=',
+        'command': r'["\'](?P<command>\w+\.\w+)["\']',
+        'constant': r'(?P<constant>[A-Z_]{3,})\s*[=:]',
     }
+    KIND_PATTERNS = {kind: re.compile(pattern, re.MULTILINE)
+                     for kind, pattern in PATTERNS.items()}
+    
+    # Kinds that declare the name (keyword declarations and top-level
+    # assignments); `constant` matches uses such as `case FOO:` and
+    # `command` quoted references to a handler
+    DECLARATION_KINDS = frozenset({'class_name', 'as_function', 'as_var',
+                                   'py_function', 'py_var'})
+    
+    # Context kept around each match (characters before / after)
+    CONTEXT_BEFORE = 50
+    CONTEXT_AFTER = 100
     
     def __init__(self):
-        self.symbols: Dict[str, List[Dict]] = defaultdict(list)
+        self.symbols: Mapping[str, List[Dict]] = defaultdict(list)
+        # Name lookups, built on first partial / fuzzy find_symbol; the lock
+        # makes concurrent first lookups share one build
+        self._names: Optional[TrigramIndex] = None
+        self._fuzzy: Optional[DeletionIndex] = None
+        self._lookup_lock = threading.Lock()
         
     def extract_symbols(self, content: str, file_path: str, 
-                       category: str, start_line: int) -> List[str]:
-        """Extract code symbols from content."""
+                       category: str, start_line: int, chunk: int = None) -> List[str]:
+        """Extract code symbols from content (chunk: its row in the chunk table)."""
+        self._writable()
         found = []
+        line = start_line
+        line_start = 0  # offset up to which newlines are counted into `line`
+        spans = set()  # symbol spans already recorded
         
-        for pattern_name, pattern in self.PATTERNS.items():
-            for match in re.finditer(pattern, content, re.MULTILINE):
-                symbol = match.group(1)
-                if len(symbol) >= 2:
-                    found.append(symbol)
-                    
-                    # Calculate approximate line number
-                    line_offset = content[:match.start()].count('\n')
-                    
-                    self.symbols[symbol.lower()].append({
-                        'symbol': symbol,
-                        'file': file_path,
-                        'category': category,
-                        'line': start_line + line_offset,
-                        'context': content[max(0, match.start()-50):match.end()+100],
-                    })
+        for kind, match in self._matches(content):
+            # `const FOO:` is both a var and a constant; keep the first kind
+            span = match.span(kind)
+            symbol = match.group(kind)
+            if len(symbol) < 2 or span in spans:
+                continue
+            spans.add(span)
+            found.append(symbol)
+            
+            # Matches come in order, so count only the newlines since the last one
+            start = match.start()
+            line += content.count('\n', line_start, start)
+            line_start = start
+            
+            context_start = max(0, start - self.CONTEXT_BEFORE)
+            context_end = min(len(content), match.end() + self.CONTEXT_AFTER)
+            
+            key = symbol.lower()
+            if key not in self.symbols:
+                self._keys_changed()
+            self.symbols[key].append({
+                'symbol': symbol,
+                'file': file_path,
+                'category': category,
+                'kind': kind,
+                'line': line,
+                'chunk': chunk,
+                'offset': context_start,
+                'length': context_end - context_start,
+            })
         
         return found
     
-    def find_symbol(self, name: str) -> List[Dict]:
-        """Find all occurrences of a symbol."""
+    def _matches(self, content: str) -> List[Tuple[str, 're.Match']]:
+        """(kind, match) for every kind's matches, in order of position.
+        
+        One finditer pass per kind, so matches of different kinds may overlap
+        (`class function foo` holds a class and a function). Each pattern
+        starts with a literal or a narrow character class the regex engine
+        skips ahead to, so these passes together are faster than a single
+        alternation of all kinds, which tries every position.
+        """
+        matches = [(kind, match) for kind, pattern in self.KIND_PATTERNS.items()
+                   for match in pattern.finditer(content)]
+        # Stable: kinds matching at the same position stay in PATTERNS order
+        matches.sort(key=lambda item: item[1].start())
+        return matches
+    
+    def remove_files(self, files: Set[str]):
+        """Drop every occurrence found in `files` (before re-extracting them)."""
+        if not files:
+            return
+        self._writable()
+        for key in list(self.symbols):
+            kept = [occ for occ in self.symbols[key] if occ['file'] not in files]
+            if kept:
+                self.symbols[key] = kept
+            else:
+                del self.symbols[key]
+                self._keys_changed()
+    
+    def renumber_chunks(self, row_map: np.ndarray):
+        """Point occurrences at their chunks' new rows (row_map[old] = new, -1 = gone)."""
+        self._writable()
+        for key in list(self.symbols):
+            kept = []
+            for occ in self.symbols[key]:
+                if occ.get('chunk') is not None:
+                    row = int(row_map[occ['chunk']]) if occ['chunk'] < len(row_map) else -1
+                    if row < 0:
+                        continue
+                    occ['chunk'] = row
+                kept.append(occ)
+            if kept:
+                self.symbols[key] = kept
+            else:
+                del self.symbols[key]
+                self._keys_changed()
+    
+    def sort(self):
+        """Put occurrences in chunk order and keys in first-occurrence order.
+        
+        That is the order extracting every chunk row by row produces (keys
+        first seen at the same context offset are ordered by name), so an
+        index patched by an incremental build matches a full rebuild.
+        Occurrences need chunk rows, as HybridSearch extracts them.
+        """
+        self._writable()
+        position = itemgetter('chunk', 'offset')
+        symbols = self.symbols
+        for occurrences in symbols.values():
+            if len(occurrences) > 1:
+                occurrences.sort(key=position)
+        keys = sorted(symbols, key=lambda key: (position(symbols[key][0]), key))
+        self.symbols = defaultdict(list, ((key, symbols[key]) for key in keys))
+        self._keys_changed()
+    
+    def _writable(self):
+        """Turn a loaded SymbolTable back into a dict before changing it."""
+        if isinstance(self.symbols, SymbolTable):
+            table = self.symbols
+            self.symbols = defaultdict(list, ((key, table[key]) for key in table))
+    
+    def _keys_changed(self):
+        with self._lookup_lock:
+            self._names = None
+            self._fuzzy = None
+    
+    def _name_index(self) -> TrigramIndex:
+        names = self._names
+        if names is None:
+            with self._lookup_lock:
+                names = self._names
+                if names is None:
+                    names = self._names = TrigramIndex(self.symbols)
+        return names
+    
+    def _fuzzy_index(self) -> DeletionIndex:
+        fuzzy = self._fuzzy
+        if fuzzy is None:
+            with self._lookup_lock:
+                fuzzy = self._fuzzy
+                if fuzzy is None:
+                    fuzzy = self._fuzzy = DeletionIndex(self.symbols)
+        return fuzzy
+    
+    def _is_declaration(self, occurrence: Dict) -> bool:
+        return occurrence.get('kind') in self.DECLARATION_KINDS
+    
+    def _declares(self, key: str) -> bool:
+        """Whether any occurrence under `key` declares it."""
+        symbols = self.symbols
+        if isinstance(symbols, SymbolTable):
+            return not symbols.key_kinds(key).isdisjoint(self.DECLARATION_KINDS)
+        return any(map(self._is_declaration, symbols.get(key, ())))
+    
+    def _declarations_first(self, occurrences: List[Dict]) -> List[Dict]:
+        return sorted(occurrences, key=lambda occ: not self._is_declaration(occ))
+    
+    def find_symbol(self, name: str, fuzzy: bool = False) -> List[Dict]:
+        """Find all occurrences of a symbol.
+        
+        Falls back to partial matches, or with fuzzy=True to the names
+        closest in edit distance (up to SYMBOL_FUZZY_DISTANCE).
+        """
         name_lower = name.lower()
         
-        # Exact match
+        # Exact match: declarations first, then usages, each in index order
         if name_lower in self.symbols:
-            return self.symbols[name_lower]
+            return self._declarations_first(self.symbols[name_lower])
         
-        # Partial match
-        results = []
-        for sym, occurrences in self.symbols.items():
-            if name_lower in sym or sym in name_lower:
-                results.extend(occurrences)
+        # Rank keys (names that are declared somewhere before names only
+        # used), then list each key's declarations before its usages
+        if fuzzy:
+            # Closest names first
+            index = self._fuzzy_index()
+            keys = [(index.keys[i], distance) for i, distance in index.lookup(name_lower)]
+            keys.sort(key=lambda match: (match[1], not self._declares(match[0])))
+            return self._first_occurrences(key for key, _ in keys)
         
-        return results[:20]
+        # Partial match: name in symbol or symbol in name; prefix matches first
+        names = self._name_index()
+        keys = [names.keys[i] for i in names.partial(name_lower)]
+        keys.sort(key=lambda key: (not self._declares(key),
+                                   not key.startswith(name_lower)))
+        return self._first_occurrences(keys)
+    
+    def _first_occurrences(self, keys: Iterable[str], limit: int = 20) -> List[Dict]:
+        results = []
+        for key in keys:
+            results.extend(self._declarations_first(self.symbols.get(key, ())))
+            if len(results) >= limit:
+                break
+        return results[:limit]
     
     def save(self, path: Path):
-        """Save symbol index."""
-        with open(path / 'symbol_index.json', 'w') as f:
-            json.dump(dict(self.symbols), f)
+        """Save symbol index (symbol_store arrays)."""
+        SymbolTable.save(path, self.symbols)
     
     def load(self, path: Path) -> bool:
-        """Load symbol index."""
+        """Load symbol index; occurrence arrays are memory-mapped.
+        
+        A symbol_index.json with chunk references and kinds is converted
+        once. Older layouts (copied contexts, no kinds) are refused, so the
+        caller re-extracts from the chunk table.
+        """
         try:
-            with open(path / 'symbol_index.json', 'r') as f:
-                data = json.load(f)
-            self.symbols = defaultdict(list, data)
+            table = SymbolTable.load(path)
+            if table is None:
+                with open(path / SYMBOLS_LEGACY_FILE, 'r') as f:
+                    data = json.load(f)
+                if not all('chunk' in occ and 'kind' in occ
+                           for occurrences in data.values() for occ in occurrences):
+                    return False
+                SymbolTable.save(path, data)
+                table = SymbolTable.load(path)
+            self.symbols = table
+            self._keys_changed()
             return True
         except:
             return False
@@ -246,44 +628,73 @@ class HybridSearch:
     def __init__(self):
         self.bm25 = BM25Index()
         self.symbols = SymbolIndex()
-        self.chunks: List[Dict] = []
-        self.embeddings: np.ndarray = None
-        self.embedding_model = None
+        self.chunks: ChunkStore = ChunkStore.from_dicts([])
+        self.embeddings: np.ndarray = None  # float32, unit-length rows
+        self.vector_index = None  # FlatIndex or IVFIndex over self.embeddings
+        self._embedding_model = None  # loaded on first semantic use
+        self._model_lock = threading.Lock()
+        self.query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE)
+        self.metadata: Dict = {}
+        self.category_masks: Dict[str, np.ndarray] = {}
+        
+    def load_index(self, index_path: Path = INDEX_PATH,
+                   quantization: Optional[str] = None) -> bool:
+        """Load all indexes.
         
-    def load_index(self, index_path: Path = INDEX_PATH) -> bool:
-        """Load all indexes."""
+        quantization: "int8" or "float16" to find vector candidates over a
+        compact copy of the embeddings (defaults to config, then to whatever
+        the index was saved with). Without a saved copy from the current
+        build, one is quantized in memory.
+        """
         try:
-            # Load chunks
-            with open(index_path / 'chunks.json', 'r') as f:
-                self.chunks = json.load(f)
+            # Load chunk table (content is decoded lazily per result)
+            with profile.phase("load chunks"):
+                self.chunks = ChunkStore.load_or_convert(index_path)
             
-            # Load embeddings
-            self.embeddings = np.load(index_path / 'embeddings.npy')
+            # Index metadata (optional for older indexes)
+            metadata_file = index_path / 'metadata.json'
+            if metadata_file.exists():
+                with open(metadata_file, 'r', encoding='utf-8') as f:
+                    self.metadata = json.load(f)
+            
+            # Load embeddings (memory-mapped when the on-disk layout allows it)
+            with profile.phase("load embeddings"):
+                self.embeddings = load_embeddings(
+                    index_path / 'embeddings.npy',
+                    normalized=self.metadata.get('embeddings_normalized'),
+                    mmap=EMBEDDINGS_MMAP,
+                )
+                compact = self._load_compact(
+                    index_path,
+                    quantization or EMBEDDING_QUANTIZATION
+                    or self.metadata.get('embedding_quantization'),
+                )
+                self.vector_index = load_vector_index(
+                    index_path, self.embeddings, VECTOR_INDEX,
+                    nprobe=IVF_NPROBE,
+                    compact=compact, rescore_factor=RESCORE_FACTOR,
+                    build_id=self.metadata.get('build_id'),
+                )
+            
+            # Per-category row masks for filtering inside the scorers
+            self.category_masks = self.chunks.category_masks()
             
             # Load or build BM25
-            if not self.bm25.load(index_path):
-                # print("Building BM25 index...")  # DISABLED - corrupts MCP stdout
-                self.bm25.build(self.chunks)
-                self.bm25.save(index_path)
+            with profile.phase("load bm25"):
+                if not self.bm25.load(index_path) or self.bm25.num_docs != len(self.chunks):
+                    # print("Building BM25 index...")  # DISABLED - corrupts MCP stdout
+                    self.bm25.build(self.chunks)
+                    self.bm25.save(index_path)
             
             # Load or build symbol index
-            if not self.symbols.load(index_path):
-                # print("Building symbol index...")  # DISABLED - corrupts MCP stdout
-                for chunk in self.chunks:
-                    self.symbols.extract_symbols(
-                        chunk['content'],
-                        chunk['file_path'],
-                        chunk['category'],
-                        chunk['start_line']
-                    )
-                self.symbols.save(index_path)
-            
-            # Load embedding model (suppress library output for MCP)
-            _suppress_library_output()
-            from sentence_transformers import SentenceTransformer
-            from .config import EMBEDDING_MODEL
-            self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+            with profile.phase("load symbols"):
+                if not self.symbols.load(index_path):
+                    # print("Building symbol index...")  # DISABLED - corrupts MCP stdout
+                    self._extract_symbols(range(len(self.chunks)))
+                    self.symbols.save(index_path)
             
+            # The embedding model is loaded on first semantic use (or by
+            # warm_model()), so lexical and symbol lookups never wait on it
             return True
         except Exception as e:
             # Log error to file (NOT stdout/stderr - would corrupt MCP)
@@ -294,16 +705,147 @@ class HybridSearch:
                 f.write(f"\n=== load_index error ===\n{traceback.format_exc()}\n")
             return False
     
-    def _semantic_search(self, query: str, top_k: int = 20) -> List[Tuple[int, float]]:
+    @property
+    def embedding_model(self):
+        """The query encoder, loaded on first access."""
+        if self._embedding_model is None:
+            with self._model_lock:
+                if self._embedding_model is None:
+                    # Suppress library output for MCP
+                    _suppress_library_output()
+                    from .encoders import load_embedding_model
+                    with profile.phase("load embedding model"):
+                        self._embedding_model = load_embedding_model()
+        return self._embedding_model
+    
+    @embedding_model.setter
+    def embedding_model(self, model):
+        self._embedding_model = model
+    
+    @property
+    def model_loaded(self) -> bool:
+        return self._embedding_model is not None
+    
+    def warm_model(self) -> threading.Thread:
+        """Load the embedding model in a background thread.
+        
+        Semantic queries arriving meanwhile wait for the same load instead
+        of starting a second one; everything else is served immediately.
+        """
+        def load():
+            try:
+                self.embedding_model
+            except Exception:
+                # Retried (and raised) by the first semantic query
+                logging.getLogger(__name__).exception("Embedding model warm-up failed")
+        
+        thread = threading.Thread(target=load, name="embedding-warmup", daemon=True)
+        thread.start()
+        return thread
+    
+    def _extract_symbols(self, rows: Iterable[int]):
+        """Add the symbols of the given chunk rows to the symbol index.
+        
+        Rows may come in any order (e.g. only changed ones); the index is
+        then sorted, so it ends up the same as extracting every row.
+        """
+        for row in rows:
+            chunk = self.chunks[row]
+            self.symbols.extract_symbols(
+                chunk['content'],
+                chunk['file_path'],
+                chunk['category'],
+                chunk['start_line'],
+                chunk=int(row),
+            )
+        self.symbols.sort()
+    
+    def update_lexical_indexes(self, index_path: Path = INDEX_PATH, delta=None):
+        """Bring the BM25 and symbol indexes in line with the saved chunks.
+        
+        `delta` (manifest.BuildDelta from an incremental build) limits the
+        work to changed files: BM25 postings are renumbered and patched and
+        only changed files' symbols are re-extracted. Without it, or if the
+        saved indexes weren't built from the previous build (recorded in
+        lexical_build.json), both are rebuilt.
+        """
+        self.chunks = ChunkStore.load(index_path)
+        with open(index_path / 'metadata.json', 'r', encoding='utf-8') as f:
+            build_id = json.load(f).get('build_id')
+        
+        # Patch only if the saved indexes were built from the previous rows
+        patchable = (delta is not None and delta.previous_build is not None
+                     and self._lexical_build(index_path) == delta.previous_build
+                     and self.bm25.load(index_path) and self.symbols.load(index_path)
+                     and self.bm25.num_docs == len(delta.row_map))
+        
+        if not patchable:
+            self.bm25 = BM25Index()
+            self.bm25.build(self.chunks)
+            self.symbols = SymbolIndex()
+            self._extract_symbols(range(len(self.chunks)))
+        elif not delta.unchanged:
+            self.bm25.patch(delta.row_map,
+                            ((row, self.chunks[row]) for row in delta.added_rows),
+                            len(self.chunks))
+            self.symbols.remove_files(delta.removed_files)
+            self.symbols.renumber_chunks(delta.row_map)
+            self._extract_symbols(delta.added_rows)
+        
+        if not patchable or not delta.unchanged:
+            (index_path / LEXICAL_BUILD_FILE).unlink(missing_ok=True)
+            self.bm25.save(index_path)
+            self.symbols.save(index_path)
+        if build_id:
+            replace_file(index_path / LEXICAL_BUILD_FILE,
+                         json.dumps({'build_id': build_id}).encode('utf-8'))
+    
+    @staticmethod
+    def _lexical_build(index_path: Path) -> Optional[str]:
+        """Build id the saved lexical indexes cover, if recorded."""
+        try:
+            with open(index_path / LEXICAL_BUILD_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f).get('build_id')
+        except (OSError, ValueError):
+            return None
+    
+    def _load_compact(self, index_path: Path,
+                      quantization: Optional[str]) -> Optional[QuantizedEmbeddings]:
+        """Open the saved quantized embeddings, or quantize in memory if the
+        index was saved without a current copy (loading never writes files)."""
+        if not quantization:
+            return None
+        compact = QuantizedEmbeddings.load(index_path, quantization, len(self.embeddings),
+                                           self.metadata.get('build_id'))
+        if compact is None:
+            compact = QuantizedEmbeddings.quantize(self.embeddings, quantization)
+        return compact
+    
+    def _category_mask(self, categories: Optional[List[str]]) -> Optional[np.ndarray]:
+        """Row mask for the allowed categories (None = all rows)."""
+        return combine_category_masks(self.category_masks, categories, len(self.chunks))
+    
+    def _semantic_search(self, query: str, top_k: int = 20,
+                         mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
         """Semantic search using embeddings."""
-        query_embedding = self.embedding_model.encode([query])[0]
+        if top_k <= 0:
+            return []
+        query_embedding = self.query_cache.encode(self.embedding_model, query)
         
-        similarities = np.dot(self.embeddings, query_embedding) / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_embedding) + 1e-8
-        )
+        if self.vector_index is None:
+            self.vector_index = FlatIndex(self.embeddings)
+        return self.vector_index.search(query_embedding, top_k, mask)
+    
+    def _semantic_search_many(self, queries: List[str], top_k: int = 20,
+                              mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """Semantic search for a batch: one encode call, one GEMM."""
+        if top_k <= 0:
+            return [[] for _ in queries]
+        query_embeddings = self.query_cache.encode_many(self.embedding_model, queries)
         
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        return [(idx, float(similarities[idx])) for idx in top_indices]
+        if self.vector_index is None:
+            self.vector_index = FlatIndex(self.embeddings)
+        return self.vector_index.search_many(query_embeddings, top_k, mask)
     
     def _reciprocal_rank_fusion(self, 
                                 lexical_results: List[Tuple[int, float]],
@@ -337,15 +879,45 @@ class HybridSearch:
                final_k: int = 8,
                categories: List[str] = None,
                min_score: float = 0.1) -> List[SearchResult]:
-        """Hybrid search with rank fusion."""
+        """Hybrid search with rank fusion (k_vector=0: lexical only, no model)."""
+        
+        # Category filtering happens inside both scorers, before top-k
+        mask = self._category_mask(categories)
         
         # Get lexical results
-        lexical_results = self.bm25.search(query, top_k=k_lexical)
+        lexical_results = self.bm25.search(query, top_k=k_lexical, mask=mask)
         
         # Get semantic results
-        semantic_results = self._semantic_search(query, top_k=k_vector)
+        semantic_results = self._semantic_search(query, top_k=k_vector, mask=mask)
         
-        # Fuse results
+        return self._fuse(lexical_results, semantic_results, final_k, min_score)
+    
+    def search_many(self, queries: List[str],
+                    k_lexical: int = 20,
+                    k_vector: int = 20,
+                    final_k: int = 8,
+                    categories: List[str] = None,
+                    min_score: float = 0.1) -> List[List[SearchResult]]:
+        """Hybrid search for several queries at once.
+        
+        Returns the same per-query lists as calling search() in a loop, but
+        encodes all queries in one batch, scores them with one matrix-matrix
+        multiply and shares BM25 posting lists between queries.
+        """
+        if not queries:
+            return []
+        
+        mask = self._category_mask(categories)
+        lexical_results = self.bm25.search_many(queries, top_k=k_lexical, mask=mask)
+        semantic_results = self._semantic_search_many(queries, top_k=k_vector, mask=mask)
+        
+        return [self._fuse(lexical, semantic, final_k, min_score)
+                for lexical, semantic in zip(lexical_results, semantic_results)]
+    
+    def _fuse(self, lexical_results: List[Tuple[int, float]],
+              semantic_results: List[Tuple[int, float]],
+              final_k: int, min_score: float) -> List[SearchResult]:
+        """Rank-fuse one query's lexical and semantic hits into SearchResults."""
         fused = self._reciprocal_rank_fusion(lexical_results, semantic_results)
         
         # Build results
@@ -353,10 +925,6 @@ class HybridSearch:
         for doc_idx, rrf_score, lex_score, sem_score in fused[:final_k * 2]:
             chunk = self.chunks[doc_idx]
             
-            # Filter by category
-            if categories and chunk['category'] not in categories:
-                continue
-            
             # Filter by minimum score
             if rrf_score < min_score:
                 continue
@@ -378,13 +946,31 @@ class HybridSearch:
         
         return results
     
-    def find_symbol(self, name: str) -> List[Dict]:
+    def find_symbol(self, name: str, fuzzy: bool = False) -> List[Dict]:
         """Find symbol definitions/usages."""
-        return self.symbols.find_symbol(name)
+        return [self._with_context(occ) for occ in self.symbols.find_symbol(name, fuzzy=fuzzy)]
+    
+    def _with_context(self, occurrence: Dict) -> Dict:
+        """Occurrence with its context text sliced out of the chunk content."""
+        row = occurrence.get('chunk')
+        if row is None:
+            return occurrence
+        resolved = {key: value for key, value in occurrence.items()
+                    if key not in ('chunk', 'offset', 'length')}
+        if 0 <= row < len(self.chunks):
+            start = occurrence['offset']
+            resolved['context'] = self.chunks.content(row)[start:start + occurrence['length']]
+        else:
+            resolved['context'] = ''
+        return resolved
+
+
+def update_lexical_indexes(index_path: Path = INDEX_PATH, delta=None):
+    """Patch (or rebuild) bm25_* and symbol_* after an index build."""
+    HybridSearch().update_lexical_indexes(index_path, delta)
 
 
 # Singleton with thread safety
-import threading
 _hybrid_search = None
 _hybrid_search_lock = threading.Lock()
 
@@ -399,5 +985,7 @@ def get_hybrid_search() -> HybridSearch:
                 _suppress_library_output()
                 hs = HybridSearch()
                 hs.load_index()
+                if EMBEDDING_WARMUP:
+                    hs.warm_model()
                 _hybrid_search = hs
     return _hybrid_search
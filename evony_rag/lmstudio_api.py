@@ -8,15 +8,18 @@ import json
 import time
 import uuid
 from typing import Dict, Any, List, Optional
-from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 
-from .config import LMSTUDIO_URL
+from .config import LMSTUDIO_URL, HTTP_WORKERS
 from .rag_engine import get_rag
+from .http_server import PooledRequestHandler, make_server
 
 
-class EvonyAPIHandler(BaseHTTPRequestHandler):
-    """HTTP handler for OpenAI-compatible API with RAG."""
+class EvonyAPIHandler(PooledRequestHandler):
+    """HTTP handler for OpenAI-compatible API with RAG.
+    
+    Runs on several worker threads at once; rag is shared.
+    """
     
     rag = None
     
@@ -26,11 +29,13 @@ class EvonyAPIHandler(BaseHTTPRequestHandler):
     
     def send_json(self, data: Dict, status: int = 200):
         """Send JSON response."""
+        body = json.dumps(data).encode()
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
     
     def do_OPTIONS(self):
         """Handle CORS preflight."""
@@ -38,6 +43,7 @@ class EvonyAPIHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def do_GET(self):
@@ -214,7 +220,7 @@ class EvonyAPIHandler(BaseHTTPRequestHandler):
         })
 
 
-def run_api_server(host: str = "localhost", port: int = 8766):
+def run_api_server(host: str = "localhost", port: int = 8766, workers: int = HTTP_WORKERS):
     """Run the API server."""
     # Initialize RAG
     rag = get_rag()
@@ -226,12 +232,13 @@ def run_api_server(host: str = "localhost", port: int = 8766):
     
     EvonyAPIHandler.rag = rag
     
-    server = HTTPServer((host, port), EvonyAPIHandler)
+    server = make_server(host, port, EvonyAPIHandler, workers=workers)
     
     print(f"\n{'='*60}")
     print("EVONY KNOWLEDGE API SERVER")
     print(f"{'='*60}")
     print(f"Listening on http://{host}:{port}")
+    print(f"Workers: {workers or 'serial'}")
     print(f"Index: {rag.get_stats().get('num_chunks', 0)} chunks")
     print(f"\nEndpoints:")
     print(f"  POST /v1/chat/completions  - OpenAI-compatible chat")
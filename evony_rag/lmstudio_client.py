@@ -0,0 +1,120 @@
+"""
+Evony RAG - LM Studio Client
+=============================
+One pooled HTTP client for LM Studio's OpenAI-compatible API, shared by
+both RAG engines.
+
+A requests.Session keeps up to LMSTUDIO_POOL_SIZE keep-alive connections,
+so answers skip the TCP handshake. stream_chat() sends `stream: true` and
+yields content deltas as LM Studio produces them; LMSTUDIO_READ_TIMEOUT
+then bounds the gap between tokens rather than the whole answer.
+
+    client = get_lmstudio_client()
+    for token in client.stream_chat(messages):
+        ...
+"""
+
+import json
+import threading
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import (
+    LMSTUDIO_URL, LMSTUDIO_POOL_SIZE, LMSTUDIO_CONNECT_TIMEOUT, LMSTUDIO_READ_TIMEOUT,
+)
+
+
+class LMStudioClient:
+    """Keep-alive chat completions client (thread-safe)."""
+
+    def __init__(self, base_url: str = LMSTUDIO_URL, pool_size: int = LMSTUDIO_POOL_SIZE,
+                 connect_timeout: float = LMSTUDIO_CONNECT_TIMEOUT,
+                 read_timeout: float = LMSTUDIO_READ_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _payload(self, messages: List[Dict], model: Optional[str], temperature: float,
+                 max_tokens: int, stream: bool) -> Dict:
+        payload = {
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if model:
+            payload["model"] = model
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def chat(self, messages: List[Dict], model: Optional[str] = None,
+             temperature: float = 0.7, max_tokens: int = 1024) -> Optional[str]:
+        """Full completion text, or None if LM Studio is unreachable or fails."""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/chat/completions",
+                json=self._payload(messages, model, temperature, max_tokens, stream=False),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"]
+        except (requests.RequestException, ValueError, KeyError, IndexError, TypeError):
+            # TypeError: null "choices"/"message" in an error-shaped reply
+            return None
+
+    def stream_chat(self, messages: List[Dict], model: Optional[str] = None,
+                    temperature: float = 0.7, max_tokens: int = 1024) -> Iterator[str]:
+        """Yield content deltas as they arrive.
+
+        Raises requests.RequestException if LM Studio can't be reached or
+        fails before or during the stream.
+        """
+        with self.session.post(
+            f"{self.base_url}/chat/completions",
+            json=self._payload(messages, model, temperature, max_tokens, stream=True),
+            timeout=self.timeout,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            # Server-sent events: "data: {chunk}" lines, ending with "data: [DONE]"
+            lines = response.iter_lines(chunk_size=None, decode_unicode=False)
+            for line in lines:
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    # Read to the end so the connection goes back to the pool
+                    for _ in lines:
+                        pass
+                    return
+                try:
+                    chunk = json.loads(data)
+                    delta = (chunk["choices"][0].get("delta") or {}).get("content")
+                except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                    continue
+                if delta:
+                    yield delta
+
+    def close(self):
+        self.session.close()
+
+
+# Shared clients, one per base URL
+_clients: Dict[str, LMStudioClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_lmstudio_client(base_url: str = LMSTUDIO_URL) -> LMStudioClient:
+    """Get the shared client for base_url (thread-safe)."""
+    client = _clients.get(base_url)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(base_url)
+            if client is None:
+                client = _clients[base_url] = LMStudioClient(base_url)
+    return client
@@ -0,0 +1,99 @@
+"""
+Evony RAG - Build Manifest
+===========================
+Per-file content hashes recorded at build time, so a rebuild only
+re-chunks and re-embeds files that were added or changed.
+
+manifest.json (in the index directory):
+    {
+      "settings": {model, chunk_size, chunk_overlap, max_chunks_per_file},
+      "num_rows": total chunk rows,
+      "files": {rel_path: {sha1, size, mtime_ns, category, rows: [start, end]}}
+    }
+
+A file's chunks occupy rows [start, end) of the chunk table and of
+embeddings.npy. size/mtime_ns let unchanged files skip re-hashing.
+"""
+
+import json
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+import numpy as np
+
+from .vectors import replace_file
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def file_sha1(path: Path) -> str:
+    """SHA-1 of a file's bytes."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class BuildDelta:
+    """How a rebuild's rows relate to the previous build's."""
+    row_map: np.ndarray     # old row -> new row, -1 if dropped
+    added_rows: np.ndarray  # new rows that were (re-)chunked and embedded
+    removed_files: Set[str]  # files whose old rows were dropped
+    previous_build: Optional[str] = None  # metadata.json build id of the old rows
+
+    @property
+    def unchanged(self) -> bool:
+        return (not len(self.added_rows) and not self.removed_files
+                and bool(np.all(self.row_map == np.arange(len(self.row_map)))))
+
+
+class Manifest:
+    """File hashes and row ranges of one build."""
+
+    def __init__(self, settings: Dict, files: Optional[Dict[str, Dict]] = None):
+        self.settings = settings
+        self.files: Dict[str, Dict] = files or {}
+
+    @property
+    def num_rows(self) -> int:
+        return max((entry['rows'][1] for entry in self.files.values()), default=0)
+
+    def sha1(self, rel_path: str, path: Path) -> str:
+        """Content hash, reusing the recorded one if size and mtime match."""
+        stat = path.stat()
+        entry = self.files.get(rel_path)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha1']
+        return file_sha1(path)
+
+    def add(self, rel_path: str, path: Path, sha1: str, category: str,
+            start: int, end: int):
+        stat = path.stat()
+        self.files[rel_path] = {
+            'sha1': sha1,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'category': category,
+            'rows': [start, end],
+        }
+
+    @classmethod
+    def load(cls, index_path: Path) -> Optional['Manifest']:
+        try:
+            with open(index_path / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(data['settings'], data['files'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, index_path: Path):
+        """Write manifest.json atomically (it decides which rows get reused)."""
+        replace_file(index_path / MANIFEST_FILE, json.dumps({
+            'settings': self.settings,
+            'num_rows': self.num_rows,
+            'files': self.files,
+        }).encode('utf-8'))
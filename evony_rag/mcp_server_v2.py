@@ -101,8 +101,8 @@ class EvonyMCPServerV2:
             }
         
         elif name == "evony.symbol":
-            # evony.symbol(name)
-            results = self.rag.find_symbol(args.get("name", ""))
+            # evony.symbol(name, fuzzy?)
+            results = self.rag.find_symbol(args.get("name", ""), fuzzy=bool(args.get("fuzzy")))
             return {
                 "symbol": args.get("name"),
                 "occurrences": results[:20],
@@ -195,6 +195,7 @@ class EvonyMCPServerV2:
                     "type": "object",
                     "properties": {
                         "name": {"type": "string", "description": "Symbol name (e.g., ACTION_KEY, army.newArmy)"},
+                        "fuzzy": {"type": "boolean", "description": "Match closest names by edit distance (typos, obfuscated names)"},
                     },
                     "required": ["name"]
                 }
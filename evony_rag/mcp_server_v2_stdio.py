@@ -2,17 +2,31 @@
 Evony RAG v2 - MCP Server (stdio) with Debug Logging
 =====================================================
 MCP server using stdio for Windsurf IDE integration.
+
+Concurrency: the stdin loop answers initialize/ping/tools/list inline and
+hands tools/call requests to a pool of MCP_MAX_CONCURRENCY workers, so a
+slow evony_answer never blocks the requests behind it. Responses go out in
+completion order (clients match them by JSON-RPC id) through one writer
+thread that owns stdout. `notifications/cancelled` drops a queued request,
+and a running one stops at its next checkpoint without sending a response.
 """
 
+import os
 import sys
 import json
 import logging
 import traceback
 import threading
 import time
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+# Imported first so profile offsets start at process startup
+from .startup_profile import profile
+from .config import STARTUP_PROFILE, MCP_MAX_CONCURRENCY
 
 # Setup logging to file
 LOG_DIR = Path(__file__).parent / "logs"
@@ -37,57 +51,114 @@ logger.info(f"Python: {sys.version}")
 logger.info(f"Working dir: {Path.cwd()}")
 logger.info("=" * 60)
 
+if STARTUP_PROFILE or os.environ.get("EVONY_STARTUP_PROFILE") == "1":
+    PROFILE_FILE = LOG_DIR / f"startup_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    profile.enable(PROFILE_FILE)
+    logger.info(f"Startup profile: {PROFILE_FILE}")
+
 
 class ProgressIndicator:
-    """Progress indicator - logs only, no stderr (Windsurf treats stderr as error)."""
+    """Progress indicator - logs only, no stderr (Windsurf treats stderr as error).
+    
+    Tracks one task per thread (tool calls run concurrently in workers).
+    """
     
     def __init__(self):
-        self._task = ""
-        self._start_time = 0
+        self._local = threading.local()
         
     def start(self, task: str):
         """Start tracking a task."""
-        self._task = task
-        self._start_time = time.time()
+        self._local.task = task
+        self._local.start_time = time.time()
         logger.info(f"[PROGRESS] Started: {task}")
         
     def stop(self, result: str = "done"):
         """Stop tracking."""
-        elapsed = time.time() - self._start_time
-        logger.info(f"[PROGRESS] Completed: {self._task} in {elapsed:.1f}s - {result}")
+        elapsed = time.time() - getattr(self._local, 'start_time', time.time())
+        logger.info(f"[PROGRESS] Completed: {getattr(self._local, 'task', '')} in {elapsed:.1f}s - {result}")
         
     def error(self, msg: str):
         """Log error."""
-        elapsed = time.time() - self._start_time
-        logger.error(f"[PROGRESS] Error: {self._task} ({elapsed:.1f}s) - {msg}")
+        elapsed = time.time() - getattr(self._local, 'start_time', time.time())
+        logger.error(f"[PROGRESS] Error: {getattr(self._local, 'task', '')} ({elapsed:.1f}s) - {msg}")
 
 
 # Global progress indicator
 progress = ProgressIndicator()
 
+
+class RequestCancelled(Exception):
+    """Raised in a worker once the client has cancelled its request."""
+
+
+class InFlightRequest:
+    """A tools/call request queued or running in the worker pool."""
+    
+    def __init__(self, req_id: Any):
+        self.req_id = req_id
+        self.cancelled = threading.Event()
+        self.future: Optional[Future] = None
+
+
+# Requests in the pool by JSON-RPC id; the request a worker is running
+_inflight: Dict[Any, InFlightRequest] = {}
+_inflight_lock = threading.Lock()
+_worker = threading.local()
+
+
+def check_cancelled():
+    """Abort the current tool call if its request was cancelled."""
+    current = getattr(_worker, "request", None)
+    if current is not None and current.cancelled.is_set():
+        raise RequestCancelled(f"request {current.req_id} cancelled")
+
+
+def cancel_request(req_id: Any, reason: str = ""):
+    """Handle notifications/cancelled for req_id."""
+    with _inflight_lock:
+        inflight = _inflight.get(req_id)
+    if inflight is None:
+        logger.info(f"Cancel for id={req_id} ignored (already finished or unknown)")
+        return
+    inflight.cancelled.set()
+    if inflight.future is not None and inflight.future.cancel():
+        # Never started: the worker won't run, so clean up here
+        with _inflight_lock:
+            _inflight.pop(req_id, None)
+        logger.info(f"Cancelled queued request id={req_id} {reason}")
+    else:
+        logger.info(f"Cancelling running request id={req_id} {reason}")
+
 # Lazy imports to speed up startup
 _rag = None
+_rag_lock = threading.Lock()
 _policy = None
 _init_error = None
 
 def get_rag():
-    """Lazy load RAG engine."""
+    """Lazy load RAG engine (thread-safe: the background preload and the
+    first tool calls share one load)."""
     global _rag, _init_error
-    if _init_error:
-        raise _init_error
     if _rag is None:
-        try:
-            progress.start("Loading RAG engine (first use)")
-            logger.info("Loading RAG engine...")
-            from .rag_v2 import get_rag_v2
-            _rag = get_rag_v2()
-            progress.stop(f"{_rag.get_stats().get('chunks', 0)} chunks loaded")
-            logger.info("RAG engine loaded successfully")
-        except Exception as e:
-            _init_error = e
-            logger.error(f"Failed to load RAG engine: {e}")
-            logger.error(traceback.format_exc())
-            raise
+        with _rag_lock:
+            if _init_error:
+                raise _init_error
+            if _rag is None:
+                try:
+                    progress.start("Loading RAG engine (first use)")
+                    logger.info("Loading RAG engine...")
+                    with profile.phase("import rag engine"):
+                        from .rag_v2 import get_rag_v2
+                    with profile.phase("load index"):
+                        rag = get_rag_v2()
+                    progress.stop(f"{rag.get_stats().get('chunks', 0)} chunks loaded")
+                    logger.info("RAG engine loaded successfully")
+                    _rag = rag
+                except Exception as e:
+                    _init_error = e
+                    logger.error(f"Failed to load RAG engine: {e}")
+                    logger.error(traceback.format_exc())
+                    raise
     return _rag
 
 def get_policy():
@@ -161,6 +232,7 @@ def get_tools() -> List[Dict]:
                 "type": "object",
                 "properties": {
                     "name": {"type": "string", "description": "Symbol name"},
+                    "fuzzy": {"type": "boolean", "description": "Closest names by edit distance"},
                 },
                 "required": ["name"]
             }
@@ -203,6 +275,7 @@ def handle_tool(name: str, args: Dict) -> Dict:
         if name == "evony_search":
             progress.start(f"Searching: {args.get('query', '')[:30]}")
             rag = get_rag()
+            check_cancelled()
             results = rag.search_only(
                 query=args.get("query", ""),
                 include=args.get("include"),
@@ -229,15 +302,26 @@ def handle_tool(name: str, args: Dict) -> Dict:
         elif name == "evony_answer":
             progress.start(f"Answering: {args.get('question', '')[:30]}")
             rag = get_rag()
-            response = rag.query(
+            check_cancelled()
+            query_args = dict(
                 query=args.get("question", ""),
                 mode=args.get("mode"),
                 include=args.get("include"),
                 exclude=args.get("exclude"),
                 evidence_level=args.get("evidence_level"),
                 final_k=args.get("k"),
-                use_llm=args.get("use_llm", True),
             )
+            if args.get("use_llm", True):
+                # Stream from LM Studio so a cancel stops generation between
+                # tokens instead of after the whole answer
+                response, tokens = rag.query_stream(**query_args)
+                try:
+                    for _ in tokens:
+                        check_cancelled()
+                finally:
+                    tokens.close()  # closes the LM Studio connection early
+            else:
+                response = rag.query(**query_args, use_llm=False)
             progress.stop(f"{len(response.citations)} citations")
             logger.info(f"Answer generated, {len(response.citations)} citations")
             return {
@@ -258,6 +342,7 @@ def handle_tool(name: str, args: Dict) -> Dict:
         elif name == "evony_open":
             progress.start(f"Opening: {args.get('path', '')[:40]}")
             rag = get_rag()
+            check_cancelled()
             content = rag.get_file(
                 path=args.get("path", ""),
                 start_line=args.get("start_line"),
@@ -276,7 +361,8 @@ def handle_tool(name: str, args: Dict) -> Dict:
         elif name == "evony_symbol":
             progress.start(f"Finding symbol: {args.get('name', '')}")
             rag = get_rag()
-            results = rag.find_symbol(args.get("name", ""))
+            check_cancelled()
+            results = rag.find_symbol(args.get("name", ""), fuzzy=bool(args.get("fuzzy")))
             progress.stop(f"{len(results)} occurrences")
             logger.info(f"Symbol lookup: {len(results)} occurrences")
             return {"symbol": args.get("name"), "occurrences": results[:20]}
@@ -284,6 +370,7 @@ def handle_tool(name: str, args: Dict) -> Dict:
         elif name == "evony_trace":
             progress.start(f"Tracing: {args.get('topic', '')}")
             rag = get_rag()
+            check_cancelled()
             results = rag.trace(
                 topic=args.get("topic", ""),
                 depth=args.get("depth", 3),
@@ -302,6 +389,7 @@ def handle_tool(name: str, args: Dict) -> Dict:
         elif name == "evony_stats":
             progress.start("Getting stats")
             rag = get_rag()
+            check_cancelled()
             stats = rag.get_stats()
             progress.stop(f"{stats.get('chunks', 0)} chunks")
             logger.info(f"Stats: {stats}")
@@ -311,6 +399,8 @@ def handle_tool(name: str, args: Dict) -> Dict:
             logger.warning(f"Unknown tool: {name}")
             return {"error": f"Unknown tool: {name}"}
             
+    except RequestCancelled:
+        raise
     except Exception as e:
         progress.error(str(e)[:50])
         logger.error(f"Tool error: {e}")
@@ -388,6 +478,8 @@ def handle_request(request: Dict) -> Dict:
                 "error": {"code": -32601, "message": f"Unknown method: {method}"}
             }
             
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Request error: {e}")
         logger.error(traceback.format_exc())
@@ -398,9 +490,83 @@ def handle_request(request: Dict) -> Dict:
         }
 
 
-def run_stdio():
+# (method, response) pairs for the stdout writer; None stops it
+_responses: "queue.Queue[Optional[tuple]]" = queue.Queue()
+
+
+def send(response: Optional[Dict], method: str = ""):
+    """Queue a response for the stdout writer (any thread)."""
+    if response is not None:
+        _responses.put((method, response))
+
+
+def write_responses():
+    """Sole writer of stdout: one JSON line per response, in queue order."""
+    while True:
+        item = _responses.get()
+        if item is None:
+            break
+        method, response = item
+        try:
+            response_str = json.dumps(response)
+            logger.info(f"SENDING response for id={response.get('id')}, len={len(response_str)}")
+            sys.stdout.write(response_str + "\n")
+            sys.stdout.flush()
+            logger.info(f"SENT and FLUSHED response id={response.get('id')}")
+            if method in ("initialize", "tools/call"):
+                profile.first(f"first {method} response sent")
+        except Exception as e:
+            logger.error(f"Write error: {e}")
+            logger.error(traceback.format_exc())
+
+
+def run_request(request: Dict, inflight: InFlightRequest):
+    """Worker: handle one tools/call and queue its response unless cancelled."""
+    _worker.request = inflight
+    try:
+        if inflight.cancelled.is_set():
+            return
+        response = handle_request(request)
+        if inflight.cancelled.is_set():
+            logger.info(f"Dropping response for cancelled id={inflight.req_id}")
+            return
+        send(response, request.get("method", ""))
+    except RequestCancelled as e:
+        logger.info(f"Aborted: {e}")
+    finally:
+        _worker.request = None
+        with _inflight_lock:
+            _inflight.pop(inflight.req_id, None)
+
+
+def dispatch(request: Dict, executor: ThreadPoolExecutor):
+    """Route one request: tool calls to the pool, everything else inline."""
+    method = request.get("method", "")
+    req_id = request.get("id")
+    
+    if method == "notifications/cancelled":
+        params = request.get("params", {})
+        cancel_request(params.get("requestId"), params.get("reason", ""))
+        return
+    
+    if method != "tools/call" or req_id is None:
+        # initialize / ping / tools/list are instant; answer ahead of queued tools
+        send(handle_request(request), method)
+        return
+    
+    inflight = InFlightRequest(req_id)
+    with _inflight_lock:
+        _inflight[req_id] = inflight
+    inflight.future = executor.submit(run_request, request, inflight)
+
+
+def run_stdio(max_workers: int = MCP_MAX_CONCURRENCY):
     """Run MCP server with stdio."""
-    logger.info("Starting stdio loop...")
+    logger.info(f"Starting stdio loop ({max_workers} workers)...")
+    writer = threading.Thread(target=write_responses, name="stdout-writer", daemon=True)
+    writer.start()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-worker")
+    profile.mark("stdio loop ready")
     
     request_count = 0
     try:
@@ -442,14 +608,7 @@ def run_stdio():
             
             try:
                 request = json.loads(line)
-                response = handle_request(request)
-                
-                if response is not None:
-                    response_str = json.dumps(response)
-                    logger.info(f"SENDING response for id={response.get('id')}, len={len(response_str)}")
-                    sys.stdout.write(response_str + "\n")
-                    sys.stdout.flush()
-                    logger.info(f"SENT and FLUSHED response #{request_count}")
+                dispatch(request, executor)
                     
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error: {e}, line: {line[:100]}")
@@ -457,13 +616,11 @@ def run_stdio():
             except Exception as e:
                 logger.error(f"Processing error: {e}")
                 logger.error(traceback.format_exc())
-                error_response = {
+                send({
                     "jsonrpc": "2.0",
                     "id": None,
                     "error": {"code": -32700, "message": str(e)}
-                }
-                sys.stdout.write(json.dumps(error_response) + "\n")
-                sys.stdout.flush()
+                })
                 
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt, shutting down")
@@ -471,6 +628,11 @@ def run_stdio():
         logger.error(f"Fatal error: {e}")
         logger.error(traceback.format_exc())
         raise
+    finally:
+        # Let in-flight tool calls finish and their responses drain
+        executor.shutdown(wait=True)
+        _responses.put(None)
+        writer.join()
     
     logger.info("Server stopped")
 
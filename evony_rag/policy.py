@@ -179,12 +179,16 @@ class PolicyEngine:
         return self.policy.get('retrieval', {})
 
 
-# Singleton
+# Singleton with thread safety
+import threading
 _policy_engine = None
+_policy_lock = threading.Lock()
 
 def get_policy() -> PolicyEngine:
-    """Get singleton policy engine."""
+    """Get singleton policy engine (thread-safe)."""
     global _policy_engine
     if _policy_engine is None:
-        _policy_engine = PolicyEngine()
+        with _policy_lock:
+            if _policy_engine is None:
+                _policy_engine = PolicyEngine()
     return _policy_engine
@@ -5,7 +5,7 @@ The main RAG engine that combines retrieval with generation.
 """
 
 import json
-import requests
+import threading
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 
@@ -14,7 +14,9 @@ from .config import (
     DATASET_PATH, CATEGORIES
 )
 from .embeddings import EmbeddingIndex, Chunk
+from .hybrid_search import update_lexical_indexes
 from .query_router import QueryRouter, QueryAnalysis
+from .lmstudio_client import get_lmstudio_client
 
 
 @dataclass
@@ -63,19 +65,24 @@ Context from knowledge base:
         self.index = EmbeddingIndex()
         self.router = QueryRouter()
         self.index_loaded = False
+        self._load_lock = threading.Lock()
         
     def load_index(self) -> bool:
-        """Load the embedding index."""
-        if self.index.load():
-            self.index_loaded = True
-            return True
-        return False
+        """Load the embedding index (once, if several threads ask at once)."""
+        with self._load_lock:
+            if self.index_loaded:
+                return True
+            if self.index.load():
+                self.index_loaded = True
+                return True
+            return False
     
     def build_index(self) -> bool:
         """Build the embedding index."""
         try:
             self.index.build_index()
             self.index.save()
+            update_lexical_indexes(delta=self.index.delta)
             self.index_loaded = True
             return True
         except Exception as e:
@@ -110,28 +117,16 @@ Context from knowledge base:
             ))
         return citations
     
+    def _messages(self, prompt: str, system: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+    
     def _call_lmstudio(self, prompt: str, system: str) -> str:
-        """Call LM Studio API for generation."""
-        try:
-            response = requests.post(
-                f"{LMSTUDIO_URL}/chat/completions",
-                json={
-                    "model": LMSTUDIO_MODEL,
-                    "messages": [
-                        {"role": "system", "content": system},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1024,
-                },
-                timeout=60
-            )
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except requests.exceptions.ConnectionError:
-            return None
-        except Exception as e:
-            return None
+        """Call LM Studio API for generation (None if unavailable)."""
+        return get_lmstudio_client(LMSTUDIO_URL).chat(
+            self._messages(prompt, system), model=LMSTUDIO_MODEL)
     
     def _generate_standalone(self, query: str, context: str, citations: List[Citation]) -> str:
         """Generate answer without LLM (fallback mode)."""
@@ -225,15 +220,20 @@ Context from knowledge base:
         if not self.index_loaded:
             self.load_index()
         
-        return self.index.metadata if self.index.metadata else {}
+        stats = dict(self.index.metadata) if self.index.metadata else {}
+        stats['query_cache'] = self.index.query_cache.stats()
+        return stats
 
 
 # Singleton instance
 _rag_instance = None
+_rag_lock = threading.Lock()
 
 def get_rag() -> EvonyRAG:
-    """Get the singleton RAG instance."""
+    """Get the singleton RAG instance (thread-safe)."""
     global _rag_instance
     if _rag_instance is None:
-        _rag_instance = EvonyRAG()
+        with _rag_lock:
+            if _rag_instance is None:
+                _rag_instance = EvonyRAG()
     return _rag_instance
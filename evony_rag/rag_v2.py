@@ -6,13 +6,14 @@ Hybrid search + policy controls + symbol resolution.
 
 import json
 import requests
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 from dataclasses import dataclass, field
 from pathlib import Path
 
-from .config import DATASET_PATH
+from .config import DATASET_PATH, LMSTUDIO_URL
 from .hybrid_search import HybridSearch, SearchResult, get_hybrid_search
 from .policy import PolicyEngine, QueryPolicy, get_policy
+from .lmstudio_client import get_lmstudio_client
 
 
 @dataclass
@@ -71,7 +72,7 @@ Context:
     def __init__(self):
         self.search = get_hybrid_search()
         self.policy = get_policy()
-        self.lmstudio_url = "http://localhost:1234/v1"
+        self.lmstudio_url = LMSTUDIO_URL
         
     def _format_context(self, results: List[SearchResult], 
                         evidence_config: Dict) -> str:
@@ -120,25 +121,19 @@ Context:
         
         return citations
     
+    def _messages(self, prompt: str, system: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+    
     def _call_lmstudio(self, prompt: str, system: str) -> Optional[str]:
-        """Call LM Studio for generation."""
-        try:
-            response = requests.post(
-                f"{self.lmstudio_url}/chat/completions",
-                json={
-                    "messages": [
-                        {"role": "system", "content": system},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1024,
-                },
-                timeout=60
-            )
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except:
-            return None
+        """Call LM Studio for generation (None if unavailable)."""
+        return get_lmstudio_client(self.lmstudio_url).chat(self._messages(prompt, system))
+    
+    def _stream_lmstudio(self, prompt: str, system: str) -> Iterator[str]:
+        """Stream LM Studio tokens; raises requests.RequestException on failure."""
+        return get_lmstudio_client(self.lmstudio_url).stream_chat(self._messages(prompt, system))
     
     def _generate_standalone(self, query: str, 
                              citations: List[Citation]) -> str:
@@ -155,14 +150,16 @@ Context:
         
         return "\n".join(parts)
     
-    def query(self, query: str,
-              mode: str = None,
-              include: List[str] = None,
-              exclude: List[str] = None,
-              evidence_level: str = None,
-              final_k: int = None,
-              use_llm: bool = True) -> RAGResponse:
-        """Query with policy controls."""
+    def _retrieve(self, query: str,
+                  mode: str = None,
+                  include: List[str] = None,
+                  exclude: List[str] = None,
+                  evidence_level: str = None,
+                  final_k: int = None) -> Tuple[RAGResponse, List[SearchResult], Dict]:
+        """Policy check and retrieval; the caller fills in the answer.
+        
+        A blocked query comes back with its answer set and model_used "none".
+        """
         
         # Evaluate policy
         policy = self.policy.evaluate(
@@ -181,7 +178,7 @@ Context:
                 citations=[],
                 policy=policy,
                 model_used="none",
-            )
+            ), [], {}
         
         # Get retrieval config
         retrieval = self.policy.get_retrieval_config()
@@ -210,33 +207,87 @@ Context:
             if found:
                 symbols_found.extend(found[:3])
         
-        # Generate answer
-        model_used = "standalone"
+        return RAGResponse(
+            answer="",
+            citations=citations,
+            policy=policy,
+            model_used="standalone",
+            symbols_found=symbols_found,
+        ), results, evidence_config
+    
+    def _system_prompt(self, policy: QueryPolicy, results: List[SearchResult],
+                       evidence_config: Dict) -> str:
+        return self.SYSTEM_TEMPLATE.format(
+            mode=policy.mode,
+            categories=", ".join(policy.include_categories),
+            context=self._format_context(results, evidence_config),
+        )
+    
+    def query(self, query: str,
+              mode: str = None,
+              include: List[str] = None,
+              exclude: List[str] = None,
+              evidence_level: str = None,
+              final_k: int = None,
+              use_llm: bool = True) -> RAGResponse:
+        """Query with policy controls."""
+        response, results, evidence_config = self._retrieve(
+            query, mode, include, exclude, evidence_level, final_k)
+        if response.model_used == "none":
+            return response
         
+        # Generate answer
         if use_llm:
-            context = self._format_context(results, evidence_config)
-            system = self.SYSTEM_TEMPLATE.format(
-                mode=policy.mode,
-                categories=", ".join(policy.include_categories),
-                context=context,
-            )
-            
+            system = self._system_prompt(response.policy, results, evidence_config)
             llm_answer = self._call_lmstudio(query, system)
             if llm_answer:
-                answer = llm_answer
-                model_used = "lmstudio"
+                response.answer = llm_answer
+                response.model_used = "lmstudio"
             else:
-                answer = self._generate_standalone(query, citations)
+                response.answer = self._generate_standalone(query, response.citations)
         else:
-            answer = self._generate_standalone(query, citations)
+            response.answer = self._generate_standalone(query, response.citations)
         
-        return RAGResponse(
-            answer=answer,
-            citations=citations,
-            policy=policy,
-            model_used=model_used,
-            symbols_found=symbols_found,
-        )
+        return response
+    
+    def query_stream(self, query: str,
+                     mode: str = None,
+                     include: List[str] = None,
+                     exclude: List[str] = None,
+                     evidence_level: str = None,
+                     final_k: int = None) -> Tuple[RAGResponse, Iterator[str]]:
+        """Retrieve now, stream the answer.
+        
+        The returned response already carries citations, policy and symbols;
+        its answer and model_used are filled in as the iterator is consumed.
+        If LM Studio fails before its first token, the standalone answer is
+        yielded instead; a failure mid-answer ends the stream early.
+        """
+        response, results, evidence_config = self._retrieve(
+            query, mode, include, exclude, evidence_level, final_k)
+        
+        def tokens() -> Iterator[str]:
+            if response.model_used == "none":
+                yield response.answer
+                return
+            
+            system = self._system_prompt(response.policy, results, evidence_config)
+            parts = []
+            try:
+                for token in self._stream_lmstudio(query, system):
+                    response.model_used = "lmstudio"
+                    parts.append(token)
+                    yield token
+            except requests.RequestException:
+                pass
+            
+            if parts:
+                response.answer = "".join(parts)
+            else:
+                response.answer = self._generate_standalone(query, response.citations)
+                yield response.answer
+        
+        return response, tokens()
     
     def search_only(self, query: str,
                     include: List[str] = None,
@@ -256,9 +307,30 @@ Context:
             min_score=policy.min_score,
         )
     
-    def find_symbol(self, name: str) -> List[Dict]:
-        """Find symbol definitions."""
-        return self.search.find_symbol(name)
+    def search_only_many(self, queries: List[str],
+                         include: List[str] = None,
+                         exclude: List[str] = None,
+                         k: int = 10) -> List[List[SearchResult]]:
+        """search_only() for several queries, batched into one search pass."""
+        if not queries:
+            return []
+        # Category rules depend on mode and overrides, not on the query text
+        policy = self.policy.evaluate(queries[0], include=include, exclude=exclude)
+        
+        retrieval = self.policy.get_retrieval_config()
+        
+        return self.search.search_many(
+            queries,
+            k_lexical=retrieval.get('k_lexical', 20),
+            k_vector=retrieval.get('k_vector', 20),
+            final_k=k,
+            categories=list(policy.include_categories) if policy.include_categories else None,
+            min_score=policy.min_score,
+        )
+    
+    def find_symbol(self, name: str, fuzzy: bool = False) -> List[Dict]:
+        """Find symbol definitions (fuzzy: closest names by edit distance)."""
+        return self.search.find_symbol(name, fuzzy=fuzzy)
     
     def trace(self, topic: str, depth: int = 3) -> List[Dict]:
         """Multi-hop trace: follow connections between concepts."""
@@ -269,14 +341,11 @@ Context:
         for hop in range(depth):
             next_topics = []
             
-            for t in current_topics:
-                if t in visited:
-                    continue
-                visited.add(t)
-                
-                # Search for this topic
-                results = self.search.search(t, final_k=3)
-                
+            topics = [t for t in dict.fromkeys(current_topics) if t not in visited]
+            visited.update(topics)
+            
+            # Search all of this hop's topics in one batch
+            for t, results in zip(topics, self.search.search_many(topics, final_k=3)):
                 for r in results:
                     trace_results.append({
                         'hop': hop + 1,
@@ -325,6 +394,8 @@ Context:
         return {
             'chunks': len(self.search.chunks),
             'symbols': len(self.search.symbols.symbols),
+            'query_cache': self.search.query_cache.stats(),
+            'embedding_model_loaded': self.search.model_loaded,
             'mode': self.policy.current_mode,
             'modes_available': self.policy.get_modes(),
         }
@@ -0,0 +1,132 @@
+"""
+Evony RAG - Startup Profile
+============================
+Per-phase wall time and peak RSS for server startup, written as JSON to
+the log directory.
+
+Enabled by config.STARTUP_PROFILE or EVONY_STARTUP_PROFILE=1. Disabled,
+phase() and mark() cost one attribute check.
+
+    from .startup_profile import profile
+    with profile.phase("load bm25"):
+        ...
+    profile.mark("initialize response")
+
+Offsets are milliseconds since this module was imported (the MCP servers
+import it first thing). Phases may nest and may run on different threads
+(index preload, model warm-up); each records its thread name.
+"""
+
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+_T0 = time.perf_counter()
+
+
+def peak_rss_mib() -> Optional[float]:
+    """Peak resident set size of this process so far, in MiB."""
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD),
+                            ('PageFaultCount', wintypes.DWORD),
+                            ('PeakWorkingSetSize', ctypes.c_size_t),
+                            ('WorkingSetSize', ctypes.c_size_t),
+                            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                            ('PagefileUsage', ctypes.c_size_t),
+                            ('PeakPagefileUsage', ctypes.c_size_t)]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+            get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS),
+                                 wintypes.DWORD]
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if not get_info(handle, ctypes.byref(counters), counters.cb):
+                return None
+            return counters.PeakWorkingSetSize / 2**20
+
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KiB elsewhere
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+    except Exception:
+        return None
+
+
+class StartupProfile:
+    """Collects startup phases and rewrites the profile file after each one."""
+
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[Path] = None
+        self.phases: List[Dict] = []
+        self.marks: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def enable(self, path: Path):
+        """Start recording; the profile is (re)written to `path`."""
+        self.path = Path(path)
+        self.enabled = True
+        self.mark("profiling enabled")
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._record(self.phases, {
+                'phase': name,
+                'start_ms': round((start - _T0) * 1000, 1),
+                'wall_ms': round((end - start) * 1000, 1),
+                'thread': threading.current_thread().name,
+                'peak_rss_mib': peak_rss_mib(),
+            })
+
+    def mark(self, name: str):
+        """Record a point in time (e.g. the first response sent)."""
+        if not self.enabled:
+            return
+        self._record(self.marks, {
+            'mark': name,
+            'at_ms': round((time.perf_counter() - _T0) * 1000, 1),
+            'thread': threading.current_thread().name,
+            'peak_rss_mib': peak_rss_mib(),
+        })
+
+    def first(self, name: str):
+        """mark() only the first time `name` is reached."""
+        if self.enabled and not any(m['mark'] == name for m in self.marks):
+            self.mark(name)
+
+    def _record(self, entries: List[Dict], entry: Dict):
+        with self._lock:
+            entries.append(entry)
+            self._save()
+
+    def _save(self):
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'phases': self.phases, 'marks': self.marks}, f, indent=2)
+        except OSError:
+            pass  # profiling must never break the server
+
+
+# Process-wide profile
+profile = StartupProfile()
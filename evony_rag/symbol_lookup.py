@@ -0,0 +1,156 @@
+"""
+Evony RAG - Symbol Name Lookup
+===============================
+Secondary indexes over SymbolIndex keys (lowercased symbol names) for
+lookups that miss the exact-match dict.
+
+TrigramIndex answers both halves of find_symbol's partial match without
+scanning every key:
+    name in key  - candidates from the rarest trigram's postings, verified
+    key in name  - every substring of name looked up directly
+
+DeletionIndex finds keys within a small edit distance of a name (typos,
+obfuscated `_1a2b`-style names), SymSpell-style: every string reachable by
+deleting up to d characters from a key's first and last `prefix`
+characters maps back to the key. Two names within distance d share such a
+deletion at both ends, so a query looks up its own head and tail deletions
+(a few dozen strings) and only verifies keys found in both.
+
+Key ids are positions in the key list the index was built from, so sorting
+ids reproduces the symbol dict's iteration order.
+"""
+
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .config import SYMBOL_FUZZY_DISTANCE, SYMBOL_FUZZY_PREFIX
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Substring lookups over a fixed list of keys."""
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys: List[str] = list(keys)
+        self.ids: Dict[str, int] = {key: i for i, key in enumerate(self.keys)}
+        self.max_len = max(map(len, self.keys), default=0)
+        postings = defaultdict(lambda: array('I'))
+        for i, key in enumerate(self.keys):
+            for gram in _trigrams(key):
+                postings[gram].append(i)
+        self.postings: Dict[str, array] = dict(postings)
+
+    def containing(self, name: str) -> List[int]:
+        """Ids of keys that contain `name`."""
+        if len(name) < 3:
+            # No trigram to look up; short names match most keys anyway
+            return [i for i, key in enumerate(self.keys) if name in key]
+        lists = []
+        for gram in _trigrams(name):
+            ids = self.postings.get(gram)
+            if ids is None:
+                return []
+            lists.append(ids)
+        keys = self.keys
+        return [i for i in min(lists, key=len) if name in keys[i]]
+
+    def within(self, name: str) -> List[int]:
+        """Ids of keys that are substrings of `name`."""
+        found = set()
+        ids = self.ids
+        for start in range(len(name)):
+            for end in range(start + 1, min(len(name), start + self.max_len) + 1):
+                i = ids.get(name[start:end])
+                if i is not None:
+                    found.add(i)
+        return list(found)
+
+    def partial(self, name: str) -> List[int]:
+        """Ids of keys where `name in key or key in name`, in key order."""
+        return sorted(set(self.containing(name)).union(self.within(name)))
+
+
+def _deletions(text: str, distance: int) -> Set[str]:
+    """text plus every string left after deleting up to `distance` characters."""
+    found = {text}
+    frontier = {text}
+    for _ in range(distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions cost 1).
+
+    Stops early and returns limit + 1 once the distance must exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            value = min(row[j] + 1, current[j - 1] + 1, row[j - 1] + cost)
+            if (previous is not None and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        previous, row = row, current
+    return min(row[-1], limit + 1)
+
+
+class DeletionIndex:
+    """Keys within edit distance `max_distance` of a name."""
+
+    def __init__(self, keys: Iterable[str], max_distance: int = SYMBOL_FUZZY_DISTANCE,
+                 prefix: int = SYMBOL_FUZZY_PREFIX):
+        self.keys: List[str] = list(keys)
+        self.max_distance = max_distance
+        self.prefix = prefix
+        self.heads = self._build(key[:prefix] for key in self.keys)
+        self.tails = self._build(key[-prefix:] for key in self.keys)
+
+    def _build(self, ends: Iterable[str]) -> Dict[str, array]:
+        # Names share heads and tails (camelCase parts, numbered suffixes), so
+        # expand each distinct one once
+        groups = defaultdict(lambda: array('I'))
+        for i, end in enumerate(ends):
+            groups[end].append(i)
+        table = defaultdict(lambda: array('I'))
+        for end, ids in groups.items():
+            for word in _deletions(end, self.max_distance):
+                table[word].extend(ids)
+        return dict(table)
+
+    def lookup(self, name: str) -> List[Tuple[int, int]]:
+        """(key id, distance) for keys within max_distance, closest first."""
+        limit = self.max_distance
+        head = set()
+        for word in _deletions(name[:self.prefix], limit):
+            ids = self.heads.get(word)
+            if ids is not None:
+                head.update(ids)
+        if not head:
+            return []
+        candidates = set()
+        for word in _deletions(name[-self.prefix:], limit):
+            ids = self.tails.get(word)
+            if ids is not None:
+                candidates.update(i for i in ids if i in head)
+
+        matches = []
+        for i in candidates:
+            distance = edit_distance(name, self.keys[i], limit)
+            if distance <= limit:
+                matches.append((i, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
@@ -0,0 +1,176 @@
+"""
+Evony RAG - Symbol Store
+=========================
+Compact on-disk symbol index replacing symbol_index.json.
+
+Layout (all in the index directory):
+    symbol_rows.npy     - one fixed-width row per occurrence (symbol, file,
+                          category, pattern kind, line, chunk row, context
+                          offset/length), grouped by key
+    symbol_keys.npy     - one row per key in sorted order: where its
+                          occurrences start, how many, the key's position
+                          in extraction order and which kinds occur under it
+    symbol_strings.json - sorted keys plus string tables for symbol
+                          spellings, file paths, categories and kinds
+
+Row arrays are memory-mapped; a key is found by binary search over the
+sorted keys and only its own occurrences are turned into dicts.
+"""
+
+import json
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Set
+
+import numpy as np
+
+from .vectors import replace_file, save_array
+
+ROWS_FILE = 'symbol_rows.npy'
+KEYS_FILE = 'symbol_keys.npy'
+STRINGS_FILE = 'symbol_strings.json'
+LEGACY_FILE = 'symbol_index.json'
+
+ROW_DTYPE = np.dtype([
+    ('symbol_id', '<i4'),
+    ('file_id', '<i4'),
+    ('category', '<u2'),
+    ('kind', '<u1'),
+    ('line', '<i4'),
+    ('chunk', '<i4'),   # -1 = no chunk reference
+    ('offset', '<i4'),
+    ('length', '<i4'),
+])
+
+KEY_DTYPE = np.dtype([
+    ('start', '<i8'),
+    ('count', '<i4'),
+    ('seen', '<i4'),  # extraction order, so iteration matches the dict it came from
+    ('kinds', '<u2'),  # bit i set = some occurrence has kind strings['kinds'][i]
+])
+
+
+class SymbolTable(Mapping):
+    """Read-only key -> occurrence list mapping over the saved arrays.
+
+    Looks like the dict SymbolIndex builds: iteration follows extraction
+    order and each lookup returns fresh occurrence dicts.
+    """
+
+    def __init__(self, sorted_keys: List[str], key_rows: np.ndarray, rows: np.ndarray,
+                 symbols: List[str], files: List[str], categories: List[str],
+                 kinds: List[str]):
+        self.sorted_keys = sorted_keys
+        self.key_rows = key_rows
+        self.rows = rows
+        self.symbols = symbols
+        self.files = files
+        self.categories = categories
+        self.kinds = kinds
+
+    @classmethod
+    def load(cls, index_path: Path) -> Optional['SymbolTable']:
+        """Load a saved table, memory-mapped.
+
+        Returns None if absent or saved in an older layout (without kinds).
+        """
+        if not (index_path / KEYS_FILE).exists():
+            return None
+        with open(index_path / STRINGS_FILE, 'r', encoding='utf-8') as f:
+            strings = json.load(f)
+        key_rows = np.load(index_path / KEYS_FILE, mmap_mode='r')
+        rows = np.load(index_path / ROWS_FILE, mmap_mode='r')
+        if key_rows.dtype != KEY_DTYPE or rows.dtype != ROW_DTYPE:
+            return None
+        return cls(strings['keys'], key_rows, rows,
+                   strings['symbols'], strings['files'], strings['categories'],
+                   strings['kinds'])
+
+    @staticmethod
+    def save(index_path: Path, symbols: Mapping[str, List[Dict]]):
+        """Write a key -> occurrences mapping (occurrences as extract_symbols makes them).
+
+        Each file is replaced atomically, so a running server that has the
+        old arrays memory-mapped keeps reading them intact.
+        """
+        seen = list(symbols)
+        order = sorted(range(len(seen)), key=seen.__getitem__)
+        symbol_ids: Dict[str, int] = {}
+        file_ids: Dict[str, int] = {}
+        category_ids: Dict[str, int] = {}
+        kind_ids: Dict[str, int] = {}
+        key_rows = np.zeros(len(seen), dtype=KEY_DTYPE)
+        rows = []
+
+        for i, position in enumerate(order):
+            occurrences = symbols[seen[position]]
+            start = len(rows)
+            kinds = 0
+            for occ in occurrences:
+                chunk = occ.get('chunk')
+                kind = kind_ids.setdefault(occ['kind'], len(kind_ids))
+                kinds |= 1 << kind
+                rows.append((
+                    symbol_ids.setdefault(occ['symbol'], len(symbol_ids)),
+                    file_ids.setdefault(occ['file'], len(file_ids)),
+                    category_ids.setdefault(occ['category'], len(category_ids)),
+                    kind,
+                    occ['line'],
+                    -1 if chunk is None else chunk,
+                    occ.get('offset', 0),
+                    occ.get('length', 0),
+                ))
+            key_rows[i] = (start, len(occurrences), position, kinds)
+
+        index_path.mkdir(parents=True, exist_ok=True)
+        save_array(index_path / ROWS_FILE, np.array(rows, dtype=ROW_DTYPE))
+        save_array(index_path / KEYS_FILE, key_rows)
+        replace_file(index_path / STRINGS_FILE, json.dumps({
+            'keys': [seen[position] for position in order],
+            'symbols': list(symbol_ids),
+            'files': list(file_ids),
+            'categories': list(category_ids),
+            'kinds': list(kind_ids),
+        }).encode('utf-8'))
+
+    def _find(self, key: str) -> int:
+        keys = self.sorted_keys
+        i = bisect_left(keys, key)
+        return i if i < len(keys) and keys[i] == key else -1
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def key_kinds(self, key: str) -> Set[str]:
+        """Kinds of the occurrences under `key`, without reading them."""
+        i = self._find(key)
+        mask = int(self.key_rows[i]['kinds']) if i >= 0 else 0
+        return {kind for bit, kind in enumerate(self.kinds) if mask >> bit & 1}
+
+    def __getitem__(self, key: str) -> List[Dict]:
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        start = int(self.key_rows[i]['start'])
+        rows = self.rows[start:start + int(self.key_rows[i]['count'])]
+        return [
+            {
+                'symbol': self.symbols[symbol_id],
+                'file': self.files[file_id],
+                'category': self.categories[category],
+                'kind': self.kinds[kind],
+                'line': line,
+                'chunk': chunk if chunk >= 0 else None,
+                'offset': offset,
+                'length': length,
+            }
+            for symbol_id, file_id, category, kind, line, chunk, offset, length in rows.tolist()
+        ]
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self.sorted_keys
+        for i in np.argsort(self.key_rows['seen'], kind='stable').tolist():
+            yield keys[i]
+
+    def __len__(self) -> int:
+        return len(self.sorted_keys)
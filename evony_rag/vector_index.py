@@ -0,0 +1,428 @@
+"""
+Evony RAG - Vector Index Backends
+==================================
+Pluggable nearest-neighbour search over the unit-normalized embedding
+matrix.
+
+Backends:
+    flat - exact brute-force dot product over every row
+    ivf  - inverted file: spherical k-means centroids, each row assigned to
+           its nearest centroid; a query only scans the `nprobe` closest
+           lists. Trained when the index is saved (EmbeddingIndex.save) and
+           persisted next to embeddings.npy; loading never trains.
+
+Either backend can scan a compact int8 / float16 copy of the matrix
+(QuantizedEmbeddings) to pick candidates, then rescore those exactly
+against the float32 rows for the final top-k.
+"""
+
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .vectors import normalize_rows, top_k_indices, replace_file, save_array
+
+# Rows per block when scoring the whole matrix against the centroids
+_ASSIGN_BLOCK = 65536
+
+QUANTIZATION_KINDS = ('int8', 'float16')
+
+
+class QuantizedEmbeddings:
+    """Compact copy of the embedding matrix used to find candidates.
+
+    int8    - per-row scale, row ~= codes * scale (4x smaller)
+    float16 - plain half-precision copy (2x smaller)
+
+    numpy has no int8/float16 BLAS path, so rows are widened to float32 in
+    small cache-sized blocks before each GEMV.
+    """
+
+    FILES = {'int8': 'embeddings_int8.npy', 'float16': 'embeddings_f16.npy'}
+    SCALE_FILE = 'embeddings_int8_scale.npy'
+    META_FILE = 'embeddings_quantized.json'
+    _BLOCK = 256
+
+    def __init__(self, kind: str, codes: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, embeddings: np.ndarray, kind: str) -> 'QuantizedEmbeddings':
+        """Quantize a float32 matrix block by block."""
+        if kind not in QUANTIZATION_KINDS:
+            raise ValueError(f"Unknown quantization: {kind}")
+        dtype = np.int8 if kind == 'int8' else np.float16
+        codes = np.empty(embeddings.shape, dtype=dtype)
+        scales = np.empty(len(embeddings), dtype=np.float32) if kind == 'int8' else None
+
+        for start in range(0, len(embeddings), _ASSIGN_BLOCK):
+            block = np.asarray(embeddings[start:start + _ASSIGN_BLOCK], dtype=np.float32)
+            end = start + len(block)
+            if kind == 'int8':
+                block_scales = np.abs(block).max(axis=1) / 127
+                block_scales[block_scales == 0] = 1.0
+                codes[start:end] = np.round(block / block_scales[:, None])
+                scales[start:end] = block_scales
+            else:
+                codes[start:end] = block
+        return cls(kind, codes, scales)
+
+    def _widen(self, codes: np.ndarray, query: np.ndarray, out: np.ndarray):
+        """out = codes @ query, widening `codes` to float32 block by block."""
+        buffer = np.empty((self._BLOCK, codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(codes), self._BLOCK):
+            block = codes[start:start + self._BLOCK]
+            widened = buffer[:len(block)]
+            widened[...] = block
+            np.dot(widened, query, out=out[start:start + len(block)])
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate similarity of every row to a unit-length query."""
+        out = np.empty(len(self.codes), dtype=np.float32)
+        self._widen(self.codes, query.astype(np.float32), out)
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def row_scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate similarity for a subset of rows."""
+        out = np.empty(len(rows), dtype=np.float32)
+        self._widen(self.codes[rows], query.astype(np.float32), out)
+        if self.scales is not None:
+            out *= self.scales[rows]
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def save(self, index_path: Path, build_id: str):
+        """Persist the copy, tagged with the build id of its float32 matrix.
+
+        Files are replaced atomically, metadata last.
+        """
+        save_array(index_path / self.FILES[self.kind], self.codes)
+        if self.scales is not None:
+            save_array(index_path / self.SCALE_FILE, self.scales)
+        replace_file(index_path / self.META_FILE, json.dumps({
+            'kind': self.kind,
+            'num_rows': len(self.codes),
+            'build_id': build_id,
+        }).encode('utf-8'))
+
+    @classmethod
+    def remove(cls, index_path: Path):
+        """Delete saved copies (their embeddings are being replaced)."""
+        for filename in (cls.META_FILE, cls.SCALE_FILE, *cls.FILES.values()):
+            try:
+                (index_path / filename).unlink(missing_ok=True)
+            except OSError:
+                pass  # still mapped (Windows); the build id check rejects it
+
+    @classmethod
+    def load(cls, index_path: Path, kind: str, num_rows: int,
+             build_id: Optional[str]) -> Optional['QuantizedEmbeddings']:
+        """Memory-map a saved copy; None if missing or built from other embeddings."""
+        try:
+            with open(index_path / cls.META_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if (not build_id or meta.get('build_id') != build_id
+                    or meta.get('kind') != kind or meta.get('num_rows') != num_rows):
+                return None
+            codes = np.load(index_path / cls.FILES[kind], mmap_mode='r')
+            scales = np.load(index_path / cls.SCALE_FILE, mmap_mode='r') if kind == 'int8' else None
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(codes) != num_rows:
+            return None
+        return cls(kind, codes, scales)
+
+
+# GEMV and GEMM round differently in the last bits, so rows within this
+# margin of the k-th score are rescored with a row-wise dot product; that
+# keeps search() and search_many() rankings identical.
+_RESCORE_MARGIN = 1e-4
+
+# Max query x row scores held at once by search_many (32 MiB of float32)
+_GEMM_BLOCK = 1 << 23
+
+
+def _near_top_k(scores: np.ndarray, top_k: int,
+                mask: Optional[np.ndarray]) -> np.ndarray:
+    """Allowed rows scoring within _RESCORE_MARGIN of the k-th best."""
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    top = top_k_indices(scores, top_k)
+    if mask is not None:
+        top = top[mask[top]]
+    if len(top) == 0:
+        return top
+    return np.flatnonzero(scores >= scores[top[-1]] - _RESCORE_MARGIN)
+
+
+def _rescore(embeddings: np.ndarray, rows: np.ndarray, query: np.ndarray,
+             top_k: int) -> List[Tuple[int, float]]:
+    """Exact float32 scores for candidate rows, best top_k first.
+
+    Each row is reduced on its own, so a row's score does not depend on
+    which other candidates it was rescored with.
+    """
+    rows = np.sort(rows)
+    similarities = (np.asarray(embeddings[rows]) * query).sum(axis=1)
+    top = top_k_indices(similarities, top_k)
+    return [(int(rows[i]), float(similarities[i])) for i in top]
+
+
+class FlatIndex:
+    """Exact search: one GEMV over all rows (one GEMM for a query batch).
+
+    With a compact copy, the GEMV runs over the quantized rows and the best
+    `rescore_factor * top_k` candidates are rescored exactly.
+    """
+
+    kind = 'flat'
+
+    def __init__(self, embeddings: np.ndarray,
+                 compact: Optional[QuantizedEmbeddings] = None,
+                 rescore_factor: int = 4):
+        self.embeddings = embeddings
+        self.compact = compact
+        self.rescore_factor = rescore_factor
+
+    def search(self, query: np.ndarray, top_k: int,
+               mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-k rows by cosine similarity to a unit-length query."""
+        if self.compact is None:
+            rows = _near_top_k(self.embeddings @ query, top_k, mask)
+            return _rescore(self.embeddings, rows, query, top_k)
+
+        similarities = self.compact.scores(query)
+        if mask is not None:
+            similarities = np.where(mask, similarities, -np.inf)
+        rows = top_k_indices(similarities, top_k * self.rescore_factor)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return _rescore(self.embeddings, rows, query, top_k)
+
+    def search_many(self, queries: np.ndarray, top_k: int,
+                    mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """search() for every row of `queries`, scored with blocked GEMMs."""
+        if self.compact is not None:
+            return [self.search(query, top_k, mask) for query in queries]
+
+        results = []
+        block = max(1, _GEMM_BLOCK // max(len(self.embeddings), 1))
+        for start in range(0, len(queries), block):
+            batch = queries[start:start + block]
+            for query, scores in zip(batch, batch @ self.embeddings.T):
+                rows = _near_top_k(scores, top_k, mask)
+                results.append(_rescore(self.embeddings, rows, query, top_k))
+        return results
+
+
+class IVFIndex:
+    """Approximate search with an inverted file over k-means clusters.
+
+    Knobs:
+        nlist  - number of clusters (build time); more lists = smaller scans
+        nprobe - lists scanned per query; higher = better recall, slower
+    """
+
+    kind = 'ivf'
+
+    FILES = {
+        'centroids': 'ivf_centroids.npy',
+        'list_offsets': 'ivf_offsets.npy',
+        'list_rows': 'ivf_rows.npy',
+    }
+    META_FILE = 'ivf_meta.json'
+
+    def __init__(self, embeddings: np.ndarray, nlist: Optional[int] = None,
+                 nprobe: int = 16, compact: Optional[QuantizedEmbeddings] = None,
+                 rescore_factor: int = 4):
+        self.embeddings = embeddings
+        self.compact = compact
+        self.rescore_factor = rescore_factor
+        self.nlist = nlist or self.default_nlist(len(embeddings))
+        self.nprobe = nprobe
+        self.centroids = np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+        self.list_rows = np.zeros(0, dtype=np.int32)
+
+    @staticmethod
+    def default_nlist(num_rows: int) -> int:
+        """~4*sqrt(N) lists, the usual starting point for IVF."""
+        return max(1, min(num_rows, int(4 * np.sqrt(num_rows))))
+
+    def _assign(self, centroids: np.ndarray) -> np.ndarray:
+        """Nearest centroid for every row, scored in blocks."""
+        assignments = np.empty(len(self.embeddings), dtype=np.int32)
+        for start in range(0, len(self.embeddings), _ASSIGN_BLOCK):
+            block = np.asarray(self.embeddings[start:start + _ASSIGN_BLOCK])
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def train(self, iterations: int = 10, sample_size: Optional[int] = None,
+              seed: int = 0):
+        """Spherical k-means on a sample, then assign every row to a list."""
+        rng = np.random.default_rng(seed)
+        num_rows = len(self.embeddings)
+        sample_size = min(num_rows, sample_size or min(64 * self.nlist, 100_000))
+        sample_rows = np.sort(rng.choice(num_rows, size=sample_size, replace=False))
+        sample = np.asarray(self.embeddings[sample_rows], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, size=self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(labels, minlength=self.nlist)
+            nonempty = np.flatnonzero(counts)
+            starts = (np.cumsum(counts) - counts)[nonempty]
+            sums = np.zeros_like(centroids)
+            sums[nonempty] = np.add.reduceat(
+                sample[np.argsort(labels, kind='stable')], starts, axis=0)
+            # Re-seed empty clusters from random sample points
+            empty = np.flatnonzero(counts == 0)
+            sums[empty] = sample[rng.choice(sample_size, size=len(empty))]
+            centroids = normalize_rows(sums)
+
+        assignments = self._assign(centroids)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=self.nlist)
+
+        self.centroids = centroids
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.list_rows = order.astype(np.int32)
+
+    def search(self, query: np.ndarray, top_k: int,
+               mask: Optional[np.ndarray] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Approximate top-k over the `nprobe` closest lists.
+
+        With a category mask, more lists are probed until at least top_k
+        allowed rows have been scanned (or every list has been).
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        # Rank every list when masked, in case the closest ones hold too few rows
+        list_order = top_k_indices(self.centroids @ query,
+                                   self.nlist if mask is not None else nprobe)
+
+        probed = nprobe
+        rows = self._rows_for(list_order[:probed], mask)
+        while len(rows) < top_k and probed < len(list_order):
+            probed = min(len(list_order), probed * 2)
+            rows = self._rows_for(list_order[:probed], mask)
+
+        if len(rows) == 0:
+            return []
+        if self.compact is not None:
+            rows = np.sort(rows)
+            approx = self.compact.row_scores(rows, query)
+            rows = rows[top_k_indices(approx, top_k * self.rescore_factor)]
+        return _rescore(self.embeddings, rows, query, top_k)
+
+    def search_many(self, queries: np.ndarray, top_k: int,
+                    mask: Optional[np.ndarray] = None,
+                    nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """search() for every row of `queries` (each probes its own lists)."""
+        return [self.search(query, top_k, mask, nprobe) for query in queries]
+
+    def _rows_for(self, lists: np.ndarray, mask: Optional[np.ndarray]) -> np.ndarray:
+        """Row ids stored in the given lists, optionally masked."""
+        rows = np.concatenate([
+            self.list_rows[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists
+        ]) if len(lists) else np.zeros(0, dtype=np.int32)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return rows
+
+    def save(self, index_path: Path, build_id: str):
+        """Persist centroids and lists, tagged with the embeddings' build id.
+
+        Files are replaced atomically, metadata last, so a reader never
+        pairs new metadata with old lists.
+        """
+        for attr, filename in self.FILES.items():
+            save_array(index_path / filename, getattr(self, attr))
+        replace_file(index_path / self.META_FILE, json.dumps({
+            'nlist': self.nlist,
+            'num_rows': len(self.embeddings),
+            'build_id': build_id,
+        }).encode('utf-8'))
+
+    @classmethod
+    def remove(cls, index_path: Path):
+        """Delete a saved IVF index (its embeddings are being replaced)."""
+        for filename in (cls.META_FILE, *cls.FILES.values()):
+            try:
+                (index_path / filename).unlink(missing_ok=True)
+            except OSError:
+                pass  # still mapped (Windows); the build id check rejects it
+
+    @classmethod
+    def load(cls, index_path: Path, embeddings: np.ndarray, build_id: Optional[str],
+             nprobe: int = 16, **kwargs) -> Optional['IVFIndex']:
+        """Load a persisted IVF index; None if missing or built from other embeddings."""
+        try:
+            with open(index_path / cls.META_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if (not build_id or meta['num_rows'] != len(embeddings)
+                    or meta.get('build_id') != build_id):
+                return None
+            index = cls(embeddings, nlist=meta['nlist'], nprobe=nprobe, **kwargs)
+            for attr, filename in cls.FILES.items():
+                setattr(index, attr, np.load(index_path / filename, mmap_mode='r'))
+            return index
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def load_vector_index(index_path: Path, embeddings: np.ndarray, backend: str = 'flat',
+                      nprobe: int = 16, compact: Optional[QuantizedEmbeddings] = None,
+                      rescore_factor: int = 4, build_id: Optional[str] = None):
+    """Open the configured backend over a saved index.
+
+    IVF lists come from EmbeddingIndex.save (build_id: metadata.json's id
+    for `embeddings`). Without current ones, search falls back to exact
+    flat scans rather than training here: k-means over a large matrix takes
+    minutes, and loading must not write to the index directory.
+    """
+    if backend == 'ivf':
+        index = IVFIndex.load(index_path, embeddings, build_id, nprobe=nprobe,
+                              compact=compact, rescore_factor=rescore_factor)
+        if index is not None:
+            return index
+        logging.getLogger(__name__).warning(
+            "No IVF index saved for this build; using flat search. "
+            "Rebuild the index with VECTOR_INDEX = 'ivf' to create one.")
+    return FlatIndex(embeddings, compact=compact, rescore_factor=rescore_factor)
+
+
+def evaluate_recall(index, exact: FlatIndex, queries: np.ndarray,
+                    k: int = 20) -> Dict[str, float]:
+    """recall@k of an approximate index against exact search.
+
+    Returns mean recall plus mean per-query latency of both indexes, for
+    choosing nlist/nprobe.
+    """
+    recalls, approx_ms, exact_ms = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        truth = {idx for idx, _ in exact.search(query, k)}
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        found = {idx for idx, _ in index.search(query, k)}
+        approx_ms.append((time.perf_counter() - start) * 1000)
+
+        recalls.append(len(truth & found) / max(len(truth), 1))
+    return {
+        'recall': float(np.mean(recalls)),
+        'approx_ms': float(np.mean(approx_ms)),
+        'exact_ms': float(np.mean(exact_ms)),
+    }
@@ -0,0 +1,209 @@
+"""
+Evony RAG - Vector Helpers
+===========================
+Shared numpy helpers for the embedding matrix and query vectors.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """Return a C-contiguous float32 copy of `matrix` with unit-length rows.
+
+    Zero rows are left as zeros so they score 0 against every query.
+    """
+    matrix = np.array(matrix, dtype=np.float32, order='C', copy=True)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize_vector(vector) -> np.ndarray:
+    """Return a float32 unit-length copy of a single vector."""
+    return normalize_rows(vector)[0]
+
+
+def _looks_normalized(matrix: np.ndarray, sample: int = 64) -> bool:
+    """Cheap check on the first/last rows only (touches a few pages)."""
+    rows = np.concatenate([matrix[:sample], matrix[-sample:]])
+    norms = np.linalg.norm(rows, axis=1)
+    return bool(np.all(np.abs(norms - 1.0) < 1e-3))
+
+
+def load_embeddings(path: Path, normalized: Optional[bool] = None,
+                    mmap: bool = True) -> np.ndarray:
+    """Load an embedding matrix as unit-length float32 rows.
+
+    Files written by EmbeddingIndex.save are already normalized, float32 and
+    C-contiguous, so they are memory-mapped read-only: startup cost no longer
+    depends on matrix size and processes on one host share page-cache pages.
+    Anything else is loaded and normalized into a private in-RAM copy.
+    `normalized` comes from index metadata; None means sniff the file.
+    """
+    if mmap:
+        matrix = np.load(path, mmap_mode='r')
+        if (matrix.ndim == 2 and matrix.dtype == np.float32
+                and matrix.flags.c_contiguous and len(matrix)
+                and (normalized or (normalized is None and _looks_normalized(matrix)))):
+            return matrix
+        del matrix
+    return normalize_rows(np.load(path))
+
+
+def replace_file(path: Path, data) -> None:
+    """Write bytes (or a buffer) to a temp file next to `path`, then rename it over `path`.
+
+    Processes that have the old file memory-mapped keep reading the old
+    inode until they reload, instead of faulting on a truncated mapping.
+    """
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    """np.save() that atomically replaces `path` (see replace_file)."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+def save_embeddings(path: Path, matrix: np.ndarray):
+    """Write the on-disk layout load_embeddings can map directly.
+
+    Writes to a temp file and renames, so processes that have the old file
+    mapped keep a consistent view.
+    """
+    save_array(path, np.ascontiguousarray(matrix, dtype=np.float32))
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the `k` highest scores, best first.
+
+    Uses an O(N) argpartition and only sorts the k selected entries.
+    Ties are broken by lower index first.
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(scores, n - k)[n - k:]
+        # argpartition picks arbitrary members of a tie at the k-th score;
+        # take the lowest-index ones so results are deterministic
+        kth = scores[candidates].min()
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def combine_category_masks(masks: Dict[str, np.ndarray],
+                           categories: Optional[Iterable[str]],
+                           num_rows: int) -> Optional[np.ndarray]:
+    """OR together the masks for `categories`; None means no filtering."""
+    if not categories:
+        return None
+    combined = np.zeros(num_rows, dtype=bool)
+    for category in categories:
+        if category in masks:
+            combined |= masks[category]
+    return combined
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of unit-length query embeddings.
+
+    Keyed on the query with surrounding/repeated whitespace collapsed, which
+    the tokenizer ignores anyway. Cached vectors are read-only. Safe to share
+    between threads; a miss encodes outside the lock.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str) -> str:
+        return ' '.join(query.split())
+
+    def encode(self, model, query: str) -> np.ndarray:
+        """Embedding for `query`, running `model.encode` only on a miss."""
+        key = self.key(query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = normalize_vector(model.encode([key])[0])
+        vector.setflags(write=False)
+        if self.maxsize > 0:
+            with self._lock:
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return vector
+
+    def encode_many(self, model, queries: List[str]) -> np.ndarray:
+        """Embeddings for `queries` as rows, with one batched encode for the misses."""
+        keys = [self.key(query) for query in queries]
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[key] = vector
+            self.hits += sum(key in vectors for key in keys)
+            self.misses += sum(key not in vectors for key in keys)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing:
+            encoded = normalize_rows(model.encode(missing))
+            with self._lock:
+                for key, vector in zip(missing, encoded):
+                    vector = vector.copy()
+                    vector.setflags(write=False)
+                    vectors[key] = vector
+                    if self.maxsize > 0:
+                        self._entries[key] = vector
+                        self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -49,23 +49,38 @@ class GapFillerScanner:
         except Exception as e:
             print(f"[!] RAG init failed: {e}")
     
+    @staticmethod
+    def _parse_results(results) -> List[Dict]:
+        parsed = []
+        for r in results:
+            if hasattr(r, 'file'):
+                parsed.append({"file": r.file, "snippet": getattr(r, 'snippet', '')})
+            elif isinstance(r, dict):
+                parsed.append(r)
+        return parsed
+    
     def _rag_search(self, query: str, k: int = 20) -> List[Dict]:
         """Search RAG and return results"""
         if not self.rag:
             return []
         try:
-            results = self.rag.search_only(query, k=k)
-            parsed = []
-            for r in results:
-                if hasattr(r, 'file'):
-                    parsed.append({"file": r.file, "snippet": getattr(r, 'snippet', '')})
-                elif isinstance(r, dict):
-                    parsed.append(r)
-            return parsed
+            return self._parse_results(self.rag.search_only(query, k=k))
         except Exception as e:
             print(f"    [!] Search error: {e}")
             return []
     
+    def _rag_search_many(self, queries: List[str], k: int = 20) -> List[List[Dict]]:
+        """Search RAG for several queries in one batch, results per query"""
+        if not self.rag:
+            return [[] for _ in queries]
+        try:
+            return [self._parse_results(results)
+                    for results in self.rag.search_only_many(queries, k=k)]
+        except Exception as e:
+            # One bad query must not cost the others their results
+            print(f"    [!] Batch search error: {e}; retrying queries one by one")
+            return [self._rag_search(query, k=k) for query in queries]
+    
     # =========================================
     # GAP DISCOVERY METHODS
     # =========================================
@@ -83,8 +98,7 @@ class GapFillerScanner:
         ]
         
         all_commands = set()
-        for q in queries:
-            results = self._rag_search(q, k=30)
+        for results in self._rag_search_many(queries, k=30):
             for r in results:
                 snippet = r.get("snippet", "")
                 # Extract command names
@@ -108,8 +122,7 @@ class GapFillerScanner:
         ]
         
         handlers = set()
-        for q in queries:
-            results = self._rag_search(q, k=30)
+        for results in self._rag_search_many(queries, k=30):
             for r in results:
                 snippet = r.get("snippet", "")
                 # Extract handler names
@@ -134,8 +147,7 @@ class GapFillerScanner:
         ]
         
         beans = {}
-        for q in queries:
-            results = self._rag_search(q, k=30)
+        for results in self._rag_search_many(queries, k=30):
             for r in results:
                 file_path = r.get("file", "")
                 snippet = r.get("snippet", "")
@@ -168,8 +180,7 @@ class GapFillerScanner:
         ]
         
         enums = {}
-        for q in queries:
-            results = self._rag_search(q, k=30)
+        for results in self._rag_search_many(queries, k=30):
             for r in results:
                 snippet = r.get("snippet", "")
                 file_path = r.get("file", "")
@@ -203,8 +214,7 @@ class GapFillerScanner:
         ]
         
         formulas = []
-        for q in queries:
-            results = self._rag_search(q, k=20)
+        for results in self._rag_search_many(queries, k=20):
             for r in results:
                 snippet = r.get("snippet", "")
                 file_path = r.get("file", "")
@@ -233,8 +243,7 @@ class GapFillerScanner:
         ]
         
         errors = []
-        for q in queries:
-            results = self._rag_search(q, k=20)
+        for results in self._rag_search_many(queries, k=20):
             for r in results:
                 snippet = r.get("snippet", "")
                 
@@ -261,8 +270,7 @@ class GapFillerScanner:
         ]
         
         hidden = []
-        for q in queries:
-            results = self._rag_search(q, k=15)
+        for results in self._rag_search_many(queries, k=15):
             for r in results:
                 file_path = r.get("file", "")
                 snippet = r.get("snippet", "")
@@ -286,8 +294,7 @@ class GapFillerScanner:
         ]
         
         validations = []
-        for q in queries:
-            results = self._rag_search(q, k=20)
+        for results in self._rag_search_many(queries, k=20):
             for r in results:
                 snippet = r.get("snippet", "")
                 file_path = r.get("file", "")
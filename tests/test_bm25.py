@@ -0,0 +1,54 @@
+"""BM25Index: MaxScore pruning and batched search against plain scoring."""
+
+import numpy as np
+import pytest
+
+from evony_rag.benchmark import BM25_QUERIES, synthetic_chunks
+from evony_rag.hybrid_search import BM25Index
+
+QUERIES = BM25_QUERIES + [
+    "public function ident42",
+    "this var ident7 ident19",
+    "public static function ident3 ident1500",
+    "ident5 ident5 ident5 public",  # repeated terms weigh more
+    "nosuchterm",
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = BM25Index()
+    index.build(synthetic_chunks(3000))
+    return index
+
+
+def assert_same_ranking(expected, actual):
+    assert [doc for doc, _ in actual] == [doc for doc, _ in expected]
+    np.testing.assert_allclose([s for _, s in actual], [s for _, s in expected], rtol=1e-9)
+
+
+@pytest.mark.parametrize("top_k", [1, 5, 20, 100])
+@pytest.mark.parametrize("query", QUERIES)
+def test_pruned_equals_exhaustive(index, query, top_k):
+    exhaustive, full = index._search(query, top_k, None, prune=False)
+    pruned, touched = index._search(query, top_k, None, prune=True)
+    assert_same_ranking(exhaustive, pruned)
+    assert touched <= full
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_pruned_equals_exhaustive_with_mask(index, query):
+    mask = np.arange(index.num_docs) % 3 == 0
+    exhaustive, _ = index._search(query, 20, mask, prune=False)
+    pruned, _ = index._search(query, 20, mask, prune=True)
+    assert_same_ranking(exhaustive, pruned)
+    assert all(mask[doc] for doc, _ in pruned)
+
+
+def test_search_many_equals_search(index):
+    # Shared terms across queries exercise the shared posting scores
+    queries = QUERIES + [q.upper() for q in QUERIES[:3]] + QUERIES[:2]
+    mask = np.arange(index.num_docs) % 2 == 0
+    for top_k, m in ((20, None), (5, mask)):
+        batched = index.search_many(queries, top_k, m)
+        assert batched == [index.search(q, top_k, m) for q in queries]
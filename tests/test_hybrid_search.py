@@ -0,0 +1,45 @@
+"""HybridSearch: batched search against search() in a loop."""
+
+import numpy as np
+import pytest
+
+from evony_rag.benchmark import SyntheticEncoder, synthetic_chunks
+from evony_rag.chunk_store import ChunkStore
+from evony_rag.config import EMBEDDING_DIM
+from evony_rag.hybrid_search import HybridSearch
+from evony_rag.vectors import normalize_rows
+
+
+@pytest.fixture(scope="module")
+def search():
+    store = ChunkStore.from_dicts(synthetic_chunks(2000))
+    hs = HybridSearch()
+    hs.chunks = store
+    hs.bm25.build(store)
+    rng = np.random.default_rng(0)
+    hs.embeddings = normalize_rows(rng.standard_normal((len(store), EMBEDDING_DIM)))
+    hs.embedding_model = SyntheticEncoder()
+    hs.category_masks = store.category_masks()
+    return hs
+
+
+QUERIES = [
+    "public function ident42",
+    "this var ident7 ident19",
+    "public static function ident3 ident1500",
+    "ident17 ident230 ident4021",
+    "public function ident42",  # repeated query
+    "nosuchterm",
+]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"min_score": 0},
+    {"final_k": 20, "k_lexical": 30, "min_score": 0},
+    {"categories": ["source_code"], "min_score": 0},
+])
+def test_search_many_equals_search(search, kwargs):
+    search.query_cache.clear()
+    looped = [search.search(q, **kwargs) for q in QUERIES]
+    search.query_cache.clear()
+    assert search.search_many(QUERIES, **kwargs) == looped
@@ -0,0 +1,112 @@
+"""Incremental rebuilds against full rebuilds of the same dataset."""
+
+import json
+
+import numpy as np
+import pytest
+
+from evony_rag.benchmark import SyntheticEncoder, synthetic_symbol_chunks
+from evony_rag.embeddings import EmbeddingIndex
+from evony_rag.hybrid_search import HybridSearch, update_lexical_indexes
+from evony_rag.symbol_store import SymbolTable
+
+CATEGORIES = ['source_code', 'protocol', 'documentation']
+
+
+def write_file(path, seed):
+    """An AS3-like file; every file also declares and sends `shared`."""
+    chunk = synthetic_symbol_chunks(1, seed=seed)[0]
+    path.write_text(f"var shared:int = {seed};\n{chunk['content']}\n"
+                    f'send("shared.update", {seed});\n', encoding='utf-8')
+
+
+def build(dataset, index_path, incremental):
+    index = EmbeddingIndex()
+    index.model = SyntheticEncoder()
+    index.build_index(dataset, index_path, incremental=incremental, workers=1)
+    index.save(index_path, quantization=None, vector_index='flat')
+    update_lexical_indexes(index_path, index.delta)
+    return index
+
+
+def loaded(index_path):
+    search = HybridSearch()
+    assert search.bm25.load(index_path) and search.symbols.load(index_path)
+    return search
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / 'dataset'
+    for c, category in enumerate(CATEGORIES):
+        (root / category).mkdir(parents=True)
+        for i in range(12):
+            write_file(root / category / f'File{i}.as', seed=100 * c + i)
+    return root
+
+
+def change(dataset):
+    write_file(dataset / 'source_code' / 'File0.as', seed=900)   # changed
+    write_file(dataset / 'protocol' / 'File5.as', seed=901)      # changed
+    (dataset / 'protocol' / 'File7.as').unlink()                 # removed
+    write_file(dataset / 'documentation' / 'Extra.as', seed=902)  # added
+    (dataset / 'source_code' / 'File3.as').write_text('')         # emptied
+
+
+def test_incremental_equals_full(dataset, tmp_path):
+    patched_path, full_path = tmp_path / 'patched', tmp_path / 'full'
+    build(dataset, patched_path, incremental=True)
+    change(dataset)
+    patched = build(dataset, patched_path, incremental=True)
+    full = build(dataset, full_path, incremental=False)
+
+    assert len(patched.delta.added_rows) < len(patched.chunks)
+    assert list(patched.chunks) == list(full.chunks)
+    assert np.array_equal(patched.embeddings, full.embeddings)
+
+    a, b = loaded(patched_path), loaded(full_path)
+    assert a.bm25.num_docs == b.bm25.num_docs
+    assert np.array_equal(a.bm25.doc_lengths, b.bm25.doc_lengths)
+    for query in ['shared', 'var int', 'public function void', 'send update obj']:
+        assert a.bm25.search(query, 50) == b.bm25.search(query, 50)
+
+    # Same keys, occurrences and order as a full extraction
+    assert isinstance(a.symbols.symbols, SymbolTable)
+    assert [(k, a.symbols.symbols[k]) for k in a.symbols.symbols] == \
+           [(k, b.symbols.symbols[k]) for k in b.symbols.symbols]
+    for name in ['shared', 'shared.update', 'shar', 'update']:
+        assert a.symbols.find_symbol(name) == b.symbols.find_symbol(name)
+
+
+def test_stale_lexical_indexes_are_rebuilt(dataset, tmp_path):
+    index_path, full_path = tmp_path / 'index', tmp_path / 'full'
+    build(dataset, index_path, incremental=True)
+    # A build whose lexical update never ran, then a same-size change
+    write_file(dataset / 'source_code' / 'File4.as', seed=950)
+    index = EmbeddingIndex()
+    index.model = SyntheticEncoder()
+    index.build_index(dataset, index_path, incremental=True, workers=1)
+    index.save(index_path, quantization=None, vector_index='flat')
+    write_file(dataset / 'source_code' / 'File9.as', seed=951)
+    build(dataset, index_path, incremental=True)
+    build(dataset, full_path, incremental=False)
+
+    a, b = loaded(index_path), loaded(full_path)
+    assert a.bm25.search('shared var', 50) == b.bm25.search('shared var', 50)
+    assert dict(a.symbols.symbols.items()) == dict(b.symbols.symbols.items())
+
+
+def test_unchanged_rebuild_skips_the_model(dataset, tmp_path, monkeypatch):
+    index_path = tmp_path / 'index'
+    build(dataset, index_path, incremental=True)
+
+    def no_model(self):
+        raise AssertionError("model loaded for an unchanged rebuild")
+
+    monkeypatch.setattr(EmbeddingIndex, 'load_model', no_model)
+    index = EmbeddingIndex()
+    index.build_index(dataset, index_path, incremental=True, workers=1)
+    assert index.delta.unchanged and len(index.chunks) > 0
+    index.save(index_path)
+    meta = json.loads((index_path / 'metadata.json').read_text())
+    assert meta['num_chunks'] == len(index.chunks)
@@ -0,0 +1,127 @@
+"""SymbolIndex: extraction against the eight-pass extractor, the saved
+table as a mapping, trigram name lookups and declaration-first ranking."""
+
+import re
+from collections import Counter
+
+import pytest
+
+from evony_rag.benchmark import LegacySymbolIndex, synthetic_symbol_chunks
+from evony_rag.hybrid_search import SymbolIndex
+from evony_rag.symbol_lookup import TrigramIndex
+from evony_rag.symbol_store import SymbolTable
+
+
+def extract(chunks):
+    index = SymbolIndex()
+    for row, chunk in enumerate(chunks):
+        index.extract_symbols(chunk['content'], chunk['file_path'],
+                              chunk['category'], 1, chunk=row)
+    return index
+
+
+def eight_pass(content):
+    """(symbol, line, context) per symbol span, one finditer pass per pattern."""
+    found = {}
+    for pattern in LegacySymbolIndex.LEGACY_PATTERNS.values():
+        for match in re.finditer(pattern, content, re.MULTILINE):
+            if len(match.group(1)) >= 2:
+                # Patterns that match the same span (class twice, var and
+                # constant) count once
+                found.setdefault(match.span(1), (
+                    match.group(1), 1 + content.count('\n', 0, match.start()),
+                    content[max(0, match.start() - 50):match.end() + 100]))
+    return Counter(found.values())
+
+
+def single_pass(content):
+    index = extract([{'content': content, 'file_path': 'a.as', 'category': 'source_code'}])
+    return Counter((occ['symbol'], occ['line'], content[occ['offset']:occ['offset'] + occ['length']])
+                   for occurrences in index.symbols.values() for occ in occurrences)
+
+
+OVERLAPS = [
+    "class function foo",
+    "public class function Bar {}",
+    "public static const MAX_LEVEL:int = 10;",
+    "case SHARED_CODE:\nABC_DEF = 1\nvar x = 'a.b'",
+    "class class class Foo",
+    "ABCDEF: ab: function def ghi",
+    'send("a.b.c", "x.y")',
+]
+
+
+@pytest.mark.parametrize("content", OVERLAPS + [
+    chunk['content'] for chunk in synthetic_symbol_chunks(200)])
+def test_extraction_equals_eight_passes(content):
+    assert single_pass(content) == eight_pass(content)
+
+
+def test_overlapping_declarations_are_kept():
+    index = extract([{'content': OVERLAPS[1], 'file_path': 'a.as', 'category': 'source_code'}])
+    assert [(occ['symbol'], occ['kind']) for occ in index.symbols['function']] == [('function', 'class_name')]
+    assert [(occ['symbol'], occ['kind']) for occ in index.symbols['bar']] == [('Bar', 'as_function')]
+
+
+def test_saved_table_is_a_mapping(tmp_path):
+    index = extract(synthetic_symbol_chunks(50))
+    expected = dict(index.symbols)
+    index.save(tmp_path)
+    table = SymbolTable.load(tmp_path)
+    assert list(table.keys()) == list(expected)
+    assert dict(table) == expected
+    assert list(table.items()) == list(expected.items())
+    assert table.get('nosuchname') is None and 'nosuchname' not in table
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return list(extract(synthetic_symbol_chunks(300)).symbols)
+
+
+@pytest.mark.parametrize("name", [
+    "a", "on", "_1", "get", "user", "send", "player", "getplayer_12",
+    "xgetplayerinfoy", "foo.bar", "nosuchname", "",
+])
+def test_partial_equals_linear_scan(keys, name):
+    index = TrigramIndex(keys)
+    assert index.partial(name) == [i for i, key in enumerate(keys) if name in key or key in name]
+
+
+CONTENT = """\
+switch (code) {
+    case SHARED_MODE:
+    case SHARED_CODE:
+        send("shared.update", obj);
+}
+var shared_count:int = 0;
+const SHARED_CODE:int = 7;
+"""
+
+
+@pytest.fixture(params=["dict", "table"])
+def symbols(request, tmp_path):
+    index = extract([{'content': CONTENT, 'file_path': 'a.as', 'category': 'source_code'}])
+    if request.param == "table":
+        index.save(tmp_path)
+        assert index.load(tmp_path)
+    return index
+
+
+def test_exact_match_lists_declarations_first(symbols):
+    found = symbols.find_symbol("SHARED_CODE")
+    assert [occ['kind'] for occ in found] == ['as_var', 'constant']
+    assert [occ['line'] for occ in found] == [7, 3]
+
+
+def test_partial_match_ranks_declared_names_first(symbols):
+    found = symbols.find_symbol("shared")
+    # SHARED_MODE is only used, never declared
+    assert [occ['symbol'] for occ in found] == [
+        'SHARED_CODE', 'SHARED_CODE', 'shared_count', 'SHARED_MODE', 'shared.update']
+    assert found[0]['kind'] == 'as_var'
+
+
+def test_fuzzy_match_ranks_declared_names_first(symbols):
+    found = symbols.find_symbol("shared_cod", fuzzy=True)
+    assert found[0]['symbol'] == 'SHARED_CODE' and found[0]['kind'] == 'as_var'